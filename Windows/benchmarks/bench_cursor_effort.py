@@ -0,0 +1,196 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Head movement needed to bring the cursor to a target, relative versus
+joystick cursor mode.
+
+A simulated user points at targets spread over the screen. The head turns
+at a limited speed and the user sees the cursor with a reaction delay:
+in relative mode the head is turned by the remaining distance over the
+mode gain, in joystick mode the head is turned to the angle giving a speed
+proportional to the remaining distance, and back to neutral to stop.
+
+Effort is the total head rotation in degrees, reported per 100 px of cursor
+travel together with the largest turn away from neutral in any trial and
+the mean time to reach the target. Relative mode gain comes from the default spd_* values
+and an estimate of how far the tracking point moves per degree of head
+turn:
+    python benchmarks/bench_cursor_effort.py
+    python benchmarks/bench_cursor_effort.py --track-px-per-deg 2.5
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.joystick_mapper import JoystickMapper
+
+SCREEN_SIZE = np.array([1920, 1080])
+DT_SEC = 1 / 60
+
+# Simulated user
+HEAD_SPEED_DEG_S = 60
+REACTION_SEC = 0.15
+# Wanted cursor speed per px of remaining distance, joystick mode.
+STEER_GAIN_S = 2.5
+TARGET_RADIUS_PX = 10
+TIMEOUT_SEC = 10
+
+# Distance bins of the report, px
+DISTANCE_BINS = (0, 200, 500, 1000, 2500)
+N_TARGETS = 200
+
+CURVES = (1.0, 2.0, 3.0)
+
+
+def turn_head(angle, wanted, dt):
+    step = wanted - angle
+    norm = np.hypot(*step)
+    max_step = HEAD_SPEED_DEG_S * dt
+    if norm > max_step:
+        step *= max_step / norm
+    return angle + step, min(norm, max_step)
+
+
+def reach_relative(cursor, target, gain):
+    """Reach one target in relative mode. Head angle follows the cursor,
+    neutral faces the screen center.
+    """
+    delay = int(round(REACTION_SEC / DT_SEC))
+    angle = (cursor - SCREEN_SIZE / 2) / gain
+    seen = [(cursor.copy(), angle.copy())] * delay
+    effort = peak = 0
+    for tick in range(int(TIMEOUT_SEC / DT_SEC)):
+        seen_cursor, seen_angle = seen.pop(0)
+        if np.hypot(*(target - cursor)) < TARGET_RADIUS_PX:
+            return effort, peak, tick * DT_SEC, True
+        wanted = seen_angle + (target - seen_cursor) / gain
+        new_angle, turned = turn_head(angle, wanted, DT_SEC)
+        cursor = cursor + (new_angle - angle) * gain
+        angle = new_angle
+        effort += turned
+        peak = max(peak, np.hypot(*angle))
+        seen.append((cursor.copy(), angle.copy()))
+    return effort, peak, TIMEOUT_SEC, False
+
+
+def wanted_angle(mapper, wanted_speed):
+    """Head turn giving a speed, inverse of the mapper curve.
+    """
+    level = np.clip(np.abs(wanted_speed) / np.maximum(mapper.speeds, 1e-9),
+                    0, 1)**(1 / mapper.curves)
+    angle = mapper.dead_zone_deg + level * mapper.range_deg
+    return np.where(level > 0, np.sign(wanted_speed) * angle, 0)
+
+
+def reach_joystick(cursor, target, mapper):
+    """Reach one target in joystick mode, head starts at neutral and has to
+    be back in the dead zone with the cursor on target.
+    """
+    delay = int(round(REACTION_SEC / DT_SEC))
+    mapper.recenter()
+    angle = np.zeros(2)
+    mapper.update(angle)
+    seen = [cursor.copy()] * delay
+    effort = peak = 0
+    for tick in range(int(TIMEOUT_SEC / DT_SEC)):
+        seen_cursor = seen.pop(0)
+        error = target - seen_cursor
+        on_target = np.hypot(*(target - cursor)) < TARGET_RADIUS_PX
+        vel = mapper.update(angle)
+        if on_target and not vel.any():
+            return effort, peak, tick * DT_SEC, True
+
+        if np.hypot(*error) < TARGET_RADIUS_PX:
+            wanted = np.zeros(2)
+        else:
+            wanted = wanted_angle(mapper, error * STEER_GAIN_S)
+        cursor = np.clip(cursor + vel * DT_SEC, 0, SCREEN_SIZE)
+        angle, turned = turn_head(angle, wanted, DT_SEC)
+        effort += turned
+        peak = max(peak, np.hypot(*angle))
+        seen.append(cursor.copy())
+    return effort, peak, TIMEOUT_SEC, False
+
+
+def make_targets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.05, 0.95, size=(n, 2)) * SCREEN_SIZE
+
+
+def run_mode(reach, targets) -> list[tuple]:
+    trials = []
+    cursor = SCREEN_SIZE / 2
+    for target in targets:
+        dist = np.hypot(*(target - cursor))
+        effort, peak, duration, ok = reach(cursor.copy(), target)
+        trials.append((dist, effort, peak, duration, ok))
+        cursor = target
+    return trials
+
+
+def print_table(name, trials) -> None:
+    trials = np.array(trials)
+    for low, high in zip(DISTANCE_BINS[:-1], DISTANCE_BINS[1:]):
+        sel = trials[(trials[:, 0] >= low) & (trials[:, 0] < high)]
+        if len(sel) == 0:
+            continue
+        dist, effort, _, duration, ok = sel.mean(axis=0)
+        peak = sel[:, 2].max()
+        per_100px = (sel[:, 1] / sel[:, 0] * 100).mean()
+        print(f"{name:<22} {low:>4}-{high:<5} {len(sel):>4} "
+              f"{effort:>9.1f} {per_100px:>10.2f} {peak:>8.1f} "
+              f"{duration:>7.2f} {ok:>8.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--track-px-per-deg",
+                        type=float,
+                        default=1.9,
+                        help="camera px the tracking point moves per degree")
+    parser.add_argument("--targets", type=int, default=N_TARGETS)
+    args = parser.parse_args()
+
+    config = json.loads(
+        (Path(__file__).resolve().parent.parent / "configs" / "default" /
+         "cursor.json").read_text())
+    targets = make_targets(args.targets)
+
+    print(f"{'mode':<22} {'distance':<10} {'n':>4} {'effort':>9} "
+          f"{'deg/100px':>10} {'peak':>8} {'time s':>7} {'reached':>8}")
+
+    gain = np.array([config["spd_right"], config["spd_down"]
+                    ]) * args.track_px_per_deg
+    print_table("relative",
+                run_mode(lambda c, t: reach_relative(c, t, gain), targets))
+
+    for curve in CURVES:
+        mapper = JoystickMapper(
+            config["joystick_dead_zone_deg"], config["joystick_max_deg"],
+            (config["joystick_speed_x"], config["joystick_speed_y"]),
+            (curve, curve))
+        print_table(f"joystick curve {curve:g}",
+                    run_mode(lambda c, t: reach_joystick(c, t, mapper),
+                             targets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Engine tick timing while the GUI is idle and while it is under stress.
+
+Starts the app like run_app.py (camera, face model and window), then
+measures the engine tick interval for a while with an idle window and
+again while the Tk thread keeps rebuilding the dropdown previews,
+opening the profile editor, switching pages and saving the profile:
+    python benchmarks/bench_engine_jitter.py
+    python benchmarks/bench_engine_jitter.py --seconds 60 --profile profile_1
+
+The engine runs on its own thread, so the stressed p99 and max should
+stay close to the idle ones.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Assets and configs are read relative to the Windows directory
+os.chdir(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, os.getcwd())
+
+import customtkinter
+
+import src.gui as gui
+from src.config_manager import ConfigManager
+from src.engine import Engine
+from src.gui.gesture_previews import get_preview
+from src.task_killer import TaskKiller
+
+# Let the face model load and the camera settle before measuring
+WARMUP_SEC = 10
+COLLECT_SEC = 0.5
+
+PAGES = ("page_cursor", "page_gestures", "page_keyboard", "page_camera")
+
+
+class TickCollector():
+    """Move engine tick intervals out of its bounded deque on a thread of
+    its own, so no sample is lost while the Tk thread is busy.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.stop_flag = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def loop(self) -> None:
+        intervals = Engine().tick_intervals_ms
+        while not self.stop_flag.wait(COLLECT_SEC):
+            while True:
+                try:
+                    self.samples.append(intervals.popleft())
+                except IndexError:
+                    break
+
+    def take(self) -> np.ndarray:
+        samples, self.samples = self.samples, []
+        return np.array(samples)
+
+
+class GuiStress():
+    """Slow GUI work, one step after the other on the Tk thread.
+    """
+
+    def __init__(self, main_gui: gui.MainGui, every_ms: int):
+        self.main_gui = main_gui
+        self.every_ms = every_ms
+        self.n_steps = 0
+        self.busy_sec = 0
+        self.is_running = False
+
+    def rebuild_previews(self) -> None:
+        dropdown = self.main_gui.pages["page_gestures"].shared_dropdown
+        get_preview.cache_clear()
+        for div in dropdown.divs.values():
+            div["image"] = None
+        dropdown.load_previews()
+
+    def toggle_profile_editor(self) -> None:
+        editor = self.main_gui.frame_profile_editor
+        if editor._displayed:
+            editor.hide_window()
+        else:
+            editor.inner_frame.refresh_frame()
+            editor.show_window()
+
+    def save_profile(self) -> None:
+        ConfigManager().apply_config()
+        ConfigManager().write_config_file()
+        ConfigManager().write_mouse_bindings_file()
+        ConfigManager().write_keyboard_bindings_file()
+
+    def step(self) -> None:
+        if not self.is_running:
+            return
+        start = time.perf_counter()
+        self.rebuild_previews()
+        self.toggle_profile_editor()
+        self.main_gui.change_page(PAGES[self.n_steps % len(PAGES)])
+        self.save_profile()
+        # Let Tk draw the result before the next step
+        self.main_gui.tk_root.update_idletasks()
+        self.busy_sec += time.perf_counter() - start
+        self.n_steps += 1
+        self.main_gui.tk_root.after(self.every_ms, self.step)
+
+    def start(self) -> None:
+        self.is_running = True
+        self.step()
+
+    def stop(self) -> None:
+        self.is_running = False
+        if self.main_gui.frame_profile_editor._displayed:
+            self.main_gui.frame_profile_editor.hide_window()
+
+
+def report(name: str, intervals: np.ndarray, seconds: float,
+           gui_busy_sec: float) -> None:
+    if len(intervals) == 0:
+        print(f"{name:<8} no ticks")
+        return
+    print(f"{name:<8} {len(intervals):>7} {np.percentile(intervals, 50):>8.2f} "
+          f"{np.percentile(intervals, 99):>8.2f} {intervals.max():>8.2f} "
+          f"{gui_busy_sec * 1000 / seconds:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds",
+                        type=float,
+                        default=30,
+                        help="duration of each phase")
+    parser.add_argument("--stress-every-ms",
+                        type=int,
+                        default=50,
+                        help="pause between two GUI stress steps")
+    parser.add_argument("--profile", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    tk_root = customtkinter.CTk()
+    TaskKiller().start(profile_name=args.profile)
+    main_gui = gui.MainGui(tk_root)
+    stress = GuiStress(main_gui, args.stress_every_ms)
+    results = {}
+    collector = None
+
+    def start_idle():
+        nonlocal collector
+        collector = TickCollector()
+        tk_root.after(int(args.seconds * 1000), start_stress)
+
+    def start_stress():
+        results["idle"] = (collector.take(), 0)
+        stress.start()
+        tk_root.after(int(args.seconds * 1000), finish)
+
+    def finish():
+        stress.stop()
+        results["stress"] = (collector.take(), stress.busy_sec)
+        collector.stop_flag.set()
+        tk_root.quit()
+
+    tk_root.after(WARMUP_SEC * 1000, start_idle)
+    tk_root.mainloop()
+
+    print(f"Engine tick interval (ms), {args.seconds:g} s per phase, "
+          f"{stress.n_steps} stress steps")
+    print(f"{'phase':<8} {'ticks':>7} {'p50':>8} {'p99':>8} {'max':>8} "
+          f"{'gui busy ms/s':>12}")
+    for name, (intervals, busy_sec) in results.items():
+        report(name, intervals, args.seconds, busy_sec)
+
+    TaskKiller().exit()
+
+
+if __name__ == "__main__":
+    main()
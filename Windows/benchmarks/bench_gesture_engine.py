@@ -0,0 +1,112 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-frame cost of GestureEngine.update with many rules.
+
+Run from the Windows directory:
+    python benchmarks/bench_gesture_engine.py
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.shape_list as shape_list
+from src.gesture_engine import GestureEngine
+from src.profile_schema import RULE_KINDS, GestureRule
+
+FRAME_MS = 1000 / 30
+GESTURE_EVERY = 30
+
+
+def make_rules(n_rules: int, rng: random.Random) -> list[GestureRule]:
+    names = list(shape_list.blendshape_indices)
+    rules = []
+    for _ in range(n_rules):
+        kind = rng.choice(list(RULE_KINDS))
+        n_gestures = RULE_KINDS[kind][0] or rng.randint(2, 3)
+        rules.append(
+            GestureRule(kind, tuple(rng.sample(names, n_gestures)),
+                        rng.choice([0.3, 0.5, 0.7]), rng.choice([250, 600]),
+                        "keyboard", "a"))
+    return rules
+
+
+def make_frames(n_frames: int, seed: int) -> np.ndarray:
+    """Face at rest with noisy low values, every few frames a random
+    gesture is made for a short while.
+    """
+    rng = np.random.default_rng(seed)
+    n_shapes = len(shape_list.blendshape_names)
+    frames = rng.uniform(0, 0.2, (n_frames, n_shapes)).astype(np.float32)
+    for start in range(0, n_frames, GESTURE_EVERY):
+        length = rng.integers(2, GESTURE_EVERY)
+        frames[start:start + length, rng.integers(n_shapes)] = 0.9
+    return frames
+
+
+def bench(n_rules: int, frames: np.ndarray, seed: int) -> dict:
+    engine = GestureEngine()
+    engine.compile(make_rules(n_rules, random.Random(seed)))
+
+    costs_us = np.empty(len(frames))
+    # Frames without any threshold crossing
+    is_quiet = np.zeros(len(frames), dtype=bool)
+    n_events = 0
+    for i, values in enumerate(frames):
+        prev_active = engine.prev_active
+        t0 = time.perf_counter_ns()
+        n_events += len(engine.update(values, i * FRAME_MS))
+        costs_us[i] = (time.perf_counter_ns() - t0) / 1000
+        is_quiet[i] = np.array_equal(prev_active, engine.prev_active)
+
+    return {
+        "n_rules": n_rules,
+        "n_conditions": len(engine.shape_idxs),
+        "quiet_p50_us": np.percentile(costs_us[is_quiet], 50),
+        "p50_us": np.percentile(costs_us, 50),
+        "p99_us": np.percentile(costs_us, 99),
+        "max_us": costs_us.max(),
+        "events": n_events
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules",
+                        type=int,
+                        nargs="+",
+                        default=[1, 10, 100, 300, 1000])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.seed)
+    print(f"{'rules':>6} {'conds':>6} {'quiet us':>9} {'p50 us':>8} "
+          f"{'p99 us':>8} {'max us':>8} {'events':>8}")
+    for n_rules in args.rules:
+        stats = bench(n_rules, frames, args.seed)
+        print("{n_rules:>6} {n_conditions:>6} {quiet_p50_us:>9.2f} "
+              "{p50_us:>8.2f} {p99_us:>8.2f} {max_us:>8.2f} {events:>8}".format(
+                  **stats))
+
+
+if __name__ == "__main__":
+    main()
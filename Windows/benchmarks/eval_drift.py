@@ -0,0 +1,216 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cursor drift with and without drift compensation on long sessions.
+
+Record a session from a running app with ipc_enabled (one CSV row per
+result: capture time in ms, tracking point x, y):
+    python benchmarks/eval_drift.py record session.csv --minutes 30
+
+Evaluate recorded sessions, or a synthetic one when none is given:
+    python benchmarks/eval_drift.py eval session.csv
+    python benchmarks/eval_drift.py eval --synthetic-minutes 20
+
+Drift is the net cursor displacement built up while the head is at rest,
+per minute. Motion kept is the share of deliberate head motion still
+reaching the cursor.
+"""
+
+import argparse
+import csv
+import json
+import math
+import socket
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.drift_estimator import DriftEstimator
+
+# Head slower than this is at rest, px per second.
+REST_SPEED_PX_S = 20
+# Paths are low-passed over this time before measuring, jitter is hidden by
+# the pointer smoothing of the app and is not drift.
+LOWPASS_SEC = 1.0
+
+TIME_CONSTANTS_SEC = (5, 20, 60)
+DEAD_ZONES_PX = (0, 2, 4)
+
+
+def record(path: str, minutes: float, port: int) -> None:
+    # Pulls in the app config, only needed to record
+    from src.ipc_server import (IPC_HOST, LENGTH_HEADER, TELEMETRY_RECORD,
+                                TYPE_JSON, TYPE_TELEMETRY, recv_exact,
+                                send_message)
+
+    with socket.create_connection((IPC_HOST, port)) as conn, open(
+            path, "w", newline="") as f:
+        send_message(conn, TYPE_JSON,
+                     json.dumps({
+                         "method": "subscribe"
+                     }).encode())
+        writer = csv.writer(f)
+        writer.writerow(["capture_ms", "x", "y"])
+        end_ts = time.perf_counter() + minutes * 60
+        n_rows = 0
+        while time.perf_counter() < end_ts:
+            (length,) = LENGTH_HEADER.unpack(recv_exact(conn,
+                                                        LENGTH_HEADER.size))
+            payload = recv_exact(conn, length)
+            if payload[:1] != TYPE_TELEMETRY:
+                continue
+            _, capture_ms, _, x, y, *_ = TELEMETRY_RECORD.unpack(payload[1:])
+            if math.isnan(x):
+                continue
+            writer.writerow([f"{capture_ms:.1f}", f"{x:.2f}", f"{y:.2f}"])
+            n_rows += 1
+    print(f"Recorded {n_rows} samples to {path}")
+
+
+def load_session(path: str) -> tuple[np.ndarray, np.ndarray]:
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return data[:, 0] / 1000, data[:, 1:3]
+
+
+def synthetic_session(minutes: float,
+                      seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """30 FPS head track: slow slump and wandering posture, jitter, and a
+    deliberate glance away and back every few seconds.
+    """
+    rng = np.random.default_rng(seed)
+    fps = 30
+    n = int(minutes * 60 * fps)
+    t = np.arange(n) / fps
+
+    slump = np.outer(t / 60, [3.0, 12.0])
+    wander = np.cumsum(rng.normal(0, 0.05, (n, 2)), axis=0)
+    jitter = rng.normal(0, 0.5, (n, 2))
+
+    glances = np.zeros((n, 2))
+    i = 0
+    while True:
+        i += int(rng.uniform(3, 8) * fps)
+        if i >= n:
+            break
+        target = rng.uniform(-200, 200, 2)
+        move = int(0.3 * fps)
+        hold = int(rng.uniform(0.5, 3) * fps)
+        ramp = np.linspace(0, 1, move)[:, None] * target
+        segment = np.concatenate([ramp, np.tile(target, (hold, 1)), ramp[::-1]])
+        glances[i:i + len(segment)] = segment[:n - i]
+        i += len(segment)
+
+    return t, 640 + slump + wander + jitter + glances
+
+
+def lowpass(t: np.ndarray, path: np.ndarray) -> np.ndarray:
+    window = max(1, int(round(LOWPASS_SEC / np.median(np.diff(t)))))
+    kernel = np.ones(window) / window
+    return np.stack(
+        [np.convolve(path[:, i], kernel, "same") for i in range(2)], axis=1)
+
+
+def rest_mask(t: np.ndarray, track: np.ndarray) -> np.ndarray:
+    """Samples where the low-passed head is slower than REST_SPEED_PX_S.
+    """
+    speed = np.linalg.norm(np.diff(lowpass(t, track), axis=0),
+                           axis=1) / np.maximum(np.diff(t), 1e-3)
+    return speed < REST_SPEED_PX_S
+
+
+def simulate(t: np.ndarray, track: np.ndarray,
+             estimator: DriftEstimator) -> np.ndarray:
+    """Cursor moves of each sample, like MouseController without speed
+    and smoothing.
+    """
+    if estimator is None:
+        return np.diff(track, axis=0)
+
+    control = np.empty_like(track)
+    prev_t = t[0]
+    for i in range(len(t)):
+        control[i] = estimator.update(track[i], t[i] - prev_t)
+        prev_t = t[i]
+    return np.diff(control, axis=0)
+
+
+def evaluate(t: np.ndarray, track: np.ndarray, estimator) -> dict:
+    cursor = np.cumsum(simulate(t, track, estimator), axis=0)
+    moves = np.diff(lowpass(t[1:], cursor), axis=0, prepend=0)
+    moves[0] = 0
+    is_rest = rest_mask(t, track)
+    minutes = (t[-1] - t[0]) / 60
+
+    # Drift builds up in one direction while jitter cancels out
+    drift = np.linalg.norm(moves[is_rest].sum(axis=0))
+
+    raw_moves = np.diff(lowpass(t, track), axis=0)
+    raw_motion = np.linalg.norm(raw_moves[~is_rest], axis=1).sum()
+    motion = np.linalg.norm(moves[~is_rest], axis=1).sum()
+    return {
+        "drift_px_per_min": drift / minutes,
+        "motion_kept": motion / raw_motion if raw_motion > 0 else 1.0
+    }
+
+
+def run_eval(sessions: list[tuple[str, np.ndarray, np.ndarray]]) -> None:
+    print(f"{'session':<20} {'tau s':>6} {'dead px':>8} {'drift px/min':>13} "
+          f"{'motion kept':>12}")
+    for name, t, track in sessions:
+        configs = [(None, None)] + [(tau, dz) for tau in TIME_CONSTANTS_SEC
+                                    for dz in DEAD_ZONES_PX]
+        for tau, dz in configs:
+            estimator = None if tau is None else DriftEstimator(tau, dz)
+            stats = evaluate(t, track, estimator)
+            tau_txt = "off" if tau is None else str(tau)
+            dz_txt = "-" if dz is None else str(dz)
+            print(f"{name:<20} {tau_txt:>6} {dz_txt:>8} "
+                  f"{stats['drift_px_per_min']:>13.1f} "
+                  f"{stats['motion_kept']:>11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[2:]))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = sub.add_parser("record")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--minutes", type=float, default=30)
+    record_parser.add_argument("--port", type=int, default=47800)
+
+    eval_parser = sub.add_parser("eval")
+    eval_parser.add_argument("paths", nargs="*")
+    eval_parser.add_argument("--synthetic-minutes", type=float, default=20)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path, args.minutes, args.port)
+        return
+
+    if args.paths:
+        sessions = [(Path(p).stem, *load_session(p)) for p in args.paths]
+    else:
+        sessions = [("synthetic", *synthetic_session(args.synthetic_minutes))]
+    run_eval(sessions)
+
+
+if __name__ == "__main__":
+    main()
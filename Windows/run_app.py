@@ -13,58 +13,70 @@
 # limitations under the License.
 
 import logging
+import multiprocessing
 import sys
 
-import customtkinter
-
-import src.gui as gui
-from src.pipeline import Pipeline
-from src.task_killer import TaskKiller
+import src.startup_profiler as startup_profiler
 
 FORMAT = "%(asctime)s %(levelname)s %(name)s: %(funcName)s: %(message)s"
-logging.basicConfig(format=FORMAT,
-                    level=logging.INFO,
-                    handlers=[
-                        logging.FileHandler("log.txt", mode='w'),
-                        logging.StreamHandler(sys.stdout)
-                    ])
 
 
-class MainApp(gui.MainGui, Pipeline):
+def main() -> None:
+    # Record import time of the heavy modules the first window needs, later
+    # imports are free. cv2 and the input libraries are imported when the
+    # camera and controllers start, mediapipe in background when the face
+    # model loads.
+    startup_profiler.profile_imports(
+        ["numpy", "PIL.ImageTk", "customtkinter", "psutil"])
 
-    def __init__(self, tk_root):
-        super().__init__(tk_root)
-        # Wait for window drawing.
-        self.tk_root.wm_protocol("WM_DELETE_WINDOW", self.close_all)
+    # Imported here, the capture process of engine_mode "process" runs this
+    # file again as __mp_main__ and must not load the GUI.
+    with startup_profiler.measure_phase("import src"):
+        import customtkinter
 
-        self.is_active = True
+        import src.gui as gui
+        from src.task_killer import TaskKiller
 
-        # Enter loop
-        self.tk_root.after(1, self.anim_loop)
+    logging.basicConfig(format=FORMAT,
+                        level=logging.INFO,
+                        handlers=[
+                            logging.FileHandler("log.txt", mode='w'),
+                            logging.StreamHandler(sys.stdout)
+                        ])
 
-    def anim_loop(self):
-        try:
-            if self.is_active:
-                # Run detectors and controllers.
-                self.pipeline_tick()
-                self.tk_root.after(1, self.anim_loop)
-        except Exception as e:
-            logging.critical(e, exc_info=e)
+    class MainApp(gui.MainGui):
 
-    def close_all(self):
-        logging.info("Close all")
-        self.is_active = False
-        # Completely clost this process
-        TaskKiller().exit()
+        def __init__(self, tk_root):
+            super().__init__(tk_root)
+            # Wait for window drawing.
+            self.tk_root.wm_protocol("WM_DELETE_WINDOW", self.close_all)
 
+            self.bind_id_map = self.tk_root.bind("<Map>",
+                                                 self.first_map_callback)
+
+        def first_map_callback(self, event):
+            if event.widget is not self.tk_root:
+                return
+            startup_profiler.mark_since_process_start("time_to_first_window")
+            self.tk_root.unbind("<Map>", self.bind_id_map)
+
+        def close_all(self):
+            logging.info("Close all")
+            # Completely clost this process
+            TaskKiller().exit()
 
-if __name__ == "__main__":
     tk_root = customtkinter.CTk()
 
     logging.info("Starting main app.")
     TaskKiller().start()
 
-    main_app = MainApp(tk_root)
+    with startup_profiler.measure_phase("gui"):
+        main_app = MainApp(tk_root)
     main_app.tk_root.mainloop()
 
-    main_app = None
+
+if __name__ == "__main__":
+    # The frozen executable also runs the capture process, which exits
+    # inside freeze_support
+    multiprocessing.freeze_support()
+    main()
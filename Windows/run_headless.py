@@ -0,0 +1,75 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(funcName)s: %(message)s"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run Project Gameface without the GUI.")
+    parser.add_argument("--profile",
+                        default=None,
+                        help="Profile directory name in configs/, "
+                        "the default profile if omitted")
+    parser.add_argument("--active",
+                        action="store_true",
+                        help="Start with face control enabled, "
+                        "otherwise auto_play of the profile decides")
+    parser.add_argument("--log-file",
+                        default=None,
+                        help="Also write the log to this file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if args.log_file is not None:
+        handlers.append(logging.FileHandler(args.log_file, mode='w'))
+    logging.basicConfig(format=FORMAT, level=logging.INFO, handlers=handlers)
+
+    # Import after logging is set, singletons log on import
+    from src.engine import Engine
+    from src.task_killer import TaskKiller
+
+    logging.info("Starting headless engine.")
+    TaskKiller().start(headless=True, profile_name=args.profile)
+    if args.active:
+        Engine().send_command("set_active", {"flag": True})
+
+    stop_flag = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_flag.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_flag.set())
+
+    # Engine and camera run on their own threads, just wait for a signal.
+    # Short waits so the signal handler runs promptly on Windows.
+    while not stop_flag.wait(0.5):
+        pass
+
+    logging.info("Stopping headless engine.")
+    TaskKiller().exit()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,73 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy as np
+
+import src.shape_list as shape_list
+from src.profile_schema import AnalogBinding
+
+
+class AnalogMapper():
+    """Map blendshape values to continuous outputs, one per analog binding.
+
+    A value is normalized over the [low, high] range of its binding,
+    smoothed by an exponential average with the binding time constant, then
+    shaped by the power curve and scaled to the output range. All bindings
+    are computed together on arrays.
+    """
+
+    def __init__(self):
+        self.compile([])
+
+    def compile(self, bindings: list[AnalogBinding]) -> None:
+        """Build the tables for bindings and reset the smoothing.
+        """
+        self.bindings = bindings
+        self.shape_idxs = np.array(
+            [shape_list.blendshape_indices[b.gesture] for b in bindings],
+            dtype=np.intp)
+        self.lows = np.array([b.low for b in bindings])
+        self.spans = np.array([b.high - b.low for b in bindings])
+        self.curves = np.array([b.curve for b in bindings])
+        self.smooth_ms = np.array([b.smooth_ms for b in bindings])
+        self.out_lows = np.array([b.output[0] for b in bindings])
+        self.out_spans = np.array([b.output[1] - b.output[0] for b in bindings])
+        self.levels = np.zeros(len(bindings))
+        self.last_ms = None
+
+    def update(self, blendshape_values, now_ms: float) -> np.ndarray:
+        """Get the outputs of all bindings for a frame.
+
+        Args:
+            blendshape_values (npt.ArrayLike): blendshape values of the frame
+            now_ms (float): monotonic time in milliseconds
+
+        Returns:
+            np.ndarray: one output per binding, in order of the bindings
+        """
+        levels = np.clip(
+            (blendshape_values[self.shape_idxs] - self.lows) / self.spans, 0,
+            1)
+
+        if self.last_ms is None:
+            self.levels = levels
+        else:
+            dt_ms = now_ms - self.last_ms
+            # Time constant 0 follows the gesture without smoothing
+            alpha = 1 - np.exp(-dt_ms / np.maximum(self.smooth_ms, 1e-6))
+            self.levels += alpha * (levels - self.levels)
+        self.last_ms = now_ms
+
+        return self.out_lows + self.out_spans * self.levels**self.curves
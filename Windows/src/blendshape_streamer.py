@@ -0,0 +1,154 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import socket
+import struct
+import time
+
+from src.config_manager import ConfigManager
+from src.detectors.facemesh import N_SHAPES
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("BlendshapeStreamer")
+
+# Field name: number of floats, in packet order
+STREAM_FIELDS = {"track_loc": 2, "head_pose": 3, "blendshapes": N_SHAPES}
+
+# Raw UDP packet: magic, sequence number, capture time (ms), then float32
+# values of the selected fields in STREAM_FIELDS order, little-endian.
+UDP_MAGIC = b"GFBS"
+UDP_HEADER = struct.Struct("<4sId")
+
+OSC_ADDRESS_PREFIX = "/gameface/"
+# Timetag 1 means "immediately"
+OSC_BUNDLE_HEADER = b"#bundle\x00" + struct.pack(">Q", 1)
+
+
+def osc_string(text: str) -> bytes:
+    """Null terminated and padded to a multiple of 4 bytes.
+    """
+    data = text.encode() + b"\x00"
+    return data + b"\x00" * (-len(data) % 4)
+
+
+class BlendshapeStreamer(metaclass=Singleton):
+    """Send detection results to other programs over UDP.
+
+    stream_format "osc" sends an OSC bundle with one message per field
+    (/gameface/track_loc, /gameface/head_pose, /gameface/blendshapes),
+    "udp" sends a compact raw packet. Blendshapes follow the order of
+    shape_list.blendshape_names. The packet is laid out once at start,
+    each send only packs the new values into the same buffer.
+    """
+
+    def __init__(self):
+        logger.info("Intialize BlendshapeStreamer singleton")
+        self.sock = None
+        self.address = None
+        self.packet = None
+        # Fills the UDP header before each send, None for OSC
+        self.header_writer = None
+        # Field name: (struct, offset) in packet
+        self.field_layout = {}
+        self.seq = 0
+        self.last_send_ts = 0
+        self.n_sent = 0
+        self.n_errors = 0
+        self.is_started = False
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start BlendshapeStreamer singleton")
+            config = ConfigManager().config
+            self.address = (config["stream_host"], config["stream_port"])
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Never wait on the engine thread
+            self.sock.setblocking(False)
+
+            fields = [
+                name for name in STREAM_FIELDS
+                if name in config["stream_fields"]
+            ]
+            if config["stream_format"] == "osc":
+                self.build_osc_packet(fields)
+            else:
+                self.build_udp_packet(fields)
+            logger.info(f"Streaming {fields} to {self.address} as "
+                        f"{config['stream_format']}, {len(self.packet)} bytes")
+            self.is_started = True
+
+    def build_udp_packet(self, fields: list[str]) -> None:
+        offset = UDP_HEADER.size
+        for name in fields:
+            field_struct = struct.Struct(f"<{STREAM_FIELDS[name]}f")
+            self.field_layout[name] = (field_struct, offset)
+            offset += field_struct.size
+        self.packet = bytearray(offset)
+        self.header_writer = self.write_udp_header
+
+    def build_osc_packet(self, fields: list[str]) -> None:
+        packet = bytearray(OSC_BUNDLE_HEADER)
+        for name in fields:
+            n_values = STREAM_FIELDS[name]
+            address = osc_string(OSC_ADDRESS_PREFIX + name)
+            type_tags = osc_string("," + "f" * n_values)
+            size = len(address) + len(type_tags) + n_values * 4
+
+            packet += struct.pack(">i", size) + address + type_tags
+            self.field_layout[name] = (struct.Struct(f">{n_values}f"),
+                                       len(packet))
+            packet += bytes(n_values * 4)
+        self.packet = packet
+        self.header_writer = None
+
+    def write_udp_header(self, capture_ms: float) -> None:
+        UDP_HEADER.pack_into(self.packet, 0, UDP_MAGIC, self.seq, capture_ms)
+
+    def send(self, result) -> None:
+        """Stream a FaceMesh result, at most stream_rate_hz times per second.
+        Results without face are not sent.
+        """
+        now = time.perf_counter()
+        if now - self.last_send_ts < 1 / ConfigManager(
+        ).config["stream_rate_hz"]:
+            return
+        if result.track_loc is None or result.blendshapes is None:
+            return
+        self.last_send_ts = now
+
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        if self.header_writer is not None:
+            self.header_writer(result.capture_ms)
+
+        for name, (field_struct, offset) in self.field_layout.items():
+            values = getattr(result, name)
+            if values is None:
+                values = (0.0,) * STREAM_FIELDS[name]
+            field_struct.pack_into(self.packet, offset, *values)
+
+        try:
+            self.sock.sendto(self.packet, self.address)
+            self.n_sent += 1
+        except OSError as e:
+            # Full send buffer or unreachable receiver, drop this packet
+            self.n_errors += 1
+            if self.n_errors == 1:
+                logger.warning(f"Streaming failed: {e}")
+
+    def destroy(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.is_started = False
@@ -0,0 +1,146 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from src.config_manager import ConfigManager
+from src.detectors import FaceMesh
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("Calibrator")
+
+# Relaxed face, then every gesture as big as possible.
+NEUTRAL_SEC = 3
+MAXIMUM_SEC = 15
+
+# Resting noise stays under the neutral level, a single glitch does not set
+# the maximum.
+NEUTRAL_PERCENTILE = 90
+MAXIMUM_PERCENTILE = 98
+
+# Gestures moved less than this are not made during the calibration, they
+# keep the full range above neutral instead of amplifying noise.
+MIN_GESTURE_RANGE = 0.05
+
+PHASE_MESSAGES = {
+    "idle": "",
+    "neutral": "Relax your face",
+    "maximum": "Make each gesture as big as you can",
+    "done": "Calibration saved",
+    "failed": "No face found, try again"
+}
+
+
+class Calibrator(metaclass=Singleton):
+    """Record neutral and maximum blendshape values of the user and save
+    them as the calibration of the current profile.
+
+    FaceMesh turns the calibration into a per blendshape offset and gain,
+    after which 0 is the relaxed face and 1 the biggest gesture the user
+    made, whatever the camera and lighting.
+    """
+
+    def __init__(self):
+        logger.info("Intialize Calibrator singleton")
+        self.lock = threading.Lock()
+        self.phase = "idle"
+        self.phase_end_ts = 0
+        self.samples = {"neutral": [], "maximum": []}
+        self.last_seq = -1
+
+    def start_calibration(self) -> None:
+        logger.info("Start calibration")
+        with self.lock:
+            self.samples = {"neutral": [], "maximum": []}
+            self.phase = "neutral"
+            self.phase_end_ts = time.perf_counter() + NEUTRAL_SEC
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.phase = "idle"
+
+    def is_recording(self) -> bool:
+        return self.phase in ("neutral", "maximum")
+
+    def get_status(self) -> tuple[str, str, float]:
+        """Get phase, message for the user and remaining seconds of the
+        phase.
+        """
+        with self.lock:
+            phase = self.phase
+            remaining = max(0, self.phase_end_ts - time.perf_counter())
+        return phase, PHASE_MESSAGES[phase], remaining
+
+    def update(self, result) -> None:
+        """Record blendshapes of a new result and move to the next phase on
+        time. Called by the pipeline on every tick while recording.
+
+        Args:
+            result (FaceMeshResult): latest detection result
+        """
+        now = time.perf_counter()
+        with self.lock:
+            if self.phase not in ("neutral", "maximum"):
+                return
+            if (result.seq != self.last_seq and
+                    result.landmarks is not None):
+                self.samples[self.phase].append(result.raw_blendshapes)
+                self.last_seq = result.seq
+            if now < self.phase_end_ts:
+                return
+
+            if self.phase == "neutral":
+                self.phase = "maximum"
+                self.phase_end_ts = now + MAXIMUM_SEC
+                return
+            samples = self.samples
+
+        self.finish(samples)
+
+    def finish(self, samples: dict) -> None:
+        if not samples["neutral"] or not samples["maximum"]:
+            with self.lock:
+                self.phase = "failed"
+            return
+
+        neutral = np.percentile(np.stack(samples["neutral"]),
+                                NEUTRAL_PERCENTILE,
+                                axis=0)
+        maximum = np.percentile(np.stack(samples["maximum"]),
+                                MAXIMUM_PERCENTILE,
+                                axis=0)
+        not_made = maximum - neutral < MIN_GESTURE_RANGE
+        maximum[not_made] = 1
+        logger.info(f"Calibrated with {len(samples['neutral'])} neutral and "
+                    f"{len(samples['maximum'])} gesture samples, "
+                    f"{not_made.sum()} gestures not made")
+
+        ConfigManager().set_calibration({
+            "neutral": np.clip(neutral, 0, 1).round(4).tolist(),
+            "maximum": np.clip(maximum, 0, 1).round(4).tolist()
+        })
+        FaceMesh().calc_normalization()
+        with self.lock:
+            self.phase = "done"
+
+    def reset_calibration(self) -> None:
+        """Remove the calibration of the current profile, blendshapes are
+        used as given by the model.
+        """
+        ConfigManager().set_calibration(None)
+        FaceMesh().calc_normalization()
@@ -18,23 +18,35 @@ import threading
 import time
 from threading import Thread
 
-import cv2
 import numpy as np
 import numpy.typing as npt
 from PIL import Image
 
+import src.startup_profiler as startup_profiler
 import src.utils as utils
 from src.config_manager import ConfigManager
 from src.controllers import MouseController
+from src.process_engine import ProcessEngine
 from src.singleton_meta import Singleton
 
 MAX_SEARCH_CAMS = 5
 
 logger = logging.getLogger("CameraManager")
 
+# Slow to import, loaded by CameraManager.start so the first window does not
+# wait for it.
+cv2 = None
 
-def add_overlay(background, overlay, x, y, width, height):
 
+def import_cv2():
+    global cv2
+    if cv2 is not None:
+        return
+    with startup_profiler.measure_phase("import cv2"):
+        cv2 = utils.import_cv2()
+
+
+def add_overlay(background, overlay, x, y, width, height):
     background_section = background[y:y + height, x:x + width]
     overlay_section = overlay[y:y + height, x:x + width]
     background[y:y + height,
@@ -53,7 +65,33 @@ class CameraManager(metaclass=Singleton):
         self.placeholder_im = Image.open("assets/images/placeholder.png")
         self.placeholder_im = np.array(self.placeholder_im.convert('RGB'))
 
-        # Overlays
+        # Overlays, made by start once cv2 is loaded
+        self.overlay_active = None
+        self.overlay_disabled = None
+        self.overlay_face_not_detected = None
+        self.overlay_loading = None
+        self.overlay_model_failed = None
+
+        # Use dict for pass as reference
+        self.frame_buffers = {
+            "raw": self.placeholder_im,
+            "debug": self.placeholder_im
+        }
+        # Increase on every new frame, readers skip work if unchanged
+        self.frame_seqs = {"raw": 0, "debug": 0}
+        # Wall clock time (ms) when the raw frame was read from the camera
+        self.raw_capture_ms = 0
+
+        # Thumbnails for GUI previews, made once per new frame by the
+        # producer. {(buffer_name, (w, h)): (seq, thumbnail)}
+        self.preview_sizes = {"raw": set(), "debug": set()}
+        self.previews = {}
+        self.last_overlay_state = None
+        self.is_process_mode = False
+        self.is_active = False
+        self.is_destroyed = False
+
+    def load_overlays(self) -> None:
         self.overlay_active = cv2.cvtColor(
             cv2.imread("assets/images/overlays/active.png",
                        cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGB)
@@ -63,24 +101,38 @@ class CameraManager(metaclass=Singleton):
         self.overlay_face_not_detected = cv2.cvtColor(
             cv2.imread("assets/images/overlays/face_not_detected.png",
                        cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGB)
-
-        # Use dict for pass as reference
-        self.frame_buffers = {
-            "raw": self.placeholder_im,
-            "debug": self.placeholder_im
-        }
-        self.is_active = False
-        self.is_destroyed = False
+        self.overlay_loading = np.zeros_like(self.overlay_face_not_detected)
+        cv2.putText(self.overlay_loading, "Loading face model...", (24, 66),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2,
+                    cv2.LINE_AA)
+        self.overlay_model_failed = np.zeros_like(
+            self.overlay_face_not_detected)
+        cv2.putText(self.overlay_model_failed,
+                    "Face model failed, see log.txt", (24, 66),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 80, 80), 2,
+                    cv2.LINE_AA)
 
     def start(self):
         if not self.is_active:
             logger.info("Start CameraManager singleton")
-            self.thread_cameras = ThreadCameras(self.frame_buffers)
+            import_cv2()
+            self.load_overlays()
+            self.is_process_mode = ConfigManager(
+            ).config["engine_mode"] == "process"
+            if self.is_process_mode:
+                # Capture runs in the child process, frames come from
+                # shared memory
+                ProcessEngine().set_frame_sink(self.put_frame)
+            else:
+                self.thread_cameras = ThreadCameras(self.frame_buffers,
+                                                    self.put_frame)
             self.is_active = True
 
     def get_camera_list(self) -> list[int]:
         if not self.is_active:
             return []
+        if self.is_process_mode:
+            return ProcessEngine().get_camera_list()
         ret_caps = list(self.thread_cameras.caps.keys())
 
         return sorted(ret_caps)
@@ -88,24 +140,67 @@ class CameraManager(metaclass=Singleton):
     def get_current_camera_id(self) -> int:
         if not self.is_active:
             return None
+        elif self.is_process_mode:
+            return ProcessEngine().get_current_camera_id()
         else:
             return self.thread_cameras.curr_id
 
     def pick_camera(self, camera_id: int) -> None:
         logger.info(f"Swapping to camera id: {camera_id}")
         # Assign to ref
-        self.frame_buffers["raw"] = self.placeholder_im
-        self.frame_buffers["debug"] = self.placeholder_im
-        self.thread_cameras.pick_camera(camera_id)
+        self.put_frame("raw", self.placeholder_im)
+        self.put_frame("debug", self.placeholder_im)
+        if self.is_process_mode:
+            ProcessEngine().pick_camera(camera_id)
+        else:
+            self.thread_cameras.pick_camera(camera_id)
 
     def get_raw_frame(self):
         return self.frame_buffers["raw"].copy()
 
+    def get_raw_capture_ms(self) -> float:
+        return self.raw_capture_ms
+
     def get_debug_frame(self):
         return self.frame_buffers["debug"]
 
     def put_debug_frame(self, frame_debug: npt.ArrayLike) -> None:
-        self.frame_buffers["debug"] = frame_debug
+        self.put_frame("debug", frame_debug)
+
+    def put_frame(self,
+                  buffer_name: str,
+                  frame: npt.ArrayLike,
+                  capture_ms: float = None) -> None:
+        """Store new frame and make thumbnails for registered previews.
+
+        Args:
+            buffer_name (str): "raw" or "debug"
+            frame (npt.ArrayLike): RGB frame, not modified afterwards
+            capture_ms (float, optional): camera read time of a raw frame
+        """
+        seq = self.frame_seqs[buffer_name] + 1
+        for size in list(self.preview_sizes[buffer_name]):
+            thumbnail = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            self.previews[(buffer_name, size)] = (seq, thumbnail)
+
+        self.frame_buffers[buffer_name] = frame
+        if buffer_name == "raw":
+            self.raw_capture_ms = capture_ms if capture_ms is not None else (
+                time.time() * 1000)
+        self.frame_seqs[buffer_name] = seq
+
+    def register_preview(self, buffer_name: str, size: tuple[int,
+                                                              int]) -> None:
+        self.preview_sizes[buffer_name].add(size)
+
+    def get_preview(self, buffer_name: str, size: tuple[int, int]):
+        """Get latest thumbnail of a buffer
+
+        Returns:
+            tuple[int, npt.ArrayLike]: frame sequence number and thumbnail,
+                thumbnail is None until the first frame after registration
+        """
+        return self.previews.get((buffer_name, size), (-1, None))
 
     def leave(self):
         if self.thread_cameras is not None:
@@ -116,44 +211,62 @@ class CameraManager(metaclass=Singleton):
         if self.thread_cameras is not None:
             self.thread_cameras.destroy()
 
-    def draw_overlay(self, track_loc):
+    def draw_overlay(self,
+                     track_loc,
+                     model_ready: bool = True,
+                     model_failed: bool = False):
         if not self.is_active:
             return
 
-        self.frame_buffers["debug"] = self.frame_buffers["raw"].copy()
+        is_mouse_active = MouseController().is_active.get()
 
-        # Disabled
-        if not MouseController().is_active.get():
-            self.frame_buffers["debug"] = add_overlay(
-                self.frame_buffers["debug"], self.overlay_disabled, 0, 0, 640,
-                108)
+        # Same camera frame and same state, debug frame is still valid
+        overlay_state = (self.frame_seqs["raw"], model_ready, model_failed,
+                         is_mouse_active,
+                         None if track_loc is None else tuple(track_loc))
+        if overlay_state == self.last_overlay_state:
             return
+        self.last_overlay_state = overlay_state
 
-        # Face not detected
-        if (track_loc is None):
-            self.frame_buffers["debug"] = add_overlay(
-                self.frame_buffers["debug"], self.overlay_face_not_detected, 0,
-                0, 640, 108)
+        frame_debug = self.frame_buffers["raw"].copy()
 
-            return
+        # Face model could not be loaded
+        if model_failed:
+            frame_debug = add_overlay(frame_debug, self.overlay_model_failed,
+                                      0, 0, 640, 108)
 
-        # Active
+        # Face model still loading
+        elif not model_ready:
+            frame_debug = add_overlay(frame_debug, self.overlay_loading, 0, 0,
+                                      640, 108)
+
+        # Disabled
+        elif not is_mouse_active:
+            frame_debug = add_overlay(frame_debug, self.overlay_disabled, 0, 0,
+                                      640, 108)
+
+        # Face not detected
+        elif (track_loc is None):
+            frame_debug = add_overlay(frame_debug,
+                                      self.overlay_face_not_detected, 0, 0, 640,
+                                      108)
 
-        if ConfigManager().config["use_transformation_matrix"]:
+        # Active
+        elif ConfigManager().config["use_transformation_matrix"]:
             cx = ConfigManager().config["fix_width"] // 2
             cy = ConfigManager().config["fix_height"] // 2
-            cv2.line(self.frame_buffers["debug"], (cx, cy),
+            cv2.line(frame_debug, (cx, cy),
                      (int(track_loc[0]), int(track_loc[1])), (0, 255, 0), 3)
 
-            cv2.circle(self.frame_buffers["debug"],
-                       (int(track_loc[0]), int(track_loc[1])), 6, (255, 0, 0),
-                       -1)
+            cv2.circle(frame_debug, (int(track_loc[0]), int(track_loc[1])), 6,
+                       (255, 0, 0), -1)
 
         else:
-            cv2.circle(self.frame_buffers["debug"],
-                       (int(track_loc[0]), int(track_loc[1])), 4,
+            cv2.circle(frame_debug, (int(track_loc[0]), int(track_loc[1])), 4,
                        (255, 255, 255), -1)
 
+        self.put_frame("debug", frame_debug)
+
 
 # ---------------------------------------------------------------------------- #
 #                                 THREAD CAMERA                                #
@@ -162,13 +275,14 @@ class CameraManager(metaclass=Singleton):
 
 class ThreadCameras():
 
-    def __init__(self, frame_buffers: dict):
+    def __init__(self, frame_buffers: dict, put_frame: callable):
         logger.info("Intializing Threadcamera")
         self.lock = threading.Lock()
         self.pool = futures.ThreadPoolExecutor(max_workers=8)
         self.stop_flag = threading.Event()
         self.assign_done_flag = threading.Event()
         self.frame_buffers = frame_buffers
+        self.put_frame = put_frame
 
         # Open all cameras
         self.caps = {}
@@ -260,23 +374,11 @@ class ThreadCameras():
                 time.sleep(1)
                 continue
 
-            frame.flags.writeable = False
-            h, w, _ = frame.shape
-
-            # Trim image
-            if h != ConfigManager().config["fix_height"] or w != ConfigManager(
-            ).config["fix_width"]:
-                target_width = int(h * 4 / 3)
-                if w > target_width:
-                    trim_width = w - target_width
-                    trim_left = trim_width // 2
-                    trim_right = trim_width - trim_left
-                    frame = frame[:, trim_left:-trim_right, :]
-                frame = cv2.resize(frame,
-                                   (ConfigManager().config["fix_width"],
-                                    ConfigManager().config["fix_height"]))
-            frame = cv2.flip(frame, 1)
-            self.frame_buffers["raw"] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            capture_ms = time.time() * 1000
+            frame = utils.preprocess_frame(frame,
+                                           ConfigManager().config["fix_width"],
+                                           ConfigManager().config["fix_height"])
+            self.put_frame("raw", frame, capture_ms)
 
         return
 
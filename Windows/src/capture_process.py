@@ -0,0 +1,423 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import sys
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+import src.utils as utils
+from src.detectors.facemesh import (IN_FLIGHT_TIMEOUT_MS, MP_TASK_FILE,
+                                    N_SHAPES, WARMUP_TIMEOUT_SEC,
+                                    calc_head_pose, calc_track_loc,
+                                    select_primary_face)
+
+logger = logging.getLogger("CaptureProcess")
+
+# Frames and results kept in shared memory, a reader lagging this many
+# writes behind sees a torn slot and skips it.
+N_SLOTS = 4
+N_LANDMARKS = 478
+MAX_SEARCH_CAMS = 5
+
+# Header fields (int64)
+H_FRAME_SEQ = 0
+H_RESULT_SEQ = 1
+H_READY = 2
+H_STOP = 3
+H_TARGET_FPS = 4
+H_REQ_CAMERA_ID = 5
+H_CURR_CAMERA_ID = 6
+H_CAMERA_MASK = 7
+# Detector counters, see FaceMesh.get_stats
+H_N_SUBMITTED = 8
+H_N_COMPLETED = 9
+H_N_TIMED_OUT = 10
+H_N_SKIPPED_BUSY = 11
+N_HEADER = 12
+
+# Frame meta fields (float64)
+F_SEQ = 0
+F_CAPTURE_MS = 1
+N_FRAME_META = 2
+
+# Result fields (float64)
+R_SEQ = 0
+R_TIMESTAMP_MS = 1
+R_CAPTURE_MS = 2
+R_N_FACES = 3
+R_HAS_FACE = 4
+R_TRACK_LOC = slice(5, 7)
+R_HEAD_POSE = slice(7, 10)
+R_BLENDSHAPES = slice(10, 10 + N_SHAPES)
+R_LANDMARKS = slice(10 + N_SHAPES, 10 + N_SHAPES + N_LANDMARKS * 3)
+N_RESULT = 10 + N_SHAPES + N_LANDMARKS * 3
+
+# Retry delay when no camera is open or it returns no frame
+NO_CAMERA_SLEEP_SEC = 1
+
+
+class SharedFrameRing():
+    """Fixed layout numpy views over one shared memory block.
+
+    Written by the capture process, read by the controller process.
+    Slots are written as: slot seq = -1, data, slot seq = n, header seq = n.
+    Readers copy a slot out and check its seq before and after the copy, a
+    slot overwritten meanwhile is discarded.
+    """
+
+    def __init__(self,
+                 fix_width: int,
+                 fix_height: int,
+                 name: str = None,
+                 create: bool = False):
+        header_size = N_HEADER * 8
+        frame_meta_size = N_SLOTS * N_FRAME_META * 8
+        results_size = N_SLOTS * N_RESULT * 8
+        frames_size = N_SLOTS * fix_height * fix_width * 3
+        total_size = header_size + frame_meta_size + results_size + frames_size
+
+        self.shm = shared_memory.SharedMemory(name=name,
+                                              create=create,
+                                              size=total_size)
+        self.name = self.shm.name
+        buf = self.shm.buf
+
+        offset = 0
+        self.header = np.ndarray(N_HEADER, np.int64, buf, offset)
+        offset += header_size
+        self.frame_meta = np.ndarray((N_SLOTS, N_FRAME_META), np.float64, buf,
+                                     offset)
+        offset += frame_meta_size
+        self.results = np.ndarray((N_SLOTS, N_RESULT), np.float64, buf, offset)
+        offset += results_size
+        self.frames = np.ndarray((N_SLOTS, fix_height, fix_width, 3),
+                                 np.uint8, buf, offset)
+
+        if create:
+            self.header[:] = 0
+            self.header[H_REQ_CAMERA_ID] = -1
+            self.header[H_CURR_CAMERA_ID] = -1
+            self.frame_meta[:] = -1
+            self.results[:] = -1
+
+    def write_frame(self, frame: npt.ArrayLike, capture_ms: float) -> int:
+        seq = int(self.header[H_FRAME_SEQ]) + 1
+        slot = seq % N_SLOTS
+        self.frame_meta[slot, F_SEQ] = -1
+        self.frames[slot] = frame
+        self.frame_meta[slot, F_CAPTURE_MS] = capture_ms
+        self.frame_meta[slot, F_SEQ] = seq
+        self.header[H_FRAME_SEQ] = seq
+        return seq
+
+    def read_frame(self, seq: int):
+        """Copy a frame out of its slot.
+
+        Returns:
+            tuple[npt.ArrayLike, float]: the frame and its capture time,
+                (None, None) if the slot was overwritten
+        """
+        slot = seq % N_SLOTS
+        if self.frame_meta[slot, F_SEQ] != seq:
+            return None, None
+        frame = self.frames[slot].copy()
+        capture_ms = float(self.frame_meta[slot, F_CAPTURE_MS])
+        if self.frame_meta[slot, F_SEQ] != seq:
+            return None, None
+        return frame, capture_ms
+
+    def write_result(self, values: npt.ArrayLike) -> int:
+        seq = int(self.header[H_RESULT_SEQ]) + 1
+        slot = seq % N_SLOTS
+        self.results[slot, R_SEQ] = -1
+        self.results[slot, 1:] = values[1:]
+        self.results[slot, R_SEQ] = seq
+        self.header[H_RESULT_SEQ] = seq
+        return seq
+
+    def read_result(self, seq: int):
+        """Copy a result out of its slot, None if it was overwritten.
+        """
+        slot = seq % N_SLOTS
+        if self.results[slot, R_SEQ] != seq:
+            return None
+        values = self.results[slot].copy()
+        if self.results[slot, R_SEQ] != seq:
+            return None
+        return values
+
+    def close(self, unlink: bool = False) -> None:
+        # Views must go before the buffer can be released
+        self.header = self.frame_meta = self.results = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view of the buffer is still referenced somewhere
+            logger.warning("Shared memory still in use, not closed")
+        if unlink:
+            self.shm.unlink()
+
+
+class CaptureWorker():
+    """Camera capture and face inference, runs inside the child process.
+
+    Works on a plain copy of the config, the singletons of the controller
+    process do not exist here. New copies arrive through config_conn when
+    the profile or its config changes.
+    """
+
+    def __init__(self, ring: SharedFrameRing, config: dict, data_event,
+                 config_conn):
+        self.ring = ring
+        self.config = config
+        self.data_event = data_event
+        self.config_conn = config_conn
+        self.model = None
+        self.caps = {}
+        self.curr_id = None
+        self.latest_time_ms = 0
+        self.last_detect_ts = 0
+        self.in_flight_ts = deque()
+        self.primary_face_center = None
+        self.warmup_done = False
+        self.result_values = np.zeros(N_RESULT, np.float64)
+
+    def load_model(self) -> None:
+        import mediapipe as mp
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import vision
+
+        with open(MP_TASK_FILE, mode="rb") as f:
+            f_buffer = f.read()
+        base_options = python.BaseOptions(model_asset_buffer=f_buffer)
+        options = vision.FaceLandmarkerOptions(
+            base_options=base_options,
+            output_face_blendshapes=True,
+            output_facial_transformation_matrixes=True,
+            running_mode=mp.tasks.vision.RunningMode.LIVE_STREAM,
+            num_faces=self.config["num_faces"],
+            result_callback=self.mp_callback)
+        self.model = vision.FaceLandmarker.create_from_options(options)
+
+        # First inference is much slower than the others
+        frame_np = np.zeros(
+            [self.config["fix_height"], self.config["fix_width"], 3], np.uint8)
+        t_ms = int(time.time() * 1000)
+        self.model.detect_async(
+            mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_np), t_ms)
+        self.latest_time_ms = t_ms
+        deadline = time.perf_counter() + WARMUP_TIMEOUT_SEC
+        while not self.warmup_done and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        self.warmup_done = True
+
+        self.ring.header[H_READY] = 1
+        self.data_event.set()
+        logger.info("Capture process model ready")
+
+    def poll_config(self) -> None:
+        """Take the latest config sent by the controller process, reload
+        the model if its number of faces changed.
+        """
+        config = None
+        while self.config_conn.poll():
+            config = self.config_conn.recv()
+        if config is None:
+            return
+
+        # Shared memory layout is fixed for the life of the process
+        config["fix_width"] = self.config["fix_width"]
+        config["fix_height"] = self.config["fix_height"]
+        reload_model = config["num_faces"] != self.config["num_faces"]
+        self.config = config
+        logger.info("Config updated")
+
+        if reload_model and self.model is not None:
+            logger.info(f"Reload model for {config['num_faces']} faces")
+            self.model.close()
+            # Results of the old model never arrive
+            self.ring.header[H_N_TIMED_OUT] += len(self.in_flight_ts)
+            self.in_flight_ts.clear()
+            self.primary_face_center = None
+            self.warmup_done = False
+            self.load_model()
+
+    def open_cameras(self) -> None:
+        utils.assign_caps_queue(self.caps, lambda: None, MAX_SEARCH_CAMS)
+        mask = 0
+        for cam_id in self.caps:
+            mask |= 1 << cam_id
+        self.ring.header[H_CAMERA_MASK] = mask
+        logger.info(f"Found cameras {list(self.caps.keys())}")
+
+        init_id = self.config["camera_id"]
+        if init_id not in self.caps and len(self.caps) > 0:
+            init_id = list(self.caps.keys())[0]
+        self.pick_camera(init_id)
+
+    def pick_camera(self, new_id: int) -> None:
+        logger.info(f"Pick camera {new_id}, Releasing others...")
+        for cam_id, cap in list(self.caps.items()):
+            if cam_id != new_id and cap is not None:
+                cap.release()
+                self.caps[cam_id] = None
+
+        if self.caps.get(new_id) is None:
+            utils.assign_caps_unblock(self.caps, new_id)
+        self.curr_id = new_id if self.caps.get(new_id) is not None else None
+        self.ring.header[H_REQ_CAMERA_ID] = new_id
+        self.ring.header[H_CURR_CAMERA_ID] = -1 if self.curr_id is None else (
+            self.curr_id)
+
+    def is_graph_busy(self, t_ms: int) -> bool:
+        while self.in_flight_ts and (t_ms - self.in_flight_ts[0] >
+                                     IN_FLIGHT_TIMEOUT_MS):
+            self.in_flight_ts.popleft()
+            self.ring.header[H_N_TIMED_OUT] += 1
+        return len(self.in_flight_ts) >= self.config["max_frames_in_flight"]
+
+    def maybe_detect(self, frame: npt.ArrayLike, capture_ms: float) -> None:
+        """Submit the frame if the rate requested by the controller process
+        allows it and the graph has room.
+        """
+        target_fps = int(self.ring.header[H_TARGET_FPS])
+        if target_fps <= 0:
+            target_fps = self.config["max_fps"]
+        now = time.perf_counter()
+        if now - self.last_detect_ts < 1 / target_fps:
+            return
+
+        t_ms = int(capture_ms)
+        if t_ms <= self.latest_time_ms:
+            return
+        if self.is_graph_busy(t_ms):
+            self.ring.header[H_N_SKIPPED_BUSY] += 1
+            return
+
+        import mediapipe as mp
+        self.in_flight_ts.append(t_ms)
+        self.ring.header[H_N_SUBMITTED] += 1
+        self.model.detect_async(
+            mp.Image(image_format=mp.ImageFormat.SRGB, data=frame), t_ms)
+        self.latest_time_ms = t_ms
+        self.last_detect_ts = now
+
+    def mp_callback(self, mp_result, output_image, timestamp_ms: int) -> None:
+        if not self.warmup_done:
+            self.warmup_done = True
+            return
+
+        while self.in_flight_ts and self.in_flight_ts[0] <= timestamp_ms:
+            self.in_flight_ts.popleft()
+            self.ring.header[H_N_COMPLETED] += 1
+
+        values = self.result_values
+        values[R_TIMESTAMP_MS] = timestamp_ms
+        # Timestamps are capture times in ms
+        values[R_CAPTURE_MS] = timestamp_ms
+        values[R_N_FACES] = len(mp_result.face_landmarks)
+
+        if len(mp_result.face_landmarks) >= 1 and len(
+                mp_result.face_blendshapes) >= 1:
+            face_idx, self.primary_face_center = select_primary_face(
+                mp_result, self.config["primary_face_policy"],
+                self.primary_face_center)
+            values[R_HAS_FACE] = 1
+            values[R_TRACK_LOC] = calc_track_loc(
+                mp_result, face_idx, self.config["use_transformation_matrix"],
+                self.config["fix_width"], self.config["fix_height"],
+                self.config["tracking_vert_idxs"])
+            values[R_HEAD_POSE] = calc_head_pose(
+                mp_result.facial_transformation_matrixes[face_idx])
+            values[R_BLENDSHAPES] = [
+                b.score for b in mp_result.face_blendshapes[face_idx]
+            ]
+            values[R_LANDMARKS] = np.array(
+                [[p.x, p.y, p.z] for p in mp_result.face_landmarks[face_idx]
+                ]).ravel()
+        else:
+            values[R_HAS_FACE] = 0
+
+        self.ring.write_result(values)
+        self.data_event.set()
+
+    def run(self) -> None:
+        utils.import_cv2()
+        self.load_model()
+        self.open_cameras()
+
+        while not self.ring.header[H_STOP]:
+            self.poll_config()
+
+            req_id = int(self.ring.header[H_REQ_CAMERA_ID])
+            if req_id != self.curr_id and req_id >= 0:
+                self.pick_camera(req_id)
+
+            if self.curr_id is None:
+                time.sleep(NO_CAMERA_SLEEP_SEC)
+                continue
+
+            ret, frame = self.caps[self.curr_id].read()
+            if not ret:
+                logger.error("No frame returned")
+                time.sleep(NO_CAMERA_SLEEP_SEC)
+                continue
+            capture_ms = time.time() * 1000
+            frame = utils.preprocess_frame(frame, self.config["fix_width"],
+                                           self.config["fix_height"])
+
+            self.ring.write_frame(frame, capture_ms)
+            self.data_event.set()
+            self.maybe_detect(frame, capture_ms)
+
+        for cap in self.caps.values():
+            if cap is not None:
+                cap.release()
+        if self.model is not None:
+            self.model.close()
+
+
+def capture_process_main(shm_name: str, config: dict, data_event,
+                         config_conn) -> None:
+    """Entry point of the capture process.
+
+    Args:
+        shm_name (str): name of the SharedFrameRing created by the parent
+        config (dict): copy of the current profile config
+        data_event (multiprocessing.Event): set on every new frame or result
+        config_conn (multiprocessing.connection.Connection): receives
+            copies of the config after it changed
+    """
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s: %(funcName)s: %(message)s",
+        level=logging.INFO,
+        handlers=[logging.StreamHandler(sys.stdout)])
+    logger.info("Capture process started")
+
+    ring = SharedFrameRing(config["fix_width"],
+                           config["fix_height"],
+                           name=shm_name)
+    try:
+        CaptureWorker(ring, config, data_event, config_conn).run()
+    except Exception as e:
+        logger.critical(e, exc_info=e)
+    finally:
+        ring.close()
+    logger.info("Capture process stopped")
@@ -12,14 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures as futures
 import copy
 import json
 import logging
+import os
 import shutil
 import time
-import tkinter as tk
 from pathlib import Path
 
+import src.profile_schema as profile_schema
+import src.utils as utils
+from src.profile_schema import AnalogBinding, Binding, GestureRule
 from src.singleton_meta import Singleton
 from src.task_killer import TaskKiller
 
@@ -27,10 +31,119 @@ VERSION = "0.3.34"
 
 DEFAULT_JSON = Path("configs/default.json")
 BACKUP_PROFILE = Path("configs/default")
+BACKUP_CONFIG = Path(BACKUP_PROFILE, "cursor.json")
+PROFILE_FILES = ("cursor.json", "mouse_bindings.json", "keyboard_bindings.json")
+# Optional, combo gestures have no page in the GUI yet.
+GESTURE_RULES_FILE = "gesture_rules.json"
+# Optional, written by the calibration
+CALIBRATION_FILE = "calibration.json"
+# Optional, used with an output_backend
+GAMEPAD_BINDINGS_FILE = "gamepad_bindings.json"
+# Optional, continuous gesture mappings have no page in the GUI yet.
+ANALOG_BINDINGS_FILE = "analog_bindings.json"
+OPTIONAL_PROFILE_FILES = (GESTURE_RULES_FILE, CALIBRATION_FILE,
+                          GAMEPAD_BINDINGS_FILE, ANALOG_BINDINGS_FILE)
+
+# Validated profile in one JSON file next to the JSON files, used while
+# they keep the same modification times. It is plain data checked against
+# PACKED_FIELD_TYPES, profiles can be shared so it is never trusted as code.
+PACKED_CACHE_ENABLED = True
+PACKED_CACHE_FILE = "profile_cache.json"
+PACKED_CACHE_FORMAT = 6
+# Field types of the packed bindings and rules, [type] is a tuple stored as
+# a JSON list.
+PACKED_FIELD_TYPES = {
+    Binding: (str, str, float, str),
+    GestureRule: (str, [str], float, float, str, str),
+    AnalogBinding: (str, str, float, float, float, float, [float])
+}
 
 logger = logging.getLogger("ConfigManager")
 
 
+def unpack_value(value, value_type):
+    if isinstance(value_type, list):
+        if not isinstance(value, list):
+            raise ValueError(f"Expected a list, got {value!r}")
+        return tuple(unpack_value(v, value_type[0]) for v in value)
+    if value_type is float:
+        if not profile_schema.is_number(value):
+            raise ValueError(f"Expected a number, got {value!r}")
+        return float(value)
+    if not isinstance(value, value_type):
+        raise ValueError(f"Expected {value_type.__name__}, got {value!r}")
+    return value
+
+
+def unpack_record(values, record_type):
+    """Convert a JSON list back to a profile_schema NamedTuple.
+    """
+    field_types = PACKED_FIELD_TYPES[record_type]
+    if not isinstance(values, list) or len(values) != len(field_types):
+        raise ValueError(f"Not a packed {record_type.__name__}: {values!r}")
+    return record_type(
+        *(unpack_value(v, t) for v, t in zip(values, field_types)))
+
+
+def unpack_bindings(packed) -> dict:
+    if not isinstance(packed, dict):
+        raise ValueError("Packed bindings must be an object")
+    return {
+        gesture: unpack_record(values, Binding)
+        for gesture, values in packed.items()
+    }
+
+
+def pack_profile(profile: tuple) -> dict:
+    (config, mouse_bindings, keyboard_bindings, gesture_rules, calibration,
+     gamepad_bindings, analog_bindings) = profile
+    return {
+        "config": config,
+        "mouse_bindings": mouse_bindings,
+        "keyboard_bindings": keyboard_bindings,
+        "gesture_rules": gesture_rules,
+        "calibration": calibration,
+        "gamepad_bindings": gamepad_bindings,
+        "analog_bindings": analog_bindings
+    }
+
+
+def unpack_profile(packed) -> tuple:
+    """Rebuild the profile tuple of read_profile from a packed cache.
+
+    Raises:
+        ValueError: packed does not have the expected structure
+    """
+    if not isinstance(packed, dict):
+        raise ValueError("Packed profile must be an object")
+    config = packed.get("config")
+    if not isinstance(config, dict) or not all(
+            field in config and check(config[field])
+            for field, check in profile_schema.CONFIG_SCHEMA.items()):
+        raise ValueError("Invalid packed config")
+
+    calibration = packed.get("calibration")
+    if calibration is not None:
+        calibration, errors = profile_schema.parse_calibration(calibration)
+        if errors:
+            raise ValueError(errors[0])
+
+    for field in ("gesture_rules", "analog_bindings"):
+        if not isinstance(packed.get(field), list):
+            raise ValueError(f"Packed {field} must be a list")
+    gesture_rules = [
+        unpack_record(rule, GestureRule) for rule in packed["gesture_rules"]
+    ]
+    analog_bindings = [
+        unpack_record(binding, AnalogBinding)
+        for binding in packed["analog_bindings"]
+    ]
+
+    return (config, unpack_bindings(packed.get("mouse_bindings")),
+            unpack_bindings(packed.get("keyboard_bindings")), gesture_rules,
+            calibration, unpack_bindings(packed.get("gamepad_bindings")),
+            analog_bindings)
+
 class ConfigManager(metaclass=Singleton):
 
     def __init__(self):
@@ -43,14 +156,42 @@ class ConfigManager(metaclass=Singleton):
 
         # Load config
         self.curr_profile_path = None
-        self.curr_profile_name = tk.StringVar()
+        # Plain thread-safe value, the GUI mirrors it into a Tk variable
+        self.curr_profile_name = utils.SharedVar("")
         self.is_started = False
 
+        # Parsed profiles {profile_name: (mtimes, config, mouse_bindings,
+        # keyboard_bindings)}, an entry is used only while the files keep
+        # the same modification times.
+        self.profile_cache = {}
+        self.last_switch_us = 0
+        # Increased whenever the live bindings change, users rebuild their
+        # lookup tables when it differs from the one they know
+        self.bindings_version = 0
+        self.compiled_bindings = []
+        self.compiled_version = -1
+        # Profile preloading in background
+        self.io_pool = futures.ThreadPoolExecutor(max_workers=1)
+        # All config files are written through it, never on the caller
+        # thread
+        self.writer = utils.JsonWriter()
+
         self.profiles = self.list_profile()
 
-    def start(self):
+    def start(self, profile_name: str = None):
+        """Load the default profile.
+
+        Args:
+            profile_name (str, optional): load this profile instead, without
+                changing the default
+        """
         if not self.is_started:
             logger.info("Start ConfigManager singleton")
+            if profile_name is not None:
+                self.load_profile(profile_name)
+                self.is_started = True
+                return
+
             if not DEFAULT_JSON.is_file():
                 logger.critical(f"Missing {DEFAULT_JSON}, exit program...")
                 TaskKiller().exit()
@@ -64,6 +205,9 @@ class ConfigManager(metaclass=Singleton):
                     f"Failed to load default profile {DEFAULT_JSON}, using first profile instead."
                 )
                 self.load_profile(self.list_profile()[0])
+
+            # Parse the other profiles now so switching never waits for disk
+            self.io_pool.submit(self.preload_profiles)
             self.is_started = True
 
     def list_profile(self) -> list:
@@ -74,73 +218,273 @@ class ConfigManager(metaclass=Singleton):
         logger.info(profile_dirs)
         return profile_dirs
 
+    def get_compiled_bindings(self) -> list:
+        """Bindings of the current profile as [(blendshape_idx, Binding)],
+        rebuilt only when bindings_version changed.
+        """
+        if self.compiled_version != self.bindings_version:
+            self.compiled_bindings = profile_schema.compile_bindings(
+                self.mouse_bindings, self.keyboard_bindings,
+                self.gamepad_bindings)
+            self.compiled_version = self.bindings_version
+        return self.compiled_bindings
+
+    def get_adjacent_profile(self, step: int) -> str:
+        """Name of the profile step positions away from the current one,
+        in alphabetical order and wrapping around.
+        """
+        profiles = sorted(self.profiles)
+        curr_idx = profiles.index(self.curr_profile_name.get())
+        return profiles[(curr_idx + step) % len(profiles)]
+
+    def preload_profiles(self) -> None:
+        for profile_name in list(self.profiles):
+            try:
+                self.read_profile(profile_name)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot preload profile {profile_name}: {e}")
+
     def remove_profile(self, profile_name):
         logger.info(f"Remove profile {profile_name}")
+        self.writer.flush()
         shutil.rmtree(Path(DEFAULT_JSON.parent, profile_name))
         self.profiles.remove(profile_name)
+        self.profile_cache.pop(profile_name, None)
         logger.info(f"Current profiles: {self.profiles}")
 
     def add_profile(self):
         # Random name base on local timestamp
         new_profile_name = "profile_z" + str(hex(int(time.time() * 1000)))[2:]
         logger.info(f"Add profile {new_profile_name}")
+        self.writer.flush()
         shutil.copytree(BACKUP_PROFILE,
-                        Path(DEFAULT_JSON.parent, new_profile_name))
+                        Path(DEFAULT_JSON.parent, new_profile_name),
+                        ignore=shutil.ignore_patterns(PACKED_CACHE_FILE + "*"))
         self.profiles.append(new_profile_name)
         logger.info(f"Current profiles: {self.profiles}")
 
     def rename_profile(self, old_profile_name, new_profile_name):
         logger.info(f"Rename profile {old_profile_name} to {new_profile_name}")
+        self.writer.flush()
         shutil.move(Path(DEFAULT_JSON.parent, old_profile_name),
                     Path(DEFAULT_JSON.parent, new_profile_name))
         self.profiles.remove(old_profile_name)
         self.profiles.append(new_profile_name)
+        self.profile_cache.pop(old_profile_name, None)
 
         if self.curr_profile_name.get() == old_profile_name:
             self.curr_profile_name.set(new_profile_name)
 
-
-
-    def load_profile(self, profile_name: str) -> list[bool, Path]:
+    def fill_missing_config(self, config: dict, backup_config: dict) -> None:
+        """Add fields introduced in newer versions to an old profile,
+        using values from the backup profile.
+        """
+        for field, value in backup_config.items():
+            if field not in config:
+                logger.info(f"Missing {field} in config, using {value}")
+                config[field] = value
+
+    def parse_profile(self, profile_path: Path) -> tuple:
+        """Read the JSON files of a profile, validate them once and convert
+        bindings to Binding.
+        """
+        logger.info(f"Reading profile files: {profile_path}")
+        loaded = []
+        for file_name in PROFILE_FILES:
+            with open(Path(profile_path, file_name)) as f:
+                loaded.append(json.load(f))
+        config, raw_mouse_bindings, raw_keyboard_bindings = loaded
+
+        backup_config = {}
+        if BACKUP_CONFIG.is_file():
+            with open(BACKUP_CONFIG) as f:
+                backup_config = json.load(f)
+        self.fill_missing_config(config, backup_config)
+
+        errors = profile_schema.validate_config(config, backup_config)
+        mouse_bindings, mouse_errors = profile_schema.parse_bindings(
+            raw_mouse_bindings)
+        keyboard_bindings, keyboard_errors = profile_schema.parse_bindings(
+            raw_keyboard_bindings)
+
+        gesture_rules, rule_errors = [], []
+        rules_file = Path(profile_path, GESTURE_RULES_FILE)
+        if rules_file.is_file():
+            with open(rules_file) as f:
+                gesture_rules, rule_errors = (
+                    profile_schema.parse_gesture_rules(json.load(f)))
+
+        calibration, calibration_errors = None, []
+        calibration_file = Path(profile_path, CALIBRATION_FILE)
+        if calibration_file.is_file():
+            with open(calibration_file) as f:
+                calibration, calibration_errors = (
+                    profile_schema.parse_calibration(json.load(f)))
+
+        gamepad_bindings, gamepad_errors = {}, []
+        gamepad_file = Path(profile_path, GAMEPAD_BINDINGS_FILE)
+        if gamepad_file.is_file():
+            with open(gamepad_file) as f:
+                gamepad_bindings, gamepad_errors = (
+                    profile_schema.parse_bindings(json.load(f)))
+            for gesture, binding in list(gamepad_bindings.items()):
+                if binding.device != "gamepad":
+                    gamepad_errors.append(
+                        f"{GAMEPAD_BINDINGS_FILE} only takes gamepad "
+                        f"bindings, got {binding.device!r} for {gesture}")
+                    del gamepad_bindings[gesture]
+
+        analog_bindings, analog_errors = [], []
+        analog_file = Path(profile_path, ANALOG_BINDINGS_FILE)
+        if analog_file.is_file():
+            with open(analog_file) as f:
+                analog_bindings, analog_errors = (
+                    profile_schema.parse_analog_bindings(json.load(f)))
+
+        for error in (errors + mouse_errors + keyboard_errors + rule_errors +
+                      calibration_errors + gamepad_errors + analog_errors):
+            logger.error(f"{profile_path.as_posix()}: {error}")
+
+        return (config, mouse_bindings, keyboard_bindings, gesture_rules,
+                calibration, gamepad_bindings, analog_bindings)
+
+    def read_packed_cache(self, profile_path: Path, mtimes: tuple):
+        """Get profile from its packed cache file if it matches the JSON
+        files, None otherwise.
+        """
+        cache_file = Path(profile_path, PACKED_CACHE_FILE)
+        if not cache_file.is_file():
+            return None
+        try:
+            with open(cache_file) as f:
+                packed = json.load(f)
+            if not isinstance(packed, dict) or packed.get("key") != [
+                    PACKED_CACHE_FORMAT, VERSION, list(mtimes)
+            ]:
+                return None
+            return unpack_profile(packed.get("profile"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignore invalid {cache_file}: {e}")
+            return None
+
+    def write_packed_cache(self, profile_path: Path, mtimes: tuple,
+                           profile: tuple) -> None:
+        cache_file = Path(profile_path, PACKED_CACHE_FILE)
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(
+                    {
+                        "key": [PACKED_CACHE_FORMAT, VERSION,
+                                list(mtimes)],
+                        "profile": pack_profile(profile)
+                    }, f)
+            os.replace(tmp_file, cache_file)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to write {cache_file}: {e}")
+
+    def read_profile(self, profile_name: str) -> tuple:
+        """Get parsed files of a profile. Uses the in-memory cache, then the
+        packed cache file, if the JSON files did not change on disk.
+
+        Returns:
+            tuple: config, mouse_bindings and keyboard_bindings dicts,
+                gesture_rules list, calibration dict or None,
+                gamepad_bindings dict and analog_bindings list, shared with
+                the cache so they must not be modified in place
+        """
         profile_path = Path(DEFAULT_JSON.parent, profile_name)
-        logger.info(f"Loading profile: {profile_path}")
-
-        cursor_config_file = Path(profile_path, "cursor.json")
-        mouse_bindings_file = Path(profile_path, "mouse_bindings.json")
-        keyboard_bindings_file = Path(profile_path, "keyboard_bindings.json")
-
-        if (not cursor_config_file.is_file()) or (
-                not mouse_bindings_file.is_file()) or (
-                    not keyboard_bindings_file.is_file()):
+        try:
+            mtimes = tuple(
+                os.stat(Path(profile_path, file_name)).st_mtime_ns
+                for file_name in PROFILE_FILES)
+            if BACKUP_CONFIG.is_file():
+                # New fields are filled from it
+                mtimes += (os.stat(BACKUP_CONFIG).st_mtime_ns,)
+            for file_name in OPTIONAL_PROFILE_FILES:
+                optional_file = Path(profile_path, file_name)
+                if optional_file.is_file():
+                    mtimes += (file_name, os.stat(optional_file).st_mtime_ns)
+        except FileNotFoundError:
             logger.critical(
                 f"{profile_path.as_posix()} Invalid configuration files or missing files, exit program..."
             )
-            raise FileNotFoundError
+            raise
+
+        cached = self.profile_cache.get(profile_name)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1:]
 
-        # Load cursor config
-        with open(cursor_config_file) as f:
-            self.config = json.load(f)
+        profile = None
+        if PACKED_CACHE_ENABLED:
+            profile = self.read_packed_cache(profile_path, mtimes)
+        if profile is None:
+            profile = self.parse_profile(profile_path)
+            if PACKED_CACHE_ENABLED:
+                self.io_pool.submit(self.write_packed_cache, profile_path,
+                                    mtimes, profile)
 
-        # Load mouse bindings
-        with open(mouse_bindings_file) as f:
-            self.mouse_bindings = json.load(f)
+        self.profile_cache[profile_name] = (mtimes, *profile)
+        return profile
 
-        # Load keyboard bindings
-        with open(keyboard_bindings_file) as f:
-            self.keyboard_bindings = json.load(f)
+    def load_profile(self, profile_name: str) -> None:
+        profile_path = Path(DEFAULT_JSON.parent, profile_name)
+        logger.info(f"Loading profile: {profile_path}")
 
-        self.temp_config = copy.deepcopy(self.config)
-        self.temp_mouse_bindings = copy.deepcopy(self.mouse_bindings)
-        self.temp_keyboard_bindings = copy.deepcopy(self.keyboard_bindings)
+        (self.config, self.mouse_bindings, self.keyboard_bindings,
+         self.gesture_rules, self.calibration, self.gamepad_bindings,
+         self.analog_bindings) = self.read_profile(profile_name)
+
+        # Temp values are only replaced, never modified in place, a shallow
+        # copy is enough
+        self.temp_config = copy.copy(self.config)
+        self.temp_mouse_bindings = copy.copy(self.mouse_bindings)
+        self.temp_keyboard_bindings = copy.copy(self.keyboard_bindings)
+        self.bindings_version += 1
 
         self.curr_profile_path = profile_path
         self.curr_profile_name.set(profile_name)
 
     def switch_profile(self, profile_name: str):
         logger.info(f"Switching to profile: {profile_name}")
+        switch_start = time.perf_counter_ns()
         self.load_profile(profile_name)
-        with open(DEFAULT_JSON, "w") as f:
-            json.dump({"default": profile_name}, f)
+        self.last_switch_us = (time.perf_counter_ns() - switch_start) / 1000
+        logger.info(f"Switched profile in {self.last_switch_us:.0f} us")
+
+        self.writer.schedule(DEFAULT_JSON, {"default": profile_name})
+
+    def update_cache(self) -> None:
+        """Put applied values of the current profile in the cache.
+        The files still have the old modification time until the writer
+        saved them, then the next read parses them again.
+        """
+        profile_name = self.curr_profile_name.get()
+        cached = self.profile_cache.get(profile_name)
+        if cached is not None:
+            self.profile_cache[profile_name] = (cached[0], self.config,
+                                                self.mouse_bindings,
+                                                self.keyboard_bindings,
+                                                self.gesture_rules,
+                                                self.calibration,
+                                                self.gamepad_bindings,
+                                                self.analog_bindings)
+
+    def set_calibration(self, calibration: dict) -> None:
+        """Apply and save the blendshape calibration of the current profile.
+
+        Args:
+            calibration (dict): {"neutral": [...], "maximum": [...]}, one
+                value per blendshape, None removes the calibration
+        """
+        calibration_file = Path(self.curr_profile_path, CALIBRATION_FILE)
+        self.calibration = calibration
+        if calibration is None:
+            self.writer.flush()
+            calibration_file.unlink(missing_ok=True)
+        else:
+            self.writer.schedule(calibration_file, calibration)
+        self.update_cache()
 
     # ------------------------------- BASIC CONFIG ------------------------------- #
 
@@ -152,8 +496,8 @@ class ConfigManager(metaclass=Singleton):
     def write_config_file(self):
         cursor_config_file = Path(self.curr_profile_path, "cursor.json")
         logger.info(f"Writing config file {cursor_config_file}")
-        with open(cursor_config_file, 'w') as f:
-            json.dump(self.config, f, indent=4, separators=(', ', ': '))
+        self.writer.schedule(cursor_config_file, self.config)
+        self.update_cache()
 
     def apply_config(self):
         logger.info("Applying config")
@@ -174,9 +518,9 @@ class ConfigManager(metaclass=Singleton):
         self.remove_temp_mouse_binding(device, action)
 
         # Assign
-        self.temp_mouse_bindings[gesture] = [
-            device, action, float(threshold), trigger_type
-        ]
+        self.temp_mouse_bindings[gesture] = Binding(device, action,
+                                                    float(threshold),
+                                                    trigger_type)
         self.unsave_mouse_bindings = True
 
     def remove_temp_mouse_binding(self, device: str, action: str):
@@ -193,6 +537,7 @@ class ConfigManager(metaclass=Singleton):
     def apply_mouse_bindings(self):
         logger.info("Applying keybinds")
         self.mouse_bindings = copy.deepcopy(self.temp_mouse_bindings)
+        self.bindings_version += 1
         self.write_mouse_bindings_file()
         self.unsave_mouse_bindings = False
 
@@ -200,10 +545,10 @@ class ConfigManager(metaclass=Singleton):
         mouse_bindings_file = Path(self.curr_profile_path,
                                    "mouse_bindings.json")
         logger.info(f"Writing keybinds file {mouse_bindings_file}")
-
-        with open(mouse_bindings_file, 'w') as f:
-            out_json = dict(sorted(self.mouse_bindings.items()))
-            json.dump(out_json, f, indent=4, separators=(', ', ': '))
+        self.writer.schedule(mouse_bindings_file,
+                             self.mouse_bindings,
+                             sort_keys=True)
+        self.update_cache()
 
     # ------------------------------ KEYBOARD BINDINGS CONFIG ----------------------------- #
 
@@ -218,10 +563,9 @@ class ConfigManager(metaclass=Singleton):
         self.remove_temp_keyboard_binding(device, key_action, gesture)
 
         # Assign
-        self.temp_keyboard_bindings[gesture] = [
-            device, key_action,
-            float(threshold), trigger_type
-        ]
+        self.temp_keyboard_bindings[gesture] = Binding(device, key_action,
+                                                       float(threshold),
+                                                       trigger_type)
         self.unsave_keyboard_bindings = True
 
     def remove_temp_keyboard_binding(self,
@@ -253,6 +597,7 @@ class ConfigManager(metaclass=Singleton):
         logger.info("Applying keyboard bindings")
 
         self.keyboard_bindings = copy.deepcopy(self.temp_keyboard_bindings)
+        self.bindings_version += 1
         self.write_keyboard_bindings_file()
         self.unsave_keyboard_bindings = False
 
@@ -260,10 +605,10 @@ class ConfigManager(metaclass=Singleton):
         keyboard_bindings_file = Path(self.curr_profile_path,
                                       "keyboard_bindings.json")
         logger.info(f"Writing keyboard bindings file {keyboard_bindings_file}")
-
-        with open(keyboard_bindings_file, 'w') as f:
-            out_json = dict(sorted(self.keyboard_bindings.items()))
-            json.dump(out_json, f, indent=4, separators=(', ', ': '))
+        self.writer.schedule(keyboard_bindings_file,
+                             self.keyboard_bindings,
+                             sort_keys=True)
+        self.update_cache()
 
     # ---------------------------------------------------------------------------- #
     def apply_all(self):
@@ -273,3 +618,6 @@ class ConfigManager(metaclass=Singleton):
 
     def destroy(self):
         logger.info("Destory")
+        self.io_pool.shutdown(wait=True)
+        # Finish pending writes
+        self.writer.flush_and_stop()
@@ -12,5 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from .gamepad_controller import *
 from .keybinder import *
 from .mouse_controller import *
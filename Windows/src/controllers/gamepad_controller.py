@@ -0,0 +1,134 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+import src.utils as utils
+from src.config_manager import ConfigManager
+from src.controllers.mouse_controller import (JOYSTICK_STALE_SEC, N_BUFFER,
+                                              MouseController)
+from src.joystick_mapper import JoystickMapper
+from src.output_backends import OutputBackend, create_backend
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("GamepadController")
+
+
+class GamepadController(metaclass=Singleton):
+    """Drive a virtual gamepad from the engine thread.
+
+    With cursor_mode "gamepad" the head pose moves gamepad_stick like an
+    analog stick, using the joystick dead zone, max angle and curves.
+    Bindings of device "gamepad" press buttons and triggers through
+    Keybinder. The state is sent once per result, centered while face
+    control is paused and when the head pose is older than
+    JOYSTICK_STALE_SEC.
+    """
+
+    def __init__(self):
+        logger.info("Intialize GamepadController singleton")
+        self.backend: OutputBackend = None
+        self.joystick = None
+        # Head pose buffer yaw, pitch, smoothed like the pointer
+        self.pose_buffer = np.zeros([N_BUFFER, 2])
+        self.head_pose_ts = 0
+        self.restart_smoothing = True
+        self.was_active = False
+        self.is_started = False
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start GamepadController singleton")
+            self.backend = create_backend(
+                ConfigManager().config["output_backend"])
+            if self.backend is None:
+                return
+            self.joystick = JoystickMapper(*self.get_joystick_params())
+            self.is_started = True
+
+    def get_joystick_params(self) -> tuple:
+        config = ConfigManager().config
+        # Full speed is full stick deflection
+        return (config["joystick_dead_zone_deg"], config["joystick_max_deg"],
+                (1.0, 1.0),
+                (config["joystick_curve_x"], config["joystick_curve_y"]))
+
+    def calc_joystick(self) -> None:
+        if self.joystick is not None:
+            self.joystick.configure(*self.get_joystick_params())
+
+    def recenter(self) -> None:
+        """Take the current head pose as neutral.
+        """
+        if self.joystick is not None:
+            self.joystick.recenter()
+        self.restart_smoothing = True
+
+    def set_button(self, button: str, is_down: bool) -> None:
+        self.backend.set_button(button, is_down)
+
+    def set_trigger(self, trigger: str, value: float) -> None:
+        self.backend.set_trigger(trigger, value)
+
+    def act(self, head_pose: npt.ArrayLike) -> None:
+        """Move the stick and send the state of this result.
+
+        Args:
+            head_pose (npt.ArrayLike): yaw, pitch, roll in degrees or None
+        """
+        is_active = MouseController().is_active.get()
+        if is_active and not self.was_active:
+            self.recenter()
+        self.was_active = is_active
+
+        if not is_active:
+            self.backend.reset()
+        elif ConfigManager().config["cursor_mode"] == "gamepad":
+            stick = ConfigManager().config["gamepad_stick"]
+            if head_pose is None:
+                self.backend.set_stick(stick, 0.0, 0.0)
+            else:
+                self.head_pose_ts = time.perf_counter()
+                if self.restart_smoothing:
+                    self.pose_buffer[:] = head_pose[:2]
+                    self.restart_smoothing = False
+                self.pose_buffer = np.roll(self.pose_buffer, shift=-1, axis=0)
+                self.pose_buffer[-1] = head_pose[:2]
+                vel_x, vel_y = self.joystick.update(
+                    utils.apply_smoothing(self.pose_buffer,
+                                          MouseController().smooth_kernel))
+                # Head down moves the cursor down, the stick y points up
+                self.backend.set_stick(stick, vel_x, -vel_y)
+        self.backend.flush()
+
+    def release_stale(self) -> None:
+        """Called on ticks without a new result. Centers the stick once the
+        last head pose is stale and releases everything when face control
+        was paused meanwhile.
+        """
+        if (not MouseController().is_active.get()) or (
+                time.perf_counter() - self.head_pose_ts > JOYSTICK_STALE_SEC):
+            self.act(None)
+
+    def destroy(self):
+        if self.backend is not None:
+            self.backend.reset()
+            self.backend.flush()
+            self.backend.close()
+        self.is_started = False
@@ -12,24 +12,42 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
 import logging
 import math
+import sys
 import time
 
-import pydirectinput
-import win32api
-
 import src.shape_list as shape_list
+import src.startup_profiler as startup_profiler
 from src.config_manager import ConfigManager
+from src.controllers.gamepad_controller import GamepadController
 from src.controllers.mouse_controller import MouseController
+from src.analog_mapper import AnalogMapper
+from src.gesture_engine import GestureEngine
 from src.singleton_meta import Singleton
 
 logger = logging.getLogger("Keybinder")
 
-# disable lag
-pydirectinput.PAUSE = 0
-pydirectinput.FAILSAFE = False
+# Input libraries are slow to import, they are loaded by Keybinder.start so
+# the first window does not wait for them.
+pydirectinput = None
+win32api = None
+
+
+def import_input_libs():
+    global pydirectinput, win32api
+    if pydirectinput is not None:
+        return
+    with startup_profiler.measure_phase("import pydirectinput"):
+        if sys.platform == "win32":
+            import pydirectinput
+            import win32api
+        else:
+            # Headless runs on other systems, pyautogui has the same functions
+            import pyautogui as pydirectinput
+    # disable lag
+    pydirectinput.PAUSE = 0
+    pydirectinput.FAILSAFE = False
 
 
 class Keybinder(metaclass=Singleton):
@@ -41,11 +59,23 @@ class Keybinder(metaclass=Singleton):
         self.start_hold_ts = math.inf
         self.holding = False
         self.is_started = False
-        self.last_know_keybinds = {}
+        self.key_states = {}
+        # [(blendshape_idx, device, action, thres, mode, state_name)]
+        self.compiled_bindings = []
+        self.bindings_version = -1
+        self.gesture_engine = GestureEngine()
+        # Indices of gesture rules with their action down
+        self.held_rules = set()
+        self.analog_mapper = AnalogMapper()
+        # Scroll actions: rate of this frame and start of each held one
+        self.action_scroll_rate = 0.0
+        self.scroll_start_ts = {}
+        self.drag_locked = False
 
     def start(self):
         if not self.is_started:
             logger.info("Start Keybinder singleton")
+            import_input_libs()
             self.init_states()
             self.screen_w, self.screen_h = pydirectinput.size()
             self.monitors = self.get_monitors()
@@ -54,20 +84,70 @@ class Keybinder(metaclass=Singleton):
     def init_states(self) -> None:
         """Re initializes the state of the keybinder.
            If new keybinds are added.
+
+        Bindings are compiled into a flat list once per change, so act does
+        no dict merging or lookups per frame. States of bindings kept in the
+        new table carry over, a gesture still held after a profile switch
+        does not trigger again.
         """
-        # keep states for all registered keys.
-        self.key_states = {}
-        for _, v in (ConfigManager().mouse_bindings |
-                     ConfigManager().keyboard_bindings).items():
-            self.key_states[v[0] + "_" + v[1]] = False
-        self.key_states["holding"] = False
-        self.last_know_keybinds = copy.deepcopy(
-            (ConfigManager().mouse_bindings |
-             ConfigManager().keyboard_bindings))
+        self.bindings_version = ConfigManager().bindings_version
+        compiled = []
+        key_states = {}
+        for idx, binding in ConfigManager().get_compiled_bindings():
+            device, action, thres, mode = binding
+            state_name = device + "_" + action
+            compiled.append((idx, device, action, thres, mode, state_name))
+            key_states[state_name] = self.key_states.get(state_name, False)
+        key_states["holding"] = self.key_states.get("holding", False)
+
+        self.release_removed(key_states)
+        self.key_states = key_states
+        self.compiled_bindings = compiled
+
+        # Chords kept in the new rules stay held, the others are released
+        old_rules = self.gesture_engine.rules
+        self.gesture_engine.compile(ConfigManager().gesture_rules)
+        new_rules = self.gesture_engine.rules
+        held_rules = set()
+        for rule_idx in list(self.held_rules):
+            rule = old_rules[rule_idx]
+            new_idx = new_rules.index(rule) if rule in new_rules else None
+            if (new_idx is not None) and self.gesture_engine.chord_down[new_idx]:
+                held_rules.add(new_idx)
+            else:
+                self.rule_action(rule, False, rule_idx)
+        self.held_rules = held_rules
+        self.analog_mapper.compile(ConfigManager().analog_bindings)
+
+        # Nothing could unlock the drag anymore
+        if self.drag_locked and ("mouse_drag_lock" not in key_states) and (
+                not any(rule.action == "drag_lock"
+                        for rule in ConfigManager().gesture_rules)):
+            self.toggle_drag_lock()
+
+    def release_removed(self, new_key_states: dict) -> None:
+        """Release keys and buttons held by bindings which no longer exist.
+        """
+        for state_name, is_down in self.key_states.items():
+            if (not is_down) or (state_name in new_key_states):
+                continue
+            device, action = state_name.split("_", 1)
+            if device == "keyboard":
+                pydirectinput.keyUp(action)
+            elif device == "mouse" and action in ("left", "right", "middle"):
+                if self.holding:
+                    pydirectinput.mouseUp(button=action)
+                    self.holding = False
+                    self.start_hold_ts = math.inf
+            elif device == "gamepad":
+                self.gamepad_action(0, action, 1)
 
     def get_monitors(self) -> list[dict]:
         out_list = []
-        monitors = win32api.EnumDisplayMonitors()
+        if win32api is None:
+            monitors = [(None, None, (0, 0, self.screen_w, self.screen_h))]
+        else:
+            monitors = win32api.EnumDisplayMonitors()
         for i, (_, _, loc) in enumerate(monitors):
             mon_info = {}
             mon_info["id"] = i
@@ -130,6 +210,83 @@ class Keybinder(metaclass=Singleton):
                     self.holding = False
                     self.start_hold_ts = math.inf
 
+    def scroll_action(self, val, action, thres) -> None:
+        """Scroll while the gesture is held, the first notch at once. The
+        rate goes from scroll_rate to scroll_max_rate the longer or the
+        stronger the gesture is held.
+        """
+        state_name = "mouse_" + action
+        direction = 1 if action == "scroll_up" else -1
+
+        if val > thres:
+            now = time.perf_counter()
+            if self.key_states[state_name] is False:
+                self.key_states[state_name] = True
+                self.scroll_start_ts[action] = now
+                MouseController().scroll(direction)
+
+            config = ConfigManager().config
+            held = (now - self.scroll_start_ts[action]) * 1000 / config[
+                "scroll_ramp_ms"]
+            strength = (val - thres) / max(1 - thres, 1e-6)
+            level = min(max(held, strength), 1.0)
+            self.action_scroll_rate += direction * (
+                config["scroll_rate"] +
+                (config["scroll_max_rate"] - config["scroll_rate"]) * level)
+
+        elif self.key_states[state_name] is True:
+            self.key_states[state_name] = False
+
+    def drag_lock_action(self, val, thres) -> None:
+        """Press the left button on one gesture, release it on the next.
+        """
+        state_name = "mouse_drag_lock"
+
+        if (val > thres) and (self.key_states[state_name] is False):
+            self.key_states[state_name] = True
+            self.toggle_drag_lock()
+
+        elif (val < thres) and (self.key_states[state_name] is True):
+            self.key_states[state_name] = False
+
+    def toggle_drag_lock(self) -> None:
+        if self.drag_locked:
+            pydirectinput.mouseUp(button="left")
+        else:
+            pydirectinput.mouseDown(button="left")
+        self.drag_locked = not self.drag_locked
+        logger.info(f"Drag lock {'on' if self.drag_locked else 'off'}")
+
+    def profile_action(self, val, action, thres) -> None:
+        """Switch profile on the rising edge of the gesture.
+        action is "next", "prev" or a profile name.
+        """
+        state_name = "profile_" + action
+
+        if (val > thres) and (self.key_states[state_name] is False):
+            self.key_states[state_name] = True
+            self.switch_profile(action)
+
+        elif (val < thres) and (self.key_states[state_name] is True):
+            self.key_states[state_name] = False
+
+    def switch_profile(self, action) -> None:
+        if action == "next":
+            target = ConfigManager().get_adjacent_profile(1)
+        elif action == "prev":
+            target = ConfigManager().get_adjacent_profile(-1)
+        else:
+            target = action
+
+        if target not in ConfigManager().profiles:
+            logger.warning(f"Profile {target} not found")
+            return
+
+        # Engine imports the controllers, import at use.
+        # Switch runs at the start of the next tick.
+        from src.engine import Engine
+        Engine().send_command("switch_profile", {"profile_name": target})
+
     def keyboard_action(self, val, keysym, thres, mode):
 
         state_name = "keyboard_" + keysym
@@ -142,6 +299,103 @@ class Keybinder(metaclass=Singleton):
             pydirectinput.keyUp(keysym)
             self.key_states[state_name] = False
 
+    def gamepad_action(self, val, control, thres) -> None:
+        """Buttons are held as long as the gesture, triggers are pressed in
+        proportion to the gesture beyond its threshold.
+        """
+        if not GamepadController().is_started:
+            return
+        state_name = "gamepad_" + control
+
+        if control in shape_list.gamepad_triggers:
+            value = max(val - thres, 0) / max(1 - thres, 1e-6)
+            GamepadController().set_trigger(control, value)
+            self.key_states[state_name] = value > 0
+
+        elif (self.key_states[state_name] is False) and (val > thres):
+            GamepadController().set_button(control, True)
+            self.key_states[state_name] = True
+
+        elif (self.key_states[state_name] is True) and (val < thres):
+            GamepadController().set_button(control, False)
+            self.key_states[state_name] = False
+
+    def rule_action(self, rule, is_down: bool, rule_idx: int) -> None:
+        """Press or release the action of a gesture rule. Instant rules
+        press and release in the same frame, which is a click or a key tap.
+        """
+        if not is_down:
+            if rule_idx not in self.held_rules:
+                return
+            self.held_rules.discard(rule_idx)
+            if rule.device == "keyboard":
+                pydirectinput.keyUp(rule.action)
+            elif rule.device == "mouse" and rule.action in ("left", "right",
+                                                            "middle"):
+                pydirectinput.mouseUp(button=rule.action)
+            elif rule.device == "gamepad" and GamepadController().is_started:
+                GamepadController().set_button(rule.action, False)
+            return
+
+        if rule.device == "profile":
+            self.switch_profile(rule.action)
+        elif (rule.device == "mouse") and (rule.action == "pause"):
+            MouseController().toggle_active()
+        elif not MouseController().is_active.get():
+            return
+        elif rule.device == "keyboard":
+            pydirectinput.keyDown(rule.action)
+            self.held_rules.add(rule_idx)
+        elif rule.device == "gamepad":
+            if GamepadController().is_started:
+                GamepadController().set_button(rule.action, True)
+                self.held_rules.add(rule_idx)
+        elif rule.action in ("left", "right", "middle"):
+            pydirectinput.mouseDown(button=rule.action)
+            self.held_rules.add(rule_idx)
+        elif rule.action in ("scroll_up", "scroll_down"):
+            MouseController().scroll(1 if rule.action == "scroll_up" else -1)
+        elif rule.action == "drag_lock":
+            self.toggle_drag_lock()
+        elif rule.action in ("reset", "cycle"):
+            mon_id = self.get_curr_monitor()
+            if rule.action == "cycle":
+                mon_id = (mon_id + 1) % len(self.monitors)
+            pydirectinput.moveTo(self.monitors[mon_id]["center_x"],
+                                 self.monitors[mon_id]["center_y"])
+            if rule.action == "reset":
+                MouseController().recenter()
+                GamepadController().recenter()
+
+    def act_rules(self, blendshape_values) -> None:
+        rules = self.gesture_engine.rules
+        for rule_idx, is_down in self.gesture_engine.update(
+                blendshape_values,
+                time.perf_counter() * 1000):
+            self.rule_action(rules[rule_idx], is_down, rule_idx)
+
+    def act_analog(self, blendshape_values) -> tuple[float, float]:
+        """Send outputs of analog bindings to the gamepad.
+
+        Returns:
+            tuple[float, float]: cursor speed scale and scroll rate, neutral
+                values without binding
+        """
+        outputs = self.analog_mapper.update(blendshape_values,
+                                            time.perf_counter() * 1000)
+        speed_scale = 1.0
+        scroll_rate = 0.0
+        for binding, value in zip(self.analog_mapper.bindings,
+                                  outputs.tolist()):
+            if binding.target == "cursor_speed":
+                speed_scale *= value
+            elif binding.target == "scroll":
+                scroll_rate += value
+            elif GamepadController().is_started:
+                GamepadController().set_trigger(
+                    binding.target.split("_")[1], value)
+        return speed_scale, scroll_rate
+
     def act(self, blendshape_values) -> dict:
         """Trigger devices action base on blendshape values
 
@@ -155,28 +409,26 @@ class Keybinder(metaclass=Singleton):
         if blendshape_values is None:
             return
 
-        if (ConfigManager().mouse_bindings |
-                ConfigManager().keyboard_bindings) != self.last_know_keybinds:
+        if ConfigManager().bindings_version != self.bindings_version:
             self.init_states()
 
-        for shape_name, v in (ConfigManager().mouse_bindings |
-                              ConfigManager().keyboard_bindings).items():
-            if shape_name not in shape_list.blendshape_names:
-                continue
-            device, action, thres, mode = v
+        self.act_rules(blendshape_values)
+        speed_scale, scroll_rate = self.act_analog(blendshape_values)
+        self.action_scroll_rate = 0.0
+
+        # Never keep the button down while paused
+        if self.drag_locked and not MouseController().is_active.get():
+            self.toggle_drag_lock()
 
-            # Get blendshape value
-            idx = shape_list.blendshape_indices[shape_name]
+        for idx, device, action, thres, mode, state_name in (
+                self.compiled_bindings):
             val = blendshape_values[idx]
 
-            if (device == "mouse") and (action == "pause"):
-                state_name = "mouse_" + action
+            if device == "profile":
+                self.profile_action(val, action, thres)
 
+            elif (device == "mouse") and (action == "pause"):
                 if (val > thres) and (self.key_states[state_name] is False):
-                    mon_id = self.get_curr_monitor()
-                    if mon_id is None:
-                        return
-
                     MouseController().toggle_active()
 
                     self.key_states[state_name] = True
@@ -188,23 +440,27 @@ class Keybinder(metaclass=Singleton):
                 if device == "mouse":
 
                     if action == "reset":
-                        state_name = "mouse_" + action
                         if (val > thres) and (self.key_states[state_name] is
                                               False):
                             mon_id = self.get_curr_monitor()
-                            if mon_id is None:
-                                return
-
                             pydirectinput.moveTo(
                                 self.monitors[mon_id]["center_x"],
                                 self.monitors[mon_id]["center_y"])
+                            # Current head position is the new neutral
+                            MouseController().recenter()
+                            GamepadController().recenter()
                             self.key_states[state_name] = True
                         elif (val < thres) and (self.key_states[state_name] is
                                                 True):
                             self.key_states[state_name] = False
 
+                    elif action in ("scroll_up", "scroll_down"):
+                        self.scroll_action(val, action, thres)
+
+                    elif action == "drag_lock":
+                        self.drag_lock_action(val, thres)
+
                     elif action == "cycle":
-                        state_name = "mouse_" + action
                         if (val > thres) and (self.key_states[state_name] is
                                               False):
                             mon_id = self.get_curr_monitor()
@@ -223,6 +479,13 @@ class Keybinder(metaclass=Singleton):
                 elif device == "keyboard":
                     self.keyboard_action(val, action, thres, mode)
 
+                elif device == "gamepad":
+                    self.gamepad_action(val, action, thres)
+
+        MouseController().set_analog(speed_scale,
+                                     scroll_rate + self.action_scroll_rate)
+
     def destroy(self):
         """Destroy the keybinder"""
-        return
+        if self.drag_locked:
+            self.toggle_drag_lock()
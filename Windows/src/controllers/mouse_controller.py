@@ -13,27 +13,54 @@
 # limitations under the License.
 import concurrent.futures as futures
 import logging
+import sys
 import threading
 import time
-import tkinter as tk
 
 import numpy as np
 import numpy.typing as npt
-import pyautogui
 
+import src.startup_profiler as startup_profiler
 import src.utils as utils
 from src.accel_graph import SigmoidAccel
 from src.config_manager import ConfigManager
+from src.drift_estimator import DriftEstimator
+from src.joystick_mapper import JoystickMapper
 from src.singleton_meta import Singleton
+from src.wheel_dispatcher import WheelDispatcher
 
 logger = logging.getLogger("MouseController")
 
-pyautogui.PAUSE = 0
-pyautogui.FAILSAFE = False
+# Slow to import, loaded by MouseController.start so the first window does
+# not wait for it.
+pyautogui = None
+
+
+def import_pyautogui():
+    global pyautogui
+    if pyautogui is not None:
+        return
+    with startup_profiler.measure_phase("import pyautogui"):
+        import pyautogui
+    pyautogui.PAUSE = 0
+    pyautogui.FAILSAFE = False
 
 # Max buffer number for apply smoothing.
 N_BUFFER = 100
 
+# Joystick mode releases the stick when the head pose is older than this.
+JOYSTICK_STALE_SEC = 0.3
+
+# Longest step of joystick motion, a stalled tick does not jump the cursor.
+JOYSTICK_MAX_DT_SEC = 0.1
+
+# Analog outputs older than this are dropped, no scrolling on without face.
+ANALOG_STALE_SEC = 0.3
+
+# pyautogui.scroll takes raw wheel units on Windows, 120 is one notch, so
+# scrolling there is smooth instead of notch by notch.
+WHEEL_UNITS_PER_NOTCH = 120 if sys.platform == "win32" else 1
+
 
 class MouseController(metaclass=Singleton):
 
@@ -42,6 +69,8 @@ class MouseController(metaclass=Singleton):
         self.prev_x = 0
         self.prev_y = 0
         self.curr_track_loc = None
+        self.curr_head_pose = None
+        self.head_pose_ts = 0
         self.smooth_kernel = None
         self.delay_count = 0
         self.top_count = 0
@@ -49,19 +78,44 @@ class MouseController(metaclass=Singleton):
         self.is_destroyed = False
         self.stop_flag = None
         self.is_active = None
+        self.has_moved = False
+        self.drift = None
+        self.recenter_flag = threading.Event()
+        self.drift_enabled = False
+        self.last_loop_ts = None
+        self.joystick = None
+        self.cursor_mode = None
+        self.move_residual = np.zeros(2)
+        # Analog bindings
+        self.speed_scale = 1.0
+        self.scroll_rate = 0.0
+        self.analog_ts = 0
+        self.last_scroll_ts = None
+        self.wheel = None
 
     def start(self):
         if not self.is_started:
             logger.info("Start MouseController singleton")
+            import_pyautogui()
             # Trackpoint buffer x, y
             self.buffer = np.zeros([N_BUFFER, 2])
+            # Head pose buffer yaw, pitch
+            self.pose_buffer = np.zeros([N_BUFFER, 2])
             self.accel = SigmoidAccel()
             self.pool = futures.ThreadPoolExecutor(max_workers=1)
             self.screen_w, self.screen_h = pyautogui.size()
+            self.wheel = WheelDispatcher(
+                WHEEL_UNITS_PER_NOTCH,
+                ConfigManager().config["scroll_dispatch_ms"] / 1000)
             self.calc_smooth_kernel()
+            self.drift = DriftEstimator(
+                ConfigManager().config["drift_time_constant_sec"],
+                ConfigManager().config["drift_dead_zone_px"])
+            self.joystick = JoystickMapper(*self.get_joystick_params())
 
-            self.is_active = tk.BooleanVar()
-            self.is_active.set(ConfigManager().config["auto_play"])
+            # Read by engine and mouse threads, never use a Tk variable here
+            self.is_active = utils.SharedVar(
+                ConfigManager().config["auto_play"])
 
             self.stop_flag = threading.Event()
             self.pool.submit(self.main_loop)
@@ -78,6 +132,22 @@ class MouseController(metaclass=Singleton):
         else:
             pass
 
+        if self.drift is not None:
+            self.drift.configure(
+                ConfigManager().config["drift_time_constant_sec"],
+                ConfigManager().config["drift_dead_zone_px"])
+        if self.joystick is not None:
+            self.joystick.configure(*self.get_joystick_params())
+        if self.wheel is not None:
+            self.wheel.configure(ConfigManager().config["scroll_dispatch_ms"] /
+                                 1000)
+
+    def get_joystick_params(self) -> tuple:
+        config = ConfigManager().config
+        return (config["joystick_dead_zone_deg"], config["joystick_max_deg"],
+                (config["joystick_speed_x"], config["joystick_speed_y"]),
+                (config["joystick_curve_x"], config["joystick_curve_y"]))
+
     def asymmetry_scale(self, vel_x, vel_y):
         if vel_x > 0:
             vel_x *= ConfigManager().config["spd_right"]
@@ -91,8 +161,141 @@ class MouseController(metaclass=Singleton):
 
         return vel_x, vel_y
 
-    def act(self, track_loc: npt.ArrayLike):
+    def act(self, track_loc: npt.ArrayLike, head_pose: npt.ArrayLike = None):
         self.curr_track_loc = track_loc
+        if head_pose is not None:
+            self.curr_head_pose = head_pose
+            self.head_pose_ts = time.perf_counter()
+
+    def set_analog(self, speed_scale: float, scroll_rate: float) -> None:
+        """Outputs of the analog bindings and scroll actions for the latest
+        result.
+
+        Args:
+            speed_scale (float): scale of the cursor speed
+            scroll_rate (float): wheel notches per second, positive is up
+        """
+        self.speed_scale = speed_scale
+        self.scroll_rate = scroll_rate
+        self.analog_ts = time.perf_counter()
+
+    def get_speed_scale(self, now: float) -> float:
+        if now - self.analog_ts > ANALOG_STALE_SEC:
+            return 1.0
+        return self.speed_scale
+
+    def scroll(self, notches: float) -> None:
+        """Scroll once, sent with the next batch of wheel events.
+        """
+        self.wheel.add(notches)
+
+    def scroll_tick(self, now: float) -> None:
+        """Add the notches built up at scroll_rate since last tick and send
+        the batch when it is due.
+        """
+        dt = 0 if self.last_scroll_ts is None else now - self.last_scroll_ts
+        self.last_scroll_ts = now
+        if (self.scroll_rate != 0) and (now - self.analog_ts
+                                        <= ANALOG_STALE_SEC):
+            self.wheel.add(self.scroll_rate * min(dt, JOYSTICK_MAX_DT_SEC))
+
+        units = self.wheel.take(now)
+        if units != 0:
+            pyautogui.scroll(units)
+
+    def recenter(self) -> None:
+        """Take the current head position or pose as neutral, without moving
+        the cursor. Applied by the mouse thread.
+        """
+        self.recenter_flag.set()
+
+    def get_control_loc(self, now: float) -> npt.ArrayLike:
+        """Tracking point driving the cursor, relative to the estimated
+        neutral when drift compensation is on.
+        """
+        track_loc = self.curr_track_loc
+        dt = 0 if self.last_loop_ts is None else now - self.last_loop_ts
+        self.last_loop_ts = now
+        if track_loc is None:
+            return track_loc
+
+        # Raw and corrected points are far apart, restart smoothing from the
+        # current point when switching so the cursor does not jump.
+        enabled = ConfigManager().config["drift_compensation"]
+        restart = (enabled != self.drift_enabled) or (
+            enabled and self.recenter_flag.is_set())
+        self.recenter_flag.clear()
+        self.drift_enabled = enabled
+
+        if not enabled:
+            control_loc = track_loc
+        else:
+            if restart:
+                self.drift.recenter()
+            control_loc = self.drift.update(track_loc, dt)
+
+        if restart:
+            self.buffer[:] = control_loc
+            self.prev_x, self.prev_y = control_loc
+        return control_loc
+
+    def get_relative_move(self, now: float) -> tuple[float, float]:
+        """Cursor move of this tick in relative mode, follows the smoothed
+        tracking point.
+        """
+        self.buffer = np.roll(self.buffer, shift=-1, axis=0)
+        self.buffer[-1] = self.get_control_loc(now)
+
+        # Get latest x, y and smooth.
+        smooth_px, smooth_py = utils.apply_smoothing(self.buffer,
+                                                     self.smooth_kernel)
+
+        vel_x = smooth_px - self.prev_x
+        vel_y = smooth_py - self.prev_y
+
+        self.prev_x = smooth_px
+        self.prev_y = smooth_py
+
+        vel_x, vel_y = self.asymmetry_scale(vel_x, vel_y)
+
+        if ConfigManager().config["mouse_acceleration"]:
+            vel_x *= self.accel(vel_x)
+            vel_y *= self.accel(vel_y)
+
+        speed_scale = self.get_speed_scale(now)
+        return vel_x * speed_scale, vel_y * speed_scale
+
+    def get_joystick_move(self, now: float) -> tuple[float, float]:
+        """Cursor move of this tick in joystick mode, from the smoothed head
+        pose relative to its neutral.
+        """
+        dt = 0 if self.last_loop_ts is None else now - self.last_loop_ts
+        self.last_loop_ts = now
+
+        head_pose = self.curr_head_pose
+        if (head_pose is None) or (now - self.head_pose_ts
+                                   > JOYSTICK_STALE_SEC):
+            # Face lost, release the stick.
+            self.move_residual[:] = 0
+            return 0, 0
+
+        if self.recenter_flag.is_set():
+            self.recenter_flag.clear()
+            self.joystick.recenter()
+            self.pose_buffer[:] = head_pose[:2]
+
+        self.pose_buffer = np.roll(self.pose_buffer, shift=-1, axis=0)
+        self.pose_buffer[-1] = head_pose[:2]
+        smooth_pose = utils.apply_smoothing(self.pose_buffer,
+                                            self.smooth_kernel)
+
+        # Keep the fraction of a pixel for the next tick, slow speeds would
+        # be lost to rounding otherwise.
+        move = self.joystick.update(smooth_pose) * self.get_speed_scale(
+            now) * min(dt, JOYSTICK_MAX_DT_SEC) + self.move_residual
+        step = np.round(move)
+        self.move_residual = move - step
+        return step[0], step[1]
 
     def main_loop(self) -> None:
         """ Separate thread for mouse controller          
@@ -106,18 +309,25 @@ class MouseController(metaclass=Singleton):
                 time.sleep(0.001)
                 continue
 
-            self.buffer = np.roll(self.buffer, shift=-1, axis=0)
-            self.buffer[-1] = self.curr_track_loc
+            # Buffers hold values of the other mode, start over.
+            cursor_mode = ConfigManager().config["cursor_mode"]
+            if cursor_mode != self.cursor_mode:
+                self.cursor_mode = cursor_mode
+                self.delay_count = 0
+                self.recenter()
 
-            # Get latest x, y and smooth.
-            smooth_px, smooth_py = utils.apply_smoothing(
-                self.buffer, self.smooth_kernel)
+            now = time.perf_counter()
+            self.scroll_tick(now)
 
-            vel_x = smooth_px - self.prev_x
-            vel_y = smooth_py - self.prev_y
+            # Head drives a gamepad stick instead, see GamepadController
+            if cursor_mode == "gamepad":
+                time.sleep(ConfigManager().config["tick_interval_ms"] / 1000)
+                continue
 
-            self.prev_x = smooth_px
-            self.prev_y = smooth_py
+            if cursor_mode == "joystick":
+                vel_x, vel_y = self.get_joystick_move(now)
+            else:
+                vel_x, vel_y = self.get_relative_move(now)
 
             # In delay state
             self.delay_count += 1
@@ -125,21 +335,23 @@ class MouseController(metaclass=Singleton):
                 time.sleep(0.001)
                 continue
 
-            vel_x, vel_y = self.asymmetry_scale(vel_x, vel_y)
-
-            if ConfigManager().config["mouse_acceleration"]:
-                vel_x *= self.accel(vel_x)
-                vel_y *= self.accel(vel_y)
-
             # pydirectinput is not working here
             pyautogui.move(xOffset=vel_x, yOffset=vel_y)
+            if not self.has_moved:
+                startup_profiler.mark_since_process_start(
+                    "time_to_first_cursor_move")
+                self.has_moved = True
 
             time.sleep(ConfigManager().config["tick_interval_ms"] / 1000)
 
     def set_active(self, flag: bool) -> None:
         self.is_active.set(flag)
+        # Scroll queued before a pause must not be sent on resume
+        if self.wheel is not None:
+            self.wheel.clear()
         if flag:
             self.delay_count = 0
+            self.recenter()
 
     def toggle_active(self):
         logging.info("Toggle active")
@@ -13,3 +13,4 @@
 # limitations under the License.
 
 from .facemesh import *
+from .blendshape_stats import *
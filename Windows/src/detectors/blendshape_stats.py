@@ -0,0 +1,79 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+import numpy as np
+import numpy.typing as npt
+
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("BlendshapeStats")
+
+N_SHAPES = 52
+
+# Resting level follows drops quickly and rises slowly, so it stays at the
+# value of the relaxed face while gestures are made.
+REST_FALL_ALPHA = 0.2
+REST_RISE_ALPHA = 0.001
+
+# Peak is the highest value reached, forgotten over a few minutes at 30 FPS.
+PEAK_DECAY = 0.9995
+
+JITTER_ALPHA = 0.05
+# How much frame to frame flicker lowers the score.
+JITTER_WEIGHT = 4
+
+
+class BlendshapeStats(metaclass=Singleton):
+    """Running statistics of the blendshapes of the current user, to rank
+    gestures by how reliably they can be triggered.
+
+    A reliable gesture has a wide range between the relaxed face and the
+    highest value reached, and does not flicker. Updated with a few
+    vectorized operations per result, no extra inference.
+    """
+
+    def __init__(self):
+        logger.info("Intialize BlendshapeStats singleton")
+        self.reset()
+
+    def reset(self) -> None:
+        self.rest = None
+        self.peak = np.zeros(N_SHAPES, dtype=np.float32)
+        self.jitter = np.zeros(N_SHAPES, dtype=np.float32)
+        self.prev_values = None
+
+    def update(self, values: npt.ArrayLike) -> None:
+        if self.rest is None:
+            self.rest = values.copy()
+            self.prev_values = values
+            return
+
+        alpha = np.where(values < self.rest, REST_FALL_ALPHA,
+                         REST_RISE_ALPHA)
+        self.rest = self.rest + alpha * (values - self.rest)
+        self.peak = np.maximum(values,
+                               self.rest + (self.peak - self.rest) * PEAK_DECAY)
+        self.jitter = self.jitter + JITTER_ALPHA * (
+            np.abs(values - self.prev_values) - self.jitter)
+        self.prev_values = values
+
+    def get_scores(self) -> npt.ArrayLike:
+        """Reliability score of each blendshape, higher is better. All zeros
+        before any face was seen.
+        """
+        if self.rest is None:
+            return np.zeros(N_SHAPES, dtype=np.float32)
+        return (self.peak - self.rest) - JITTER_WEIGHT * self.jitter
@@ -13,14 +13,15 @@
 # limitations under the License.
 
 import logging
+import threading
 import time
+from collections import deque
+from typing import NamedTuple
 
-import mediapipe as mp
 import numpy as np
 import numpy.typing as npt
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
 
+import src.startup_profiler as startup_profiler
 import src.utils as utils
 from src.config_manager import ConfigManager
 from src.singleton_meta import Singleton
@@ -31,120 +32,485 @@ MP_TASK_FILE = "assets/task/face_landmarker_with_blendshapes.task"
 
 BLENDS_MAX_BUFFER = 100
 N_SHAPES = 52
+
+# Frames without result after this are considered dropped by MediaPipe.
+IN_FLIGHT_TIMEOUT_MS = 1000
+
+# Forehead, chin, right cheek, left cheek. Cheap face size and position.
+FACE_OUTLINE_IDXS = [10, 152, 234, 454]
+
+# Max wait for the result of the warm-up frame.
+WARMUP_TIMEOUT_SEC = 10
+
+# Weight of the newest sample in latency averages.
+STATS_EMA_ALPHA = 0.05
+
+# Smallest calibrated range of a blendshape, limits the gain.
+MIN_CALIBRATED_RANGE = 0.05
+
 np.set_printoptions(precision=2, suppress=True)
 
 
+def calc_track_loc(mp_result, face_idx: int, use_transformation_matrix: bool,
+                   screen_w: int, screen_h: int,
+                   tracking_vert_idxs: list) -> npt.ArrayLike:
+    """Point in frame pixels which drives the cursor.
+    Plain function so the capture process can use it without ConfigManager.
+    """
+    landmarks = mp_result.face_landmarks[face_idx]
+
+    if use_transformation_matrix:
+        M = mp_result.facial_transformation_matrixes[face_idx]
+        U, _, V = np.linalg.svd(M[:3, :3])
+        R = U @ V
+
+        res = R @ np.array([0, 0, 1])
+
+        x_pixel = (res[0] / 1) * 0.3
+        y_pixel = (res[1] / 1) * 0.3
+
+        x_pixel = screen_w / 2 + (x_pixel * screen_w / 2)
+        y_pixel = screen_h / 2 - (y_pixel * screen_h / 2)
+
+    else:
+        axs = []
+        ays = []
+
+        for p in tracking_vert_idxs:
+            px = landmarks[p].x * screen_w
+            py = landmarks[p].y * screen_h
+            axs.append(px)
+            ays.append(py)
+
+        x_pixel = np.mean(axs)
+        y_pixel = np.mean(ays)
+
+    return np.array([x_pixel, y_pixel], np.float32)
+
+
+def calc_head_pose(transformation_matrix: npt.ArrayLike) -> npt.ArrayLike:
+    """Head rotation from the facial transformation matrix.
+
+    Returns:
+        npt.ArrayLike: yaw, pitch and roll in degrees
+    """
+    R = np.asarray(transformation_matrix)[:3, :3]
+    pitch = np.arctan2(R[2, 1], R[2, 2])
+    yaw = np.arctan2(-R[2, 0], np.sqrt(R[2, 1]**2 + R[2, 2]**2))
+    roll = np.arctan2(R[1, 0], R[0, 0])
+    return np.degrees(np.array([yaw, pitch, roll], np.float32))
+
+
+def select_primary_face(mp_result, policy: str,
+                        prev_center) -> tuple[int, npt.ArrayLike]:
+    """Pick which face controls the cursor when several are found.
+
+    Policies:
+        largest: biggest face in frame, usually the closest person
+        center: face nearest to the frame center
+        continuity: face nearest to the previous primary face, so a
+            second person walking in does not steal control
+
+    Returns:
+        tuple[int, npt.ArrayLike]: index of the face in mp_result and its
+            center, to pass as prev_center next time
+    """
+    n_faces = len(mp_result.face_landmarks)
+    if n_faces == 1:
+        face_idx = 0
+    else:
+        centers = np.zeros([n_faces, 2])
+        sizes = np.zeros(n_faces)
+        for i, face in enumerate(mp_result.face_landmarks):
+            top, bottom, right, left = [face[idx] for idx in FACE_OUTLINE_IDXS]
+            centers[i] = [(right.x + left.x) / 2, (top.y + bottom.y) / 2]
+            sizes[i] = abs(left.x - right.x) * abs(bottom.y - top.y)
+
+        if policy == "center":
+            face_idx = np.argmin(np.linalg.norm(centers - [0.5, 0.5], axis=1))
+        elif policy == "continuity" and (prev_center is not None):
+            face_idx = np.argmin(np.linalg.norm(centers - prev_center, axis=1))
+        else:
+            face_idx = np.argmax(sizes)
+        face_idx = int(face_idx)
+
+    top, bottom, right, left = [
+        mp_result.face_landmarks[face_idx][idx] for idx in FACE_OUTLINE_IDXS
+    ]
+    center = np.array([(right.x + left.x) / 2, (top.y + bottom.y) / 2])
+    return face_idx, center
+
+
+class FaceMeshResult(NamedTuple):
+    """Immutable detection result, replaced as a whole on every callback
+    so readers always get landmarks and blendshapes of the same frame.
+    """
+    seq: int
+    timestamp_ms: int
+    capture_ms: float
+    landmarks: list
+    track_loc: npt.ArrayLike
+    blendshapes: npt.ArrayLike
+    head_pose: npt.ArrayLike
+    # Before calibration is applied, blendshapes are normalized
+    raw_blendshapes: npt.ArrayLike
+
+
 class FaceMesh(metaclass=Singleton):
 
     def __init__(self):
         logger.info("Intialize FaceMesh singleton")
-        self.mp_landmarks = None
-        self.track_loc = None
+        self.result = FaceMeshResult(seq=0,
+                                     timestamp_ms=0,
+                                     capture_ms=0,
+                                     landmarks=None,
+                                     track_loc=None,
+                                     blendshapes=None,
+                                     head_pose=None,
+                                     raw_blendshapes=None)
+        self.new_result_flag = threading.Event()
         self.blendshapes_buffer = np.zeros([BLENDS_MAX_BUFFER, N_SHAPES])
-        self.smooth_blendshapes = None
+        # (offset, gain) of the profile calibration, None if not calibrated
+        self.normalization = None
         self.model = None
         self.latest_time_ms = 0
         self.is_started = False
+        self.is_ready = False
+        # Message of the exception that stopped the model from loading
+        self.load_error = None
+        self.warmup_done_flag = threading.Event()
+        self.load_thread = None
+
+        # Backpressure, (timestamp, capture time) of frames submitted
+        # without result yet
+        self.in_flight_lock = threading.Lock()
+        self.in_flight_ts = deque()
+        # submitted = completed + timed_out + in flight, frames skipped
+        # while the graph is busy were never submitted
+        self.n_submitted = 0
+        self.n_completed = 0
+        self.n_timed_out = 0
+        self.n_skipped_busy = 0
+
+        # Multi-face
+        self.primary_face_center = None
+        self.n_faces = 0
+        self.latency_ms_per_faces = {}
+        self.callback_ms_per_faces = {}
 
     def start(self):
+        """Load the model in background so the GUI can show up first.
+        is_ready becomes True after the model finished warm-up.
+        """
         if not self.is_started:
             logger.info("Start FaceMesh singleton")
+            self.calc_smooth_kernel()
+            self.calc_normalization()
+            # In process engine mode the model lives in the capture process,
+            # results arrive through publish and is_ready is set by
+            # ProcessEngine.
+            if ConfigManager().config["engine_mode"] != "process":
+                self.load_thread = threading.Thread(target=self.load_model,
+                                                    daemon=True)
+                self.load_thread.start()
+            self.is_started = True
+
+    def load_model(self):
+        """Runs in the load thread, a failure is logged and kept in
+        load_error instead of leaving the model loading forever.
+        """
+        try:
+            self.create_model()
+        except Exception as e:
+            logger.critical("Failed to load face model", exc_info=e)
+            self.load_error = f"{type(e).__name__}: {e}"
+            return
+
+        self.is_ready = True
+        logger.info("FaceMesh model ready")
+
+    def create_model(self):
+        # mediapipe is the slowest import of the app, keep it off the
+        # path to the first window.
+        with startup_profiler.measure_phase("import mediapipe"):
+            import mediapipe as mp
+            from mediapipe.tasks import python
+            from mediapipe.tasks.python import vision
+
+        with startup_profiler.measure_phase("model_read"):
             # In Windows, needs to open buffer directly
             with open(MP_TASK_FILE, mode="rb") as f:
                 f_buffer = f.read()
+
+        with startup_profiler.measure_phase("model_create"):
             base_options = python.BaseOptions(model_asset_buffer=f_buffer)
             options = vision.FaceLandmarkerOptions(
                 base_options=base_options,
                 output_face_blendshapes=True,
                 output_facial_transformation_matrixes=True,
                 running_mode=mp.tasks.vision.RunningMode.LIVE_STREAM,
-                num_faces=1,
+                num_faces=ConfigManager().config["num_faces"],
                 result_callback=self.mp_callback)
             self.model = vision.FaceLandmarker.create_from_options(options)
 
-            self.calc_smooth_kernel()
+        with startup_profiler.measure_phase("model_warmup"):
+            self.warmup()
+
+    def warmup(self):
+        """Run one inference on a blank frame, the first call is much
+        slower than the others.
+        """
+        import mediapipe as mp
+
+        frame_np = np.zeros([
+            ConfigManager().config["fix_height"],
+            ConfigManager().config["fix_width"], 3
+        ], np.uint8)
+        frame_mp = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_np)
+        t_ms = int(time.time() * 1000)
+        self.model.detect_async(frame_mp, t_ms)
+        self.latest_time_ms = t_ms
+
+        if not self.warmup_done_flag.wait(WARMUP_TIMEOUT_SEC):
+            logger.warning("No result from warm-up frame")
+        self.warmup_done_flag.set()
 
     def calc_smooth_kernel(self):
         self.smooth_kernel = utils.calc_smooth_kernel(
             ConfigManager().config["shape_smooth"])
 
-    def calc_track_loc(self, mp_result, use_transformation_matrix=False):
-        screen_w = ConfigManager().config["fix_width"]
-        screen_h = ConfigManager().config["fix_height"]
-        landmarks = mp_result.face_landmarks[0]
+    def calc_normalization(self):
+        """Per blendshape offset and gain from the profile calibration, so
+        neutral face gives 0 and the biggest gesture of the user gives 1.
+        """
+        calibration = ConfigManager().calibration
+        if calibration is None:
+            self.normalization = None
+            return
 
-        if use_transformation_matrix:
-            M = mp_result.facial_transformation_matrixes[0]
-            U, _, V = np.linalg.svd(M[:3, :3])
-            R = U @ V
+        offset = np.array(calibration["neutral"], np.float32)
+        gain = 1 / np.maximum(
+            np.array(calibration["maximum"], np.float32) - offset,
+            MIN_CALIBRATED_RANGE)
+        # Swapped in one assignment, publish may run on another thread
+        self.normalization = (offset, gain)
 
-            res = R @ np.array([0, 0, 1])
+    def calc_track_loc(self,
+                       mp_result,
+                       face_idx: int = 0,
+                       use_transformation_matrix=False):
+        config = ConfigManager().config
+        return calc_track_loc(mp_result, face_idx, use_transformation_matrix,
+                              config["fix_width"], config["fix_height"],
+                              config["tracking_vert_idxs"])
 
-            x_pixel = (res[0] / 1) * 0.3
-            y_pixel = (res[1] / 1) * 0.3
+    def select_primary_face(self, mp_result) -> int:
+        face_idx, self.primary_face_center = select_primary_face(
+            mp_result, ConfigManager().config["primary_face_policy"],
+            self.primary_face_center)
+        return face_idx
 
-            x_pixel = screen_w / 2 + (x_pixel * screen_w / 2)
-            y_pixel = screen_h / 2 - (y_pixel * screen_h / 2)
+    def update_cost_stats(self, n_faces: int, timestamp_ms: int,
+                          callback_start: float) -> None:
+        """Average inference latency and result handling time
+        separately for each number of faces in frame.
+        """
+        latency_ms = time.time() * 1000 - timestamp_ms
+        callback_ms = (time.perf_counter() - callback_start) * 1000
 
-        else:
-            axs = []
-            ays = []
+        with self.in_flight_lock:
+            for stats, new_value in ((self.latency_ms_per_faces, latency_ms),
+                                     (self.callback_ms_per_faces,
+                                      callback_ms)):
+                if n_faces not in stats:
+                    stats[n_faces] = new_value
+                else:
+                    stats[n_faces] += STATS_EMA_ALPHA * (new_value -
+                                                         stats[n_faces])
 
-            for p in ConfigManager().config["tracking_vert_idxs"]:
-                px = landmarks[p].x * screen_w
-                py = landmarks[p].y * screen_h
-                axs.append(px)
-                ays.append(py)
+        if n_faces != self.n_faces:
+            logger.info(f"Faces in frame: {self.n_faces} -> {n_faces}")
+            self.n_faces = n_faces
 
-            x_pixel = np.mean(axs)
-            y_pixel = np.mean(ays)
+    def mp_callback(self, mp_result, output_image, timestamp_ms: int):
+        # Result of the warm-up frame, nothing to publish
+        if not self.warmup_done_flag.is_set():
+            self.warmup_done_flag.set()
+            return
 
-        return np.array([x_pixel, y_pixel], np.float32)
+        callback_start = time.perf_counter()
+        capture_ms = self.release_in_flight(timestamp_ms)
 
-    def mp_callback(self, mp_result, output_image, timestamp_ms: int):
         if len(mp_result.face_landmarks) >= 1 and len(
                 mp_result.face_blendshapes) >= 1:
-            self.mp_landmarks = mp_result.face_landmarks[0]
+            face_idx = self.select_primary_face(mp_result)
+            landmarks = mp_result.face_landmarks[face_idx]
             # Point for moving pointer
-            self.track_loc = self.calc_track_loc(
+            track_loc = self.calc_track_loc(
                 mp_result,
+                face_idx=face_idx,
                 use_transformation_matrix=ConfigManager(
                 ).config["use_transformation_matrix"])
+            blend_scores = np.array(
+                [b.score for b in mp_result.face_blendshapes[face_idx]])
+            head_pose = calc_head_pose(
+                mp_result.facial_transformation_matrixes[face_idx])
+        else:
+            landmarks = None
+            track_loc = None
+            blend_scores = None
+            head_pose = None
+
+        self.publish(timestamp_ms, capture_ms, landmarks, track_loc,
+                     blend_scores, head_pose)
+
+        self.update_cost_stats(len(mp_result.face_landmarks), timestamp_ms,
+                               callback_start)
+
+    def publish(self, timestamp_ms: int, capture_ms: float, landmarks,
+                track_loc: npt.ArrayLike, blend_scores: npt.ArrayLike,
+                head_pose: npt.ArrayLike) -> None:
+        """Smooth blendshapes and publish a new result.
+
+        Args:
+            timestamp_ms (int): timestamp given to the detector
+            capture_ms (float): wall clock time the frame was read
+            landmarks: landmarks of the primary face, None if no face
+            track_loc (npt.ArrayLike): tracking point, None if no face
+            blend_scores (npt.ArrayLike): raw blendshape scores, None if no
+                face
+            head_pose (npt.ArrayLike): yaw, pitch, roll in degrees, None if
+                no face
+        """
+        prev_result = self.result
+        if blend_scores is not None:
             self.blendshapes_buffer = np.roll(self.blendshapes_buffer,
                                               shift=-1,
                                               axis=0)
+            self.blendshapes_buffer[-1] = blend_scores
+            raw_blendshapes = utils.apply_smoothing(self.blendshapes_buffer,
+                                                    self.smooth_kernel)
+            normalization = self.normalization
+            if normalization is None:
+                smooth_blendshapes = raw_blendshapes
+            else:
+                offset, gain = normalization
+                smooth_blendshapes = np.clip(
+                    (raw_blendshapes - offset) * gain, 0, 1)
+        else:
+            raw_blendshapes = prev_result.raw_blendshapes
+            smooth_blendshapes = prev_result.blendshapes
 
-            self.blendshapes_buffer[-1] = np.array(
-                [b.score for b in mp_result.face_blendshapes[0]])
-            self.smooth_blendshapes = utils.apply_smoothing(
-                self.blendshapes_buffer, self.smooth_kernel)
+        # Publish in a single assignment
+        self.result = FaceMeshResult(seq=prev_result.seq + 1,
+                                     timestamp_ms=timestamp_ms,
+                                     capture_ms=capture_ms,
+                                     landmarks=landmarks,
+                                     track_loc=track_loc,
+                                     blendshapes=smooth_blendshapes,
+                                     head_pose=head_pose,
+                                     raw_blendshapes=raw_blendshapes)
+        self.new_result_flag.set()
 
-        else:
-            self.mp_landmarks = None
-            self.track_loc = None
+    def release_in_flight(self, timestamp_ms: int) -> float:
+        """Mark frame and all older ones as completed.
+        MediaPipe may skip results of old frames, so release them as well.
+
+        Returns:
+            float: capture time of the frame, timestamp_ms if unknown
+        """
+        capture_ms = timestamp_ms
+        with self.in_flight_lock:
+            while self.in_flight_ts and self.in_flight_ts[0][0] <= timestamp_ms:
+                t_ms, frame_capture_ms = self.in_flight_ts.popleft()
+                if t_ms == timestamp_ms:
+                    capture_ms = frame_capture_ms
+                self.n_completed += 1
+        return capture_ms
+
+    def is_graph_busy(self, t_ms: int) -> bool:
+        with self.in_flight_lock:
+            # Forget frames which never returned a result
+            while self.in_flight_ts and (t_ms - self.in_flight_ts[0][0] >
+                                         IN_FLIGHT_TIMEOUT_MS):
+                self.in_flight_ts.popleft()
+                self.n_timed_out += 1
 
-    def detect_frame(self, frame_np: npt.ArrayLike):
+            return len(self.in_flight_ts) >= ConfigManager(
+            ).config["max_frames_in_flight"]
+
+    def detect_frame(self, frame_np: npt.ArrayLike, capture_ms: float = None):
+        if not self.is_ready:
+            return
 
         t_ms = int(time.time() * 1000)
         if t_ms <= self.latest_time_ms:
             return
 
+        # Graph is full, skip this frame instead of queueing it. Frames
+        # already in the graph cannot be withdrawn, so dropping the oldest
+        # one would not free room. Next call submits the newest frame, so
+        # stale frames never wait inside the graph.
+        if self.is_graph_busy(t_ms):
+            with self.in_flight_lock:
+                self.n_skipped_busy += 1
+            return
+
+        with self.in_flight_lock:
+            self.in_flight_ts.append(
+                (t_ms, t_ms if capture_ms is None else capture_ms))
+            self.n_submitted += 1
+
+        # Already loaded by load_model
+        import mediapipe as mp
         frame_mp = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_np)
         self.model.detect_async(frame_mp, t_ms)
         self.latest_time_ms = t_ms
 
+    def set_counters(self, n_submitted: int, n_completed: int,
+                     n_timed_out: int, n_skipped_busy: int) -> None:
+        """Counters of the capture process, which submits the frames in
+        engine_mode "process".
+        """
+        with self.in_flight_lock:
+            self.n_submitted = n_submitted
+            self.n_completed = n_completed
+            self.n_timed_out = n_timed_out
+            self.n_skipped_busy = n_skipped_busy
+
+    def get_stats(self) -> dict:
+        """Get frame submission counters
+        """
+        with self.in_flight_lock:
+            return {
+                "in_flight":
+                    self.n_submitted - self.n_completed - self.n_timed_out,
+                "submitted": self.n_submitted,
+                "completed": self.n_completed,
+                "timed_out": self.n_timed_out,
+                "skipped_busy": self.n_skipped_busy,
+                "n_faces": self.n_faces,
+                "latency_ms_per_faces": dict(self.latency_ms_per_faces),
+                "callback_ms_per_faces": dict(self.callback_ms_per_faces)
+            }
+
+    def get_result(self) -> FaceMeshResult:
+        """Get latest result, all fields belong to the same frame.
+        """
+        return self.result
+
     def get_landmarks(self):
-        return self.mp_landmarks
+        return self.result.landmarks
 
     def get_track_loc(self):
-        return self.track_loc
+        return self.result.track_loc
 
     def get_blendshapes(self):
-        return self.smooth_blendshapes
+        return self.result.blendshapes
 
     def destroy(self):
+        self.is_ready = False
         if self.model is not None:
             self.model.close()
         self.model = None
-        self.mp_landmarks = None
         self.blendshapes_buffer = None
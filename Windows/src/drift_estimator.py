@@ -0,0 +1,73 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.typing as npt
+
+# Neutral follows only slowly a head held away from it, a deliberate pose
+# is not taken as drift but a new seating position is absorbed in the end.
+ADAPT_RADIUS_PX = 40
+OUTSIDE_ADAPT_SCALE = 0.1
+
+
+class DriftEstimator():
+    """Track the slowly varying neutral head position and express the
+    tracking point relative to it.
+
+    The neutral is an exponential average of the tracking point with a time
+    constant of seconds, so posture drift moves the neutral instead of the
+    cursor. Points within the dead zone around neutral map to neutral, which
+    hides jitter of a resting head.
+    """
+
+    def __init__(self, time_constant_sec: float, dead_zone_px: float):
+        self.time_constant_sec = time_constant_sec
+        self.dead_zone_px = dead_zone_px
+        self.neutral = None
+
+    def configure(self, time_constant_sec: float, dead_zone_px: float) -> None:
+        self.time_constant_sec = time_constant_sec
+        self.dead_zone_px = dead_zone_px
+
+    def recenter(self) -> None:
+        """Current position becomes the neutral on next update.
+        """
+        self.neutral = None
+
+    def update(self, track_loc: npt.ArrayLike, dt_sec: float) -> npt.ArrayLike:
+        """Move the neutral and get the corrected tracking point.
+
+        Args:
+            track_loc (npt.ArrayLike): tracking point x, y
+            dt_sec (float): time since the previous update
+
+        Returns:
+            npt.ArrayLike: offset from neutral with the dead zone removed
+        """
+        if self.neutral is None:
+            self.neutral = np.array(track_loc, dtype=np.float64)
+
+        offset = track_loc - self.neutral
+        dist = np.hypot(*offset)
+
+        alpha = min(1.0, dt_sec / self.time_constant_sec)
+        if dist > ADAPT_RADIUS_PX:
+            alpha *= OUTSIDE_ADAPT_SCALE
+        self.neutral += alpha * offset
+        offset = track_loc - self.neutral
+        dist = np.hypot(*offset)
+
+        if dist <= self.dead_zone_px:
+            return np.zeros(2)
+        return offset * (1 - self.dead_zone_px / dist)
@@ -0,0 +1,222 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import src.startup_profiler as startup_profiler
+from src.calibrator import Calibrator
+from src.camera_manager import CameraManager
+from src.config_manager import ConfigManager
+from src.controllers import GamepadController, MouseController
+from src.detectors import FaceMesh
+from src.frame_governor import FrameGovernor
+from src.pipeline import Pipeline
+from src.process_engine import ProcessEngine
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("Engine")
+
+# Max wait for a new detection result before ticking anyway.
+ENGINE_IDLE_SEC = 0.005
+
+# Number of ticks kept for timing statistics.
+N_TICK_STATS = 1000
+TICK_REPORT_SEC = 10
+
+
+class Engine(metaclass=Singleton):
+    """Real-time loop running detection and controllers on its own thread.
+
+    The GUI never calls the controllers directly, it reads snapshots
+    (FaceMesh results, CameraManager previews) and sends commands with
+    send_command, which are executed at the start of the next tick.
+    """
+
+    def __init__(self):
+        logger.info("Intialize Engine singleton")
+        self.pipeline = None
+        self.command_queue = queue.Queue()
+        self.stop_flag = threading.Event()
+        self.loop_thread = None
+        self.is_started = False
+        self.startup_reported = False
+
+        # Tick timing
+        self.tick_intervals_ms = deque(maxlen=N_TICK_STATS)
+        self.tick_durations_ms = deque(maxlen=N_TICK_STATS)
+        self.last_tick_ts = None
+        self.last_report_ts = time.perf_counter()
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start Engine singleton")
+            self.pipeline = Pipeline()
+            self.loop_thread = threading.Thread(target=self.engine_loop,
+                                                daemon=True)
+            self.loop_thread.start()
+            self.is_started = True
+
+    def send_command(self, function_name: str, args: dict = {}) -> None:
+        """Queue a command for the engine thread, never blocks.
+        """
+        logger.info(f"send_command {function_name} with {args}")
+        self.command_queue.put((function_name, args))
+
+    def handle_commands(self) -> None:
+        while True:
+            try:
+                function_name, args = self.command_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            if function_name == "set_active":
+                MouseController().set_active(args["flag"])
+            elif function_name == "toggle_active":
+                MouseController().toggle_active()
+            elif function_name == "switch_profile":
+                self.switch_profile(args["profile_name"])
+            elif function_name == "apply_profile":
+                self.apply_profile()
+            elif function_name == "apply_config":
+                self.apply_config()
+            elif function_name == "start_calibration":
+                Calibrator().start_calibration()
+            elif function_name == "reset_calibration":
+                Calibrator().reset_calibration()
+            else:
+                logger.warning(f"Unknown command {function_name}")
+
+    def switch_profile(self, profile_name: str) -> None:
+        """Load another profile and update the singletons using it.
+        The GUI notices the new profile name and refreshes its pages.
+        """
+        ConfigManager().switch_profile(profile_name)
+        self.apply_profile()
+
+    def apply_config(self) -> None:
+        """Update controllers after config values changed, on the engine
+        thread so the GUI never reconfigures them while they run.
+        """
+        MouseController().calc_smooth_kernel()
+        GamepadController().calc_joystick()
+        FaceMesh().calc_smooth_kernel()
+        ProcessEngine().update_config()
+
+    def apply_profile(self) -> None:
+        """Update singletons after the current profile changed.
+        """
+        self.apply_config()
+        FaceMesh().calc_normalization()
+
+        camera_id = ConfigManager().config["camera_id"]
+        if camera_id != CameraManager().get_current_camera_id():
+            CameraManager().pick_camera(camera_id)
+
+    def check_startup(self) -> None:
+        if not self.startup_reported and FaceMesh().is_ready:
+            startup_profiler.mark_since_process_start("time_to_model_ready")
+            startup_profiler.log_startup_report()
+            self.startup_reported = True
+
+    def update_tick_stats(self, tick_start: float) -> None:
+        now = time.perf_counter()
+        if self.last_tick_ts is not None:
+            self.tick_intervals_ms.append((tick_start - self.last_tick_ts) *
+                                          1000)
+        self.tick_durations_ms.append((now - tick_start) * 1000)
+        self.last_tick_ts = tick_start
+
+        if now - self.last_report_ts >= TICK_REPORT_SEC:
+            stats = self.get_tick_stats()
+            logger.info(
+                "Tick interval p50 {interval_p50:.2f} p99 {interval_p99:.2f} "
+                "max {interval_max:.2f} ms, duration p99 {duration_p99:.2f} ms"
+                .format(**stats))
+            logger.info(
+                "Frame to controller latency ({engine_mode} mode) p50 "
+                "{latency_p50:.2f} p99 {latency_p99:.2f} max {latency_max:.2f} ms"
+                .format(engine_mode=ConfigManager().config["engine_mode"],
+                        **self.pipeline.get_latency_stats()))
+            self.last_report_ts = now
+
+    def get_tick_stats(self) -> dict:
+        """Timing of recent ticks in milliseconds, spread of the interval is
+        the tick jitter.
+        """
+        intervals = np.array(self.tick_intervals_ms)
+        durations = np.array(self.tick_durations_ms)
+        if len(intervals) == 0 or len(durations) == 0:
+            intervals = durations = np.zeros(1)
+
+        return {
+            "interval_p50": np.percentile(intervals, 50),
+            "interval_p99": np.percentile(intervals, 99),
+            "interval_max": intervals.max(),
+            "duration_p99": np.percentile(durations, 99)
+        }
+
+    def get_stats(self) -> dict:
+        """Live state and timings of the engine, for the IPC API.
+        """
+        achieved_fps, target_fps = FrameGovernor().get_fps()
+        stats = {
+            "profile": ConfigManager().curr_profile_name.get(),
+            "engine_mode": ConfigManager().config["engine_mode"],
+            "is_active": MouseController().is_active.get(),
+            "model_ready": FaceMesh().is_ready,
+            "model_error": FaceMesh().load_error,
+            "achieved_fps": achieved_fps,
+            "target_fps": target_fps,
+            "detector": FaceMesh().get_stats(),
+            "calibration": Calibrator().get_status()[0],
+            "config_writes": ConfigManager().writer.get_stats()
+        }
+        stats.update(self.get_tick_stats())
+        stats.update(self.pipeline.get_latency_stats())
+        return stats
+
+    def engine_loop(self) -> None:
+        logger.info("Engine loop started")
+
+        new_result_flag = FaceMesh().new_result_flag
+        while not self.stop_flag.is_set():
+            # Wake up as soon as a result arrives
+            new_result_flag.wait(ENGINE_IDLE_SEC)
+            new_result_flag.clear()
+
+            tick_start = time.perf_counter()
+            try:
+                self.handle_commands()
+                self.check_startup()
+
+                # Run detectors and controllers.
+                self.pipeline.pipeline_tick()
+            except Exception as e:
+                logger.critical(e, exc_info=e)
+
+            self.update_tick_stats(tick_start)
+
+        logger.info("Engine loop stopped")
+
+    def destroy(self):
+        self.stop_flag.set()
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=1)
+        self.is_started = False
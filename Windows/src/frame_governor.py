@@ -0,0 +1,176 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+
+import numpy as np
+import psutil
+
+from src.config_manager import ConfigManager
+from src.detectors import FaceMesh
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("FrameGovernor")
+
+# Track point movement (pixels per processed frame) considered as motion.
+MOTION_THRES_PX = 1.5
+
+# Gesture is "near" its threshold when within this margin.
+NEAR_THRES_MARGIN = 0.1
+
+# Keep the boosted rate for a while after the last motion.
+BOOST_HOLD_SEC = 0.5
+
+# System-wide CPU usage considered as heavy load.
+SYSTEM_BUSY_PERCENT = 90
+
+CPU_SAMPLE_SEC = 1.0
+
+
+class FrameGovernor(metaclass=Singleton):
+    """Decide how often the pipeline runs face inference.
+
+    Runs at max_fps while the head moves or a gesture is close to its
+    trigger threshold, drops to stable_fps while the face is still and to
+    idle_fps while paused or no face is found. Under CPU load the non-boosted
+    rate is scaled down to stay in cpu_budget_percent.
+    """
+
+    def __init__(self):
+        logger.info("Intialize FrameGovernor singleton")
+        self.target_fps = 0
+        self.achieved_fps = 0.0
+        self.last_process_ts = 0
+        self.boost_until_ts = 0
+        self.prev_track_loc = None
+
+        # Achieved rate counts results of the detector, frames the governor
+        # let through may still be skipped or lost
+        self.window_start_completed = 0
+        self.window_start_ts = time.perf_counter()
+
+        self.process = None
+        self.cpu_load_scale = 1.0
+        self.last_cpu_sample_ts = 0
+        self.is_started = False
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start FrameGovernor singleton")
+            self.process = psutil.Process()
+            # First call of cpu_percent always returns 0, prime it.
+            self.process.cpu_percent(interval=None)
+            psutil.cpu_percent(interval=None)
+            self.is_started = True
+
+    def sample_cpu(self, now: float) -> None:
+        if now - self.last_cpu_sample_ts < CPU_SAMPLE_SEC:
+            return
+        self.last_cpu_sample_ts = now
+
+        budget = ConfigManager().config["cpu_budget_percent"]
+        # Process usage as share of the whole machine.
+        proc_load = self.process.cpu_percent(
+            interval=None) / psutil.cpu_count()
+        system_load = psutil.cpu_percent(interval=None)
+
+        scale = 1.0
+        if proc_load > budget:
+            scale = budget / proc_load
+        if system_load > SYSTEM_BUSY_PERCENT:
+            scale = min(scale, SYSTEM_BUSY_PERCENT / system_load)
+        self.cpu_load_scale = scale
+
+    def is_gesture_near_threshold(self, blendshape_values) -> bool:
+        if blendshape_values is None:
+            return False
+
+        for idx, binding in ConfigManager().get_compiled_bindings():
+            if blendshape_values[idx] > binding.threshold - NEAR_THRES_MARGIN:
+                return True
+        return False
+
+    def calc_target_fps(self, now: float, is_active: bool, track_loc,
+                        blendshape_values) -> int:
+        config = ConfigManager().config
+
+        # Motion or gesture about to trigger, go full speed immediately.
+        is_moving = False
+        if track_loc is not None and self.prev_track_loc is not None:
+            dist = np.linalg.norm(track_loc - self.prev_track_loc)
+            is_moving = dist > MOTION_THRES_PX
+        self.prev_track_loc = track_loc
+
+        if is_active and (is_moving or
+                          self.is_gesture_near_threshold(blendshape_values)):
+            self.boost_until_ts = now + BOOST_HOLD_SEC
+
+        if now < self.boost_until_ts:
+            return config["max_fps"]
+
+        if (not is_active) or (track_loc is None):
+            target = config["idle_fps"]
+        else:
+            target = config["stable_fps"]
+
+        self.sample_cpu(now)
+        return max(config["idle_fps"], int(target * self.cpu_load_scale))
+
+    def should_process(self, is_active: bool, track_loc,
+                       blendshape_values) -> bool:
+        """Check whether the current tick should run inference.
+
+        Args:
+            is_active (bool): mouse control is enabled
+            track_loc (npt.ArrayLike): latest tracking point or None
+            blendshape_values (npt.ArrayLike): latest blendshapes or None
+
+        Returns:
+            bool: True if a new frame should be sent to the detector
+        """
+        now = time.perf_counter()
+
+        if not ConfigManager().config["governor_enabled"]:
+            self.target_fps = ConfigManager().config["max_fps"]
+        else:
+            self.target_fps = self.calc_target_fps(now, is_active, track_loc,
+                                                   blendshape_values)
+
+        self.update_achieved_fps(now)
+
+        if now - self.last_process_ts < 1 / self.target_fps:
+            return False
+
+        self.last_process_ts = now
+        return True
+
+    def update_achieved_fps(self, now: float) -> None:
+        elapsed = now - self.window_start_ts
+        if elapsed < 1.0:
+            return
+        # Copied from the capture process in engine_mode "process"
+        n_completed = FaceMesh().n_completed
+        self.achieved_fps = (n_completed -
+                             self.window_start_completed) / elapsed
+        self.window_start_completed = n_completed
+        self.window_start_ts = now
+
+    def get_fps(self) -> tuple[float, int]:
+        """Get achieved and target inference rate.
+        """
+        return self.achieved_fps, self.target_fps
+
+    def destroy(self):
+        self.is_started = False
@@ -0,0 +1,196 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+
+import numpy as np
+
+import src.shape_list as shape_list
+from src.profile_schema import GestureRule
+
+
+class GestureEngine():
+    """Evaluate combo gesture rules (chords, sequences, tap and long press)
+    as a state machine driven by threshold crossings.
+
+    Rules are compiled into conditions, one per distinct (blendshape,
+    threshold) pair, tested together with one vectorized comparison. Only the
+    rules of conditions which changed in this frame are visited, plus the
+    long press timers which are due, so a frame without crossings costs the
+    same whatever the number of rules.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self.shape_idxs = np.zeros(0, dtype=np.intp)
+        self.thresholds = np.zeros(0, dtype=np.float32)
+        self.prev_active = np.zeros(0, dtype=bool)
+        self.rise_ms = []
+        self.chord_down = []
+        self.compile([])
+
+    def compile(self, rules: list[GestureRule]) -> None:
+        """Build the tables for rules.
+
+        Gestures held while recompiling (profile switch, binding edit) are
+        kept as held, they do not rise again on the next frame. A chord
+        kept unchanged stays down, other rule states start over.
+        """
+        # Previous state of each (blendshape, threshold) condition
+        old_conds = {
+            (shape_idx, thres): (is_active, rise_ms)
+            for shape_idx, thres, is_active, rise_ms in zip(
+                self.shape_idxs.tolist(), self.thresholds.tolist(),
+                self.prev_active.tolist(), self.rise_ms)
+        }
+        old_chords_down = {
+            rule for rule, is_down in zip(self.rules, self.chord_down)
+            if is_down
+        }
+
+        self.rules = rules
+        cond_ids = {}
+        shape_idxs = []
+        thresholds = []
+
+        # Per rule, conditions in order of the gestures
+        self.rule_conds = []
+        for rule in rules:
+            conds = []
+            for gesture in rule.gestures:
+                key = (shape_list.blendshape_indices[gesture], rule.threshold)
+                if key not in cond_ids:
+                    cond_ids[key] = len(shape_idxs)
+                    shape_idxs.append(key[0])
+                    thresholds.append(key[1])
+                conds.append(cond_ids[key])
+            self.rule_conds.append(tuple(conds))
+
+        # Rules to visit when a condition changes
+        self.cond_rules = [[] for _ in shape_idxs]
+        for rule_idx, conds in enumerate(self.rule_conds):
+            for cond in set(conds):
+                self.cond_rules[cond].append(rule_idx)
+
+        self.shape_idxs = np.array(shape_idxs, dtype=np.intp)
+        self.thresholds = np.array(thresholds, dtype=np.float32)
+        # Keys compared in float32, as stored in the tables
+        old_states = [
+            old_conds.get((shape_idx, thres), (False, 0.0))
+            for shape_idx, thres in zip(self.shape_idxs.tolist(),
+                                        self.thresholds.tolist())
+        ]
+        self.prev_active = np.array([state[0] for state in old_states],
+                                    dtype=bool)
+        self.rise_ms = [state[1] for state in old_states]
+
+        # Chord: number of active gestures and whether the action is down.
+        self.chord_sizes = [len(set(conds)) for conds in self.rule_conds]
+        self.chord_counts = [
+            sum(bool(self.prev_active[cond]) for cond in set(conds))
+            for conds in self.rule_conds
+        ]
+        self.chord_down = [
+            (rule in old_chords_down) and (count == size)
+            for rule, count, size in zip(rules, self.chord_counts,
+                                         self.chord_sizes)
+        ]
+        # Sequence: next expected step and when it expires.
+        self.seq_steps = [0] * len(rules)
+        self.seq_deadlines = [0.0] * len(rules)
+        # Long press: heap of (due time, rule index, rise time).
+        self.timers = []
+
+    def update(self, blendshape_values, now_ms: float) -> list[tuple[int,
+                                                                      bool]]:
+        """Advance all rules to the current frame.
+
+        Args:
+            blendshape_values (npt.ArrayLike): blendshape values of the frame
+            now_ms (float): monotonic time in milliseconds
+
+        Returns:
+            list[tuple[int, bool]]: (rule index, is_down) events in order.
+                Instant rules give a down and an up event in the same frame,
+                chords give the up event when the chord is released.
+        """
+        if len(self.shape_idxs) == 0:
+            return []
+
+        events = []
+        active = blendshape_values[self.shape_idxs] > self.thresholds
+        for cond in np.flatnonzero(active != self.prev_active).tolist():
+            if active[cond]:
+                self.on_rise(cond, now_ms, events)
+            else:
+                self.on_fall(cond, now_ms, events)
+        self.prev_active = active
+
+        while self.timers and self.timers[0][0] <= now_ms:
+            _, rule_idx, rise_ms = heapq.heappop(self.timers)
+            cond = self.rule_conds[rule_idx][0]
+            # Still the same press
+            if active[cond] and self.rise_ms[cond] == rise_ms:
+                events.append((rule_idx, True))
+                events.append((rule_idx, False))
+
+        return events
+
+    def on_rise(self, cond: int, now_ms: float, events: list) -> None:
+        self.rise_ms[cond] = now_ms
+        for rule_idx in self.cond_rules[cond]:
+            rule = self.rules[rule_idx]
+            conds = self.rule_conds[rule_idx]
+
+            if rule.kind == "chord":
+                self.chord_counts[rule_idx] += 1
+                if self.chord_counts[rule_idx] == self.chord_sizes[rule_idx]:
+                    self.chord_down[rule_idx] = True
+                    events.append((rule_idx, True))
+
+            elif rule.kind == "sequence":
+                step = self.seq_steps[rule_idx]
+                if step > 0 and now_ms > self.seq_deadlines[rule_idx]:
+                    step = 0
+                if conds[step] == cond:
+                    step += 1
+                else:
+                    # Wrong order, this gesture may start a new sequence
+                    step = 1 if conds[0] == cond else 0
+
+                if step == len(conds):
+                    events.append((rule_idx, True))
+                    events.append((rule_idx, False))
+                    step = 0
+                self.seq_steps[rule_idx] = step
+                self.seq_deadlines[rule_idx] = now_ms + rule.time_ms
+
+            elif rule.kind == "long_press":
+                heapq.heappush(self.timers,
+                               (now_ms + rule.time_ms, rule_idx, now_ms))
+
+    def on_fall(self, cond: int, now_ms: float, events: list) -> None:
+        for rule_idx in self.cond_rules[cond]:
+            rule = self.rules[rule_idx]
+
+            if rule.kind == "chord":
+                if self.chord_down[rule_idx]:
+                    self.chord_down[rule_idx] = False
+                    events.append((rule_idx, False))
+                self.chord_counts[rule_idx] -= 1
+
+            elif rule.kind == "tap":
+                if now_ms - self.rise_ms[cond] <= rule.time_ms:
+                    events.append((rule_idx, True))
+                    events.append((rule_idx, False))
@@ -15,9 +15,11 @@
 from functools import partial
 
 import customtkinter
-from PIL import Image
 
+import src.shape_list as shape_list
 from src.config_manager import ConfigManager
+from src.detectors import BlendshapeStats
+from src.gui.gesture_previews import get_preview
 
 ITEM_HEIGHT = 48
 ICON_SIZE = (68, 48)
@@ -51,14 +53,24 @@ class Dropdown():
         # Hide icon in taskbar
 
         self.float_window.wm_attributes('-toolwindow', 'True')
-        self.float_window.grid_rowconfigure(MAX_ROWS, weight=1)
-        self.float_window.grid_columnconfigure(1, weight=1)
+        self.float_window.grid_rowconfigure(0, weight=1)
+        self.float_window.grid_columnconfigure(0, weight=1)
         #self.float_window.group(master)
         self._displayed = True
 
         self.dropdown_keys = list(dropdown_items.keys())
-
-        self.divs = self.create_divs(self.float_window, dropdown_items, width)
+        self.dropdown_items = dropdown_items
+
+        # All gestures do not fit, scroll for more
+        self.list_frame = customtkinter.CTkScrollableFrame(
+            self.float_window,
+            width=width,
+            height=min(len(dropdown_items), MAX_ROWS) * ITEM_HEIGHT,
+            corner_radius=0,
+            fg_color=LIGHT_BLUE)
+        self.list_frame.grid(row=0, column=0, sticky="nsew")
+        self.divs = self.create_divs(self.list_frame, dropdown_items, width)
+        self.item_order = list(self.dropdown_keys)
         self.button_names = [str(v["button"]) for k, v in self.divs.items()]
         self.selected_gesture = list(dropdown_items.keys())[0]
 
@@ -72,11 +84,11 @@ class Dropdown():
         self.current_user = None
 
     def create_divs(self, master, ges_images: dict, width: int) -> dict:
+        """Rows without image, previews are made when the dropdown is first
+        shown.
+        """
         divs = {}
-        for row, (gesture, image_path) in enumerate(ges_images.items()):
-            image = customtkinter.CTkImage(
-                Image.open(image_path).resize(ICON_SIZE), size=ICON_SIZE)
-
+        for row, gesture in enumerate(ges_images):
             # Label ?
             row_btn = customtkinter.CTkButton(master=master,
                                               width=width,
@@ -84,7 +96,6 @@ class Dropdown():
                                               text=gesture,
                                               border_width=0,
                                               corner_radius=0,
-                                              image=image,
                                               hover=True,
                                               fg_color=LIGHT_BLUE,
                                               hover_color="gray90",
@@ -98,14 +109,46 @@ class Dropdown():
                          pady=(0, 0),
                          sticky="nsew")
 
-            divs[gesture] = {"button": row_btn, "image": image}
+            divs[gesture] = {"button": row_btn, "image": None}
 
         return divs
 
+    def load_previews(self):
+        for gesture, div in self.divs.items():
+            if div["image"] is not None:
+                continue
+            image = get_preview(gesture, self.dropdown_items[gesture])
+            div["image"] = customtkinter.CTkImage(image, size=ICON_SIZE)
+            div["button"].configure(image=div["image"])
+
+    def rank_items(self):
+        """Order gestures by how reliably the user triggers them, first item
+        stays on top. Unknown yet keeps the default order, items which are
+        not blendshapes score 0.
+        """
+        scores = BlendshapeStats().get_scores()
+
+        def score(gesture) -> float:
+            shape_idx = shape_list.blendshape_indices.get(gesture)
+            return 0.0 if shape_idx is None else float(scores[shape_idx])
+
+        first, *others = self.dropdown_keys
+        order = [first] + sorted(others, key=lambda g: -score(g))
+        if order == self.item_order:
+            return
+
+        for row, gesture in enumerate(order):
+            self.divs[gesture]["button"].grid(row=row)
+        self.item_order = order
+
     def mouse_release(self, event):
         """Release mouse and trigger button
         """
 
+        # Rows scrolled out of view are outside the list
+        if not mouse_in_widget(event.x_root, event.y_root, self.list_frame):
+            return
+
         # Check if release which button
         for gesture, div in self.divs.items():
             button = div["button"]
@@ -178,6 +221,8 @@ class Dropdown():
         if not self._displayed:
 
             self.refresh_items()
+            self.load_previews()
+            self.rank_items()
 
             draw_x = widget.winfo_rootx()
             draw_y = widget.winfo_rooty() + Y_OFFSET
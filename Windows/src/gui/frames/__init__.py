@@ -17,3 +17,4 @@ from .frame_menu import *
 from .frame_profile_editor import *
 from .frame_profile_switcher import *
 from .safe_disposable_frame import *
+from .frame_calibration import *
@@ -0,0 +1,78 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import customtkinter
+
+from src.calibrator import Calibrator
+from src.engine import Engine
+from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.refresh_scheduler import RefreshScheduler
+
+BLUE = "#1A73E8"
+STATUS_INTERVAL_MS = 200
+
+
+class FrameCalibration(SafeDisposableFrame):
+    """Calibrate and reset buttons with the calibration progress.
+    The calibration itself runs on the engine thread.
+    """
+
+    def __init__(self, master, task_name: str, **kwargs):
+        super().__init__(master, **kwargs)
+        self.configure(fg_color="transparent")
+        self.last_status = None
+
+        self.calibrate_button = customtkinter.CTkButton(
+            master=self,
+            text="Calibrate",
+            width=90,
+            fg_color="white",
+            text_color=BLUE,
+            command=self.start_calibration)
+        self.calibrate_button.grid(row=0, column=1, padx=5, pady=5)
+
+        self.reset_button = customtkinter.CTkButton(
+            master=self,
+            text="Reset",
+            width=60,
+            fg_color="white",
+            text_color=BLUE,
+            command=self.reset_calibration)
+        self.reset_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.status_label = customtkinter.CTkLabel(master=self,
+                                                   text="",
+                                                   text_color="#5E5E5E")
+        self.status_label.grid(row=0, column=0, padx=5, pady=5)
+
+        RefreshScheduler().register(task_name, self, self.update_status,
+                                    STATUS_INTERVAL_MS)
+
+    def start_calibration(self):
+        Engine().send_command("start_calibration")
+
+    def reset_calibration(self):
+        Engine().send_command("reset_calibration")
+
+    def update_status(self):
+        phase, message, remaining = Calibrator().get_status()
+        if phase in ("neutral", "maximum"):
+            message = f"{message} ({remaining:.0f} s)"
+        if message == self.last_status:
+            return
+        self.status_label.configure(text=message)
+        state = "disabled" if Calibrator().is_recording() else "normal"
+        self.calibrate_button.configure(state=state)
+        self.reset_button.configure(state=state)
+        self.last_status = message
@@ -15,12 +15,14 @@
 import tkinter
 
 import customtkinter
-from PIL import Image, ImageTk
 
 from src.camera_manager import CameraManager
 from src.config_manager import ConfigManager
 from src.controllers import MouseController
+from src.frame_governor import FrameGovernor
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.preview_renderer import PreviewRenderer
+from src.gui.refresh_scheduler import RefreshScheduler
 
 CANVAS_WIDTH = 216
 CANVAS_HEIGHT = 162
@@ -33,15 +35,11 @@ class FrameCamPreview(SafeDisposableFrame):
     def __init__(self, master, master_callback: callable, **kwargs):
         super().__init__(master, **kwargs)
 
-        self.grid_rowconfigure(2, weight=1)
+        self.grid_rowconfigure(3, weight=1)
         self.grid_columnconfigure(0, weight=1)
         self.configure(fg_color=LIGHT_BLUE)
 
         # Canvas.
-        self.placeholder_im = Image.open("assets/images/placeholder.png")
-        self.placeholder_im = ImageTk.PhotoImage(
-            image=self.placeholder_im.resize((CANVAS_WIDTH, CANVAS_HEIGHT)))
-
         self.canvas = tkinter.Canvas(master=self,
                                      width=CANVAS_WIDTH,
                                      height=CANVAS_HEIGHT,
@@ -64,7 +62,10 @@ class FrameCamPreview(SafeDisposableFrame):
                                pady=5,
                                sticky="nw")
 
-        # Toggle switch
+        # Toggle switch, mirrors MouseController().is_active which can also
+        # change from gestures.
+        self.toggle_var = tkinter.BooleanVar(
+            value=MouseController().is_active.get())
         self.toggle_switch = customtkinter.CTkSwitch(
             master=self,
             text="",
@@ -72,7 +73,7 @@ class FrameCamPreview(SafeDisposableFrame):
             border_color="transparent",
             switch_height=18,
             switch_width=32,
-            variable=MouseController().is_active,
+            variable=self.toggle_var,
             command=lambda: master_callback(
                 "toggle_switch", {"switch_status": self.toggle_switch.get()}),
             onvalue=1,
@@ -101,34 +102,47 @@ class FrameCamPreview(SafeDisposableFrame):
                                pady=5,
                                sticky="nw")
 
+        # Inference rate, achieved / target
+        self.fps_label = customtkinter.CTkLabel(master=self,
+                                                text="",
+                                                text_color="#868686",
+                                                justify=tkinter.LEFT)
+        self.fps_label.cget("font").configure(size=11)
+        self.fps_label.grid(row=3,
+                            column=0,
+                            padx=(10, 0),
+                            pady=(0, 5),
+                            sticky="nw")
+        self.fps_text = ""
+
         # Set first image.
-        self.canvas_image = self.canvas.create_image(0,
-                                                     0,
-                                                     image=self.placeholder_im,
-                                                     anchor=tkinter.NW)
-        self.new_photo = None
-        self.after(1, self.camera_loop)
+        self.preview_renderer = PreviewRenderer(
+            self.canvas,
+            "debug",
+            CANVAS_WIDTH,
+            CANVAS_HEIGHT,
+            placeholder_path="assets/images/placeholder.png")
+        RefreshScheduler().register("cam_preview", self, self.camera_loop,
+                                    ConfigManager().config["tick_interval_ms"])
 
     def camera_loop(self):
-        if self.is_destroyed:
+        if CameraManager().is_destroyed:
             return
-        if self.is_active:
-            if CameraManager().is_destroyed:
-                return
-            frame_rgb = CameraManager().get_debug_frame()
-            # Assign ref to avoid garbage collected
-            self.new_photo = ImageTk.PhotoImage(
-                image=Image.fromarray(frame_rgb).resize((CANVAS_WIDTH,
-                                                         CANVAS_HEIGHT)))
-            self.canvas.itemconfig(self.canvas_image, image=self.new_photo)
-            self.canvas.update()
-
-            self.after(ConfigManager().config["tick_interval_ms"],
-                       self.camera_loop)
-
-    def enter(self):
-        super().enter()
-        self.after(1, self.camera_loop)
+        self.preview_renderer.render()
+        self.update_fps_label()
+        self.update_toggle_switch()
+
+    def update_toggle_switch(self):
+        is_active = MouseController().is_active.get()
+        if is_active != self.toggle_var.get():
+            self.toggle_var.set(is_active)
+
+    def update_fps_label(self):
+        achieved_fps, target_fps = FrameGovernor().get_fps()
+        new_text = f"Inference {achieved_fps:.1f} / {target_fps} fps"
+        if new_text != self.fps_text:
+            self.fps_label.configure(text=new_text)
+            self.fps_text = new_text
 
     def destroy(self):
         super().destroy()
@@ -19,10 +19,12 @@ from PIL import Image
 
 from src.config_manager import ConfigManager
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.refresh_scheduler import RefreshScheduler
 
 LIGHT_BLUE = "#F9FBFE"
 BTN_SIZE = 225, 48
 PROF_DROP_SIZE = 220, 40
+PROFILE_NAME_INTERVAL_MS = 200
 
 
 class FrameMenu(SafeDisposableFrame):
@@ -83,9 +85,16 @@ class FrameMenu(SafeDisposableFrame):
         # Profile button
         prof_drop = customtkinter.CTkImage(
             Image.open("assets/images/prof_drop_head.png"), size=PROF_DROP_SIZE)
+        # Mirror of ConfigManager's profile name, which may change on the
+        # engine thread
+        self.profile_name_var = customtkinter.StringVar(
+            value=ConfigManager().curr_profile_name.get())
+        RefreshScheduler().register("menu_profile_name", self,
+                                    self.update_profile_name,
+                                    PROFILE_NAME_INTERVAL_MS)
         profile_btn = customtkinter.CTkLabel(
             master=self,
-            textvariable=ConfigManager().curr_profile_name,
+            textvariable=self.profile_name_var,
             image=prof_drop,
             height=42,
             compound="center",
@@ -108,6 +117,11 @@ class FrameMenu(SafeDisposableFrame):
         self.btns = {}
         self.btns = self.create_tab_btn(self.menu_btn_images, offset=1)
 
+    def update_profile_name(self):
+        profile_name = ConfigManager().curr_profile_name.get()
+        if profile_name != self.profile_name_var.get():
+            self.profile_name_var.set(profile_name)
+
     def create_tab_btn(self, btns: dict, offset):
 
         out_dict = {}
@@ -22,6 +22,7 @@ import customtkinter
 from PIL import Image
 
 from src.config_manager import ConfigManager
+from src.engine import Engine
 from src.task_killer import TaskKiller
 from src.gui.frames.safe_disposable_frame import (SafeDisposableFrame,
                                                   SafeDisposableScrollableFrame)
@@ -173,7 +174,8 @@ class FrameProfileItems(SafeDisposableScrollableFrame):
                 widget.configure(fg_color=DIV_COLORS["selected"])
 
         div["is_selected"] = True
-        ConfigManager().switch_profile(div["profile_name"])
+        Engine().send_command("switch_profile",
+                              {"profile_name": div["profile_name"]})
 
         # Refresh values in each page
         self.refresh_master_fn()
@@ -275,7 +277,8 @@ class FrameProfileItems(SafeDisposableScrollableFrame):
                                border_width=0)
         ConfigManager().rename_profile(div["profile_name"],
                                        div["entry_var"].get())
-        ConfigManager().switch_profile(div["entry_var"].get())
+        Engine().send_command("switch_profile",
+                              {"profile_name": div["entry_var"].get()})
         div["profile_name"] = div["entry_var"].get()
 
         # Show all rename buttons
@@ -545,11 +548,8 @@ class FrameProfile(SafeDisposableFrame):
         self.prev_event = event
 
     def change_profile(self, target):
-        ConfigManager().switch_profile(target)
-        self.pages["page_camera"].refresh_profile()
-        self.pages["page_cursor"].refresh_profile()
-        self.pages["page_gestures"].refresh_profile()
-        self.pages["page_keyboard"].refresh_profile()
+        # Pages are refreshed by MainGui once the engine switched
+        Engine().send_command("switch_profile", {"profile_name": target})
 
     def show_window(self):
         # Close the opening dropdown first
@@ -22,6 +22,7 @@ import customtkinter
 from PIL import Image
 
 from src.config_manager import ConfigManager
+from src.engine import Engine
 from src.gui.frames.safe_disposable_frame import SafeDisposableScrollableFrame
 from src.task_killer import TaskKiller
 
@@ -205,9 +206,9 @@ class ItemProfileEditor(SafeDisposableScrollableFrame):
         if div["profile_name"] == ConfigManager().curr_profile_name.get():
             logger.warning(f"Removing active profile, rollback to default")
 
-            ConfigManager().switch_profile(BACKUP_PROFILE_NAME)
-            # Refresh values in each page
-            self.main_gui_callback("refresh_profiles")
+            # Pages are refreshed by MainGui once the engine switched
+            Engine().send_command("switch_profile",
+                                  {"profile_name": BACKUP_PROFILE_NAME})
 
         self.refresh_frame()
 
@@ -456,11 +457,8 @@ class FrameProfileEditor():
         self.prev_event = event
 
     def change_profile(self, target):
-        ConfigManager().switch_profile(target)
-        self.pages["page_camera"].refresh_profile()
-        self.pages["page_cursor"].refresh_profile()
-        self.pages["page_gestures"].refresh_profile()
-        self.pages["page_keyboard"].refresh_profile()
+        # Pages are refreshed by MainGui once the engine switched
+        Engine().send_command("switch_profile", {"profile_name": target})
 
     def show_window(self):
         # Close the opening dropdown first
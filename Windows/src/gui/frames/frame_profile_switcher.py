@@ -22,6 +22,7 @@ import customtkinter
 from PIL import Image
 
 from src.config_manager import ConfigManager
+from src.engine import Engine
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
 from src.task_killer import TaskKiller
 
@@ -200,9 +201,9 @@ class ItemProfileSwitcher(SafeDisposableFrame):
 
     def switch_div_profile(self, div, event):
         # profile item click callback
-        ConfigManager().switch_profile(div["profile_name"])
-        # Refresh values in each page
-        self.main_gui_callback("refresh_profiles")
+        # Pages are refreshed by MainGui once the engine switched
+        Engine().send_command("switch_profile",
+                              {"profile_name": div["profile_name"]})
         self.owner_frame.hide_window()
 
     def create_div(self, row: int, div_id: str, profile_name) -> dict:
@@ -403,11 +404,8 @@ class FrameProfileSwitcher():
         self.prev_event = None
 
     def change_profile(self, target):
-        ConfigManager().switch_profile(target)
-        self.pages["page_camera"].refresh_profile()
-        self.pages["page_cursor"].refresh_profile()
-        self.pages["page_gestures"].refresh_profile()
-        self.pages["page_keyboard"].refresh_profile()
+        # Pages are refreshed by MainGui once the engine switched
+        Engine().send_command("switch_profile", {"profile_name": target})
 
     def show_window(self):
        
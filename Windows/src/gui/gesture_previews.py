@@ -0,0 +1,308 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+
+from PIL import Image, ImageDraw
+
+import src.shape_list as shape_list
+
+PREVIEW_SIZE = (68, 48)
+# Drawn larger then downscaled, for smooth lines
+SUPERSAMPLE = 4
+TILE_BOX = (16, 6, 52, 42)
+TILE_RADIUS = 5
+LINE_WIDTH = 1.2
+ARROW_LENGTH = 0.14
+
+TILE_COLOR = (233, 241, 252, 255)
+FACE_COLOR = (211, 226, 250, 255)
+LINE_COLOR = (156, 186, 242, 255)
+ACTIVE_COLOR = (80, 132, 233, 255)
+
+# Face in tile coordinates, (0, 0) top left and (1, 1) bottom right.
+# Left of the user is on the left, like in a mirror.
+EYE_Y = 0.40
+BROW_Y = 0.28
+MOUTH_Y = 0.76
+SIDE_X = {"l": -1, "r": 1}
+
+NEUTRAL_POSE = {
+    "brow_inner": 0,
+    "mouth_dx": 0,
+    "mouth_dy": 0,
+    "mouth_open": 0,
+    "mouth_round": 0,
+    "mouth_thick": False,
+    "jaw_dx": 0,
+    "jaw_drop": 0,
+    "cheek_puff": 0
+}
+for _s in SIDE_X:
+    NEUTRAL_POSE.update({
+        f"brow_{_s}": 0,
+        f"eye_{_s}": 1,
+        f"look_{_s}": (0, 0),
+        f"cheek_{_s}": 0,
+        f"corner_{_s}": 0,
+        f"stretch_{_s}": 0,
+        f"dimple_{_s}": False,
+        f"sneer_{_s}": False
+    })
+
+
+def sided_gestures(side: str, s: str) -> dict:
+    """Gestures of one side of the face.
+
+    Returns:
+        dict: {name: (pose changes, highlighted parts, arrow (x, y, dx, dy))}
+    """
+    x = SIDE_X[s]
+    eye_x = 0.5 + 0.15 * x
+    corner_x = 0.5 + 0.12 * x
+    return {
+        f"Lower {side.lower()} eyebrow":
+            ({f"brow_{s}": -1}, {f"brow_{s}"}, (eye_x, 0.06, 0, 1)),
+        f"Raise {side.lower()} eyebrow":
+            ({f"brow_{s}": 1}, {f"brow_{s}"}, (eye_x, 0.24, 0, -1)),
+        f"cheekSquint{side}":
+            ({f"cheek_{s}": 1}, {f"cheek_{s}"}, (eye_x, 0.66, 0, -1)),
+        f"eyeBlink{side}": ({f"eye_{s}": 0}, {f"eye_{s}"}, None),
+        f"eyeLookDown{side}":
+            ({f"look_{s}": (0, -1)}, {f"eye_{s}"}, (eye_x, 0.46, 0, 1)),
+        f"eyeLookIn{side}":
+            ({f"look_{s}": (-x, 0)}, {f"eye_{s}"}, (eye_x, 0.52, -x, 0)),
+        f"eyeLookOut{side}":
+            ({f"look_{s}": (x, 0)}, {f"eye_{s}"}, (eye_x, 0.52, x, 0)),
+        f"eyeLookUp{side}":
+            ({f"look_{s}": (0, 1)}, {f"eye_{s}"}, (eye_x, 0.34, 0, -1)),
+        f"eyeSquint{side}": ({f"eye_{s}": 0.45}, {f"eye_{s}"}, None),
+        f"eyeWide{side}": ({f"eye_{s}": 1.5}, {f"eye_{s}"}, None),
+        f"jaw{side}": ({"jaw_dx": 0.06 * x}, {"jaw"}, (0.5, 0.99, x, 0)),
+        f"mouthDimple{side}":
+            ({f"dimple_{s}": True}, {"mouth"}, None),
+        f"mouthFrown{side}":
+            ({f"corner_{s}": -1}, {"mouth"}, (corner_x, 0.70, 0, 1)),
+        f"Mouth {side.lower()}":
+            ({"mouth_dx": x}, {"mouth"}, (0.5, 0.88, x, 0)),
+        f"mouthLowerDown{side}":
+            ({"mouth_open": 0.5}, {"mouth"}, (corner_x, 0.82, 0, 1)),
+        f"mouthPress{side}":
+            ({"mouth_thick": True}, {"mouth"}, (corner_x, 0.90, 0, -1)),
+        f"mouthSmile{side}":
+            ({f"corner_{s}": 1}, {"mouth"}, (corner_x, 0.84, 0, -1)),
+        f"mouthStretch{side}":
+            ({f"stretch_{s}": 1}, {"mouth"}, (corner_x, 0.86, x, 0)),
+        f"mouthUpperUp{side}":
+            ({"mouth_open": 0.5}, {"mouth"}, (corner_x, 0.72, 0, -1)),
+        f"noseSneer{side}":
+            ({f"sneer_{s}": True}, {"nose"}, (0.5 + 0.12 * x, 0.60, 0, -1)),
+    }
+
+
+GESTURE_POSES = {
+    "None": ({}, set(), None),
+    "browInnerUp": ({"brow_inner": 1}, {"brow_l", "brow_r"},
+                    (0.5, 0.30, 0, -1)),
+    "cheekPuff": ({"cheek_puff": 1}, {"head"}, None),
+    "jawForward": ({"jaw_drop": 0.03}, {"jaw"}, (0.5, 0.86, 0, 1)),
+    "Open mouth": ({"mouth_open": 1, "jaw_drop": 0.03}, {"mouth"},
+                   (0.5, 0.94, 0, 1)),
+    "mouthClose": ({"jaw_drop": 0.06, "mouth_thick": True}, {"mouth"}, None),
+    "mouthFunnel": ({"mouth_round": 1, "mouth_open": 1}, {"mouth"}, None),
+    "mouthPucker": ({"mouth_round": 1}, {"mouth"}, None),
+    "Roll lower mouth": ({"mouth_thick": True}, {"mouth"}, (0.5, 0.94, 0,
+                                                             -1)),
+    "Roll upper mouth": ({"mouth_thick": True}, {"mouth"}, (0.5, 0.62, 0, 1)),
+    "mouthShrugLower": ({"mouth_dy": 1}, {"mouth"}, (0.5, 0.94, 0, -1)),
+    "mouthShrugUpper": ({"mouth_dy": 0.5, "mouth_thick": True}, {"mouth"},
+                        (0.5, 0.62, 0, -1)),
+}
+for _side, _s in (("Left", "l"), ("Right", "r")):
+    GESTURE_POSES.update(sided_gestures(_side, _s))
+for _name in shape_list.blendshape_names:
+    assert _name in GESTURE_POSES, f"{_name} has no preview pose"
+
+
+def draw_arrow(draw: ImageDraw.ImageDraw, to_px: callable, arrow: tuple,
+               width: int) -> None:
+    x, y, dx, dy = arrow
+    tip = (x + dx * ARROW_LENGTH, y + dy * ARROW_LENGTH)
+    draw.line([to_px(x, y), to_px(*tip)], fill=ACTIVE_COLOR, width=width)
+    # Arrow head, two strokes back from the tip
+    head = ARROW_LENGTH * 0.4
+    for side in (-1, 1):
+        back = (tip[0] - (dx - side * dy) * head,
+                tip[1] - (dy + side * dx) * head)
+        draw.line([to_px(*tip), to_px(*back)], fill=ACTIVE_COLOR, width=width)
+
+
+def draw_face(draw: ImageDraw.ImageDraw, to_px: callable, pose: dict,
+              active: set, width: int) -> None:
+
+    def color(part):
+        return ACTIVE_COLOR if part in active else LINE_COLOR
+
+    def box(x1, y1, x2, y2):
+        return [to_px(x1, y1), to_px(x2, y2)]
+
+    # Head, wider with puffed cheeks
+    puff = 0.05 * pose["cheek_puff"]
+    draw.ellipse(box(0.18 - puff, 0.06, 0.82 + puff, 0.98),
+                 fill=FACE_COLOR,
+                 outline=color("head"),
+                 width=width)
+
+    # Chin
+    if "jaw" in active:
+        dx, drop = pose["jaw_dx"], pose["jaw_drop"]
+        draw.arc(box(0.34 + dx, 0.74 + drop, 0.66 + dx, 0.94 + drop),
+                 20,
+                 160,
+                 fill=ACTIVE_COLOR,
+                 width=width)
+
+    for s, x in SIDE_X.items():
+        eye_x = 0.5 + 0.15 * x
+
+        # Brow, inner end next to the nose
+        brow_y = BROW_Y - 0.05 * pose[f"brow_{s}"]
+        inner_y = brow_y - 0.05 * pose["brow_inner"]
+        draw.line([to_px(eye_x + 0.08 * x, brow_y),
+                   to_px(eye_x - 0.08 * x, inner_y)],
+                  fill=color(f"brow_{s}"),
+                  width=width)
+
+        # Eye, a line when almost closed
+        half_h = 0.045 * pose[f"eye_{s}"]
+        if half_h < 0.01:
+            draw.line([to_px(eye_x - 0.08, EYE_Y),
+                       to_px(eye_x + 0.08, EYE_Y)],
+                      fill=color(f"eye_{s}"),
+                      width=width)
+        else:
+            draw.ellipse(box(eye_x - 0.08, EYE_Y - half_h, eye_x + 0.08,
+                             EYE_Y + half_h),
+                         outline=color(f"eye_{s}"),
+                         width=width)
+            look_x, look_y = pose[f"look_{s}"]
+            r = min(0.025, half_h)
+            px, py = eye_x + 0.04 * look_x, EYE_Y - 0.02 * look_y
+            draw.ellipse(box(px - r, py - r, px + r, py + r),
+                         fill=color(f"eye_{s}"))
+
+        # Raised cheek under the eye
+        if pose[f"cheek_{s}"]:
+            draw.arc(box(eye_x - 0.09, 0.46, eye_x + 0.09, 0.58),
+                     200,
+                     340,
+                     fill=color(f"cheek_{s}"),
+                     width=width)
+
+        # Nose wrinkle
+        if pose[f"sneer_{s}"]:
+            draw.line([to_px(0.5 + 0.05 * x, 0.50),
+                       to_px(0.5 + 0.09 * x, 0.56)],
+                      fill=color("nose"),
+                      width=width)
+
+    # Nose
+    draw.line([to_px(0.5, 0.45), to_px(0.47, 0.60), to_px(0.53, 0.60)],
+              fill=color("nose"),
+              width=width,
+              joint="curve")
+
+    # Mouth
+    mouth_color = color("mouth")
+    cx = 0.5 + 0.08 * pose["mouth_dx"]
+    cy = MOUTH_Y - 0.04 * pose["mouth_dy"] + pose["jaw_drop"]
+    left = (cx - 0.12 - 0.04 * pose["stretch_l"],
+            cy - 0.05 * pose["corner_l"])
+    right = (cx + 0.12 + 0.04 * pose["stretch_r"],
+             cy - 0.05 * pose["corner_r"])
+    mouth_width = width * 2 if pose["mouth_thick"] else width
+
+    if pose["mouth_round"]:
+        r = 0.05
+        h = r * (1 + pose["mouth_open"])
+        draw.ellipse(box(cx - r, cy - h, cx + r, cy + h),
+                     outline=mouth_color,
+                     width=width)
+    elif pose["mouth_open"]:
+        bottom = cy + 0.09 * pose["mouth_open"]
+        draw.polygon([
+            to_px(*left),
+            to_px(cx - 0.05, cy - 0.015),
+            to_px(cx + 0.05, cy - 0.015),
+            to_px(*right),
+            to_px(cx + 0.05, bottom),
+            to_px(cx - 0.05, bottom)
+        ],
+                     outline=mouth_color,
+                     width=width)
+    else:
+        draw.line([to_px(*left), to_px(cx, cy), to_px(*right)],
+                  fill=mouth_color,
+                  width=mouth_width,
+                  joint="curve")
+
+    for s, corner in (("l", left), ("r", right)):
+        if pose[f"dimple_{s}"]:
+            r = 0.02
+            x = corner[0] + 0.04 * SIDE_X[s]
+            draw.ellipse(box(x - r, corner[1] - r, x + r, corner[1] + r),
+                         fill=mouth_color)
+
+
+def draw_preview(gesture: str) -> Image.Image:
+    """Draw a schematic face making the gesture, moving parts highlighted
+    and an arrow showing the direction of the motion.
+    """
+    size = (PREVIEW_SIZE[0] * SUPERSAMPLE, PREVIEW_SIZE[1] * SUPERSAMPLE)
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    x1, y1, x2, y2 = (v * SUPERSAMPLE for v in TILE_BOX)
+    draw.rounded_rectangle([x1, y1, x2, y2],
+                           radius=TILE_RADIUS * SUPERSAMPLE,
+                           fill=TILE_COLOR)
+
+    def to_px(x, y):
+        return (x1 + x * (x2 - x1), y1 + y * (y2 - y1))
+
+    width = round(LINE_WIDTH * SUPERSAMPLE)
+    changes, active, arrow = GESTURE_POSES[gesture]
+    if gesture == "None":
+        draw.line([to_px(0.05, 0.95), to_px(0.95, 0.05)],
+                  fill=LINE_COLOR,
+                  width=width)
+    else:
+        draw_face(draw, to_px, NEUTRAL_POSE | changes, active, width)
+        if arrow is not None:
+            draw_arrow(draw, to_px, arrow, width)
+
+    return image.resize(PREVIEW_SIZE, Image.LANCZOS)
+
+
+@functools.lru_cache(maxsize=None)
+def get_preview(gesture: str, image_path: str = None) -> Image.Image:
+    """Preview of a gesture, made on first use and cached.
+
+    Args:
+        gesture (str): blendshape name
+        image_path (str): hand-made image, drawn preview if None
+    """
+    if image_path is not None:
+        return Image.open(image_path).resize(PREVIEW_SIZE)
+    return draw_preview(gesture)
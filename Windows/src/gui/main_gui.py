@@ -21,13 +21,19 @@ from PIL import Image
 import src.gui.frames as frames
 import src.gui.pages as pages
 from src.config_manager import ConfigManager
-from src.controllers import MouseController
+from src.engine import Engine
+from src.gui.refresh_scheduler import RefreshScheduler
 
 customtkinter.set_appearance_mode("light")
 customtkinter.set_default_color_theme("assets/themes/google_theme.json")
 
 logger = logging.getLogger("MainGUi")
 
+PROFILE_WATCH_INTERVAL_MS = 200
+
+# Pages showing profile values, refreshed when shown after a switch
+PROFILE_PAGES = ["page_camera", "page_cursor", "page_gestures", "page_keyboard"]
+
 
 class MainGui():
 
@@ -44,6 +50,9 @@ class MainGui():
         self.tk_root.grid_rowconfigure(1, weight=1)
         self.tk_root.grid_columnconfigure(1, weight=1)
 
+        # Periodic updates of all frames
+        RefreshScheduler().start(self.tk_root)
+
         # Create menu frame and assign callbacks
         self.frame_menu = frames.FrameMenu(self.tk_root,
                                            self.root_function_callback,
@@ -57,6 +66,7 @@ class MainGui():
                              sticky="nsew",
                              columnspan=1,
                              rowspan=3)
+        self.frame_menu.enter()
 
         # Create Preview frame
         self.frame_preview = frames.FrameCamPreview(self.tk_root,
@@ -100,6 +110,7 @@ class MainGui():
 
         self.page_names = list(self.pages.keys())
         self.curr_page_name = None
+        self.stale_pages = set()
         for name, page in self.pages.items():
             # Page home extended full window
             if name == "page_home":
@@ -127,6 +138,13 @@ class MainGui():
         self.frame_profile_editor = frames.FrameProfileEditor(
             self.tk_root, main_gui_callback=self.root_function_callback)
 
+        # Profiles are switched by the engine, for the GUI as well as for
+        # gestures and the IPC API, pages refresh when the name changes
+        self.last_profile_name = ConfigManager().curr_profile_name.get()
+        RefreshScheduler().register("profile_watch", self.frame_menu,
+                                    self.check_profile_changed,
+                                    PROFILE_WATCH_INTERVAL_MS)
+
     def root_function_callback(self, function_name, args: dict = {}, **kwargs):
         logger.info(f"root_function_callback {function_name} with {args}")
 
@@ -143,10 +161,21 @@ class MainGui():
 
         elif function_name == "refresh_profiles":
             logger.info("refresh_profile")
-            self.pages["page_gestures"].refresh_profile()
-            self.pages["page_camera"].refresh_profile()
-            self.pages["page_cursor"].refresh_profile()
-            self.pages["page_keyboard"].refresh_profile()
+            # The engine applied the profile when it switched
+            self.last_profile_name = ConfigManager().curr_profile_name.get()
+
+            # Only rebuild the visible page now, others when shown
+            self.stale_pages = set(PROFILE_PAGES)
+            self.refresh_page_if_stale(self.curr_page_name)
+
+    def refresh_page_if_stale(self, page_name: str) -> None:
+        if page_name in self.stale_pages:
+            self.stale_pages.discard(page_name)
+            self.pages[page_name].refresh_profile()
+
+    def check_profile_changed(self):
+        if ConfigManager().curr_profile_name.get() != self.last_profile_name:
+            self.root_function_callback("refresh_profiles")
 
     def cam_preview_callback(self, function_name, args: dict, **kwargs):
         logger.info(f"cam_preview_callback {function_name} with {args}")
@@ -155,10 +184,7 @@ class MainGui():
             self.set_mediapipe_mouse_enable(new_state=args["switch_status"])
 
     def set_mediapipe_mouse_enable(self, new_state: bool):
-        if new_state:
-            MouseController().set_active(True)
-        else:
-            MouseController().set_active(False)
+        Engine().send_command("set_active", {"flag": bool(new_state)})
 
     def change_page(self, target_page_name: str):
 
@@ -167,6 +193,7 @@ class MainGui():
 
         for name, page in self.pages.items():
             if name == target_page_name:
+                self.refresh_page_if_stale(name)
                 page.grid()
                 self.pages[target_page_name].enter()
                 self.curr_page_name = target_page_name
@@ -21,7 +21,7 @@ import numpy as np
 from PIL import Image
 
 from src.config_manager import ConfigManager
-from src.controllers import MouseController
+from src.engine import Engine
 from src.gui.balloon import Balloon
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
 
@@ -192,7 +192,7 @@ class FrameSelectGesture(SafeDisposableFrame):
             if not self.slider_dragging:
                 ConfigManager().set_temp_config(field=div_name, value=new_value)
                 ConfigManager().apply_config()
-                MouseController().calc_smooth_kernel()
+                Engine().send_command("apply_config")
         else:
             div["entry"].configure(fg_color="#ee9e9d")
 
@@ -213,7 +213,7 @@ class FrameSelectGesture(SafeDisposableFrame):
         new_value = int(div["entry_var"].get())
         ConfigManager().set_temp_config(field=div_name, value=new_value)
         ConfigManager().apply_config()
-        MouseController().calc_smooth_kernel()
+        Engine().send_command("apply_config")
 
     def inner_refresh_profile(self):
         self.load_initial_config()
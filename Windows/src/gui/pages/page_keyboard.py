@@ -25,7 +25,9 @@ from src.config_manager import ConfigManager
 from src.detectors import FaceMesh
 from src.gui.balloon import Balloon
 from src.gui.dropdown import Dropdown
+from src.gui.frames.frame_calibration import FrameCalibration
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame, SafeDisposableScrollableFrame
+from src.gui.refresh_scheduler import RefreshScheduler, set_volume_bar
 
 logger = logging.getLogger("PageKeyboard")
 
@@ -41,6 +43,7 @@ DIV_WIDTH = 240
 HELP_ICON_SIZE = (18, 18)
 A_BUTTON_SIZE = (96, 48)
 BIN_ICON_SIZE = (24, 24)
+VOLUME_INTERVAL_MS = 50
 
 BALLOON_TXT = "Set how prominent your gesture has\nto be in order to trigger the action"
 
@@ -97,6 +100,10 @@ class FrameSelectKeyboard(SafeDisposableScrollableFrame):
         self.divs = {}
         self.load_initial_keybinds()
 
+        RefreshScheduler().register("keyboard_gesture_volume", self,
+                                    self.update_volume_preview,
+                                    VOLUME_INTERVAL_MS)
+
     def load_initial_keybinds(self):
         """Load default from config and set the UI
         """
@@ -440,6 +447,8 @@ class FrameSelectKeyboard(SafeDisposableScrollableFrame):
     def update_volume_preview(self):
 
         bs = FaceMesh().get_blendshapes()
+        if bs is None:
+            return
 
         for div in self.divs.values():
 
@@ -448,23 +457,10 @@ class FrameSelectKeyboard(SafeDisposableScrollableFrame):
 
             bs_idx = shape_list.blendshape_indices[div["selected_gesture"]]
             bs_value = bs[bs_idx]
-            div["volume_bar"].set(bs_value)
 
             slider_value = div["slider"].get() / 100
-            if bs_value > slider_value:
-                div["volume_bar"].configure(progress_color=GREEN)  # green
-            else:
-                div["volume_bar"].configure(progress_color=YELLOW)  # yellow
-
-    def frame_loop(self):
-        if self.is_destroyed:
-            return
-
-        if self.is_active:
-            self.update_volume_preview()
-            self.after(50, self.frame_loop)
-        else:
-            return
+            color = GREEN if bs_value > slider_value else YELLOW
+            set_volume_bar(div, bs_value, color)
 
     def inner_refresh_profile(self):
         """Refresh the page divs to match the new profile
@@ -478,10 +474,6 @@ class FrameSelectKeyboard(SafeDisposableScrollableFrame):
         # Create new divs form the new profile
         self.load_initial_keybinds()
 
-    def enter(self):
-        super().enter()
-        self.after(1, self.frame_loop)
-
     def leave(self):
         super().leave()
         self.wait_for_key(self.waiting_div, self.waiting_button, "cancel")
@@ -518,6 +510,13 @@ class PageKeyboard(SafeDisposableFrame):
         des_label.cget("font").configure(size=14)
         des_label.grid(row=1, column=0, padx=20, pady=(10, 40), sticky="nw")
 
+        # Calibration, same for mouse and keyboard bindings
+        self.calibration_frame = FrameCalibration(
+            self,
+            task_name="keyboard_calibration_status",
+            logger_name="FrameCalibration")
+        self.calibration_frame.grid(row=0, column=0, padx=20, sticky="ne")
+
         # Inner frame
         self.inner_frame = FrameSelectKeyboard(
             self, logger_name="FrameSelectKeyboard")
@@ -539,6 +538,7 @@ class PageKeyboard(SafeDisposableFrame):
     def enter(self):
         super().enter()
         self.inner_frame.enter()
+        self.calibration_frame.enter()
 
         # Hide dropdown when mouse leave the frame
         self.bind_id_leave = self.bind(
@@ -550,6 +550,7 @@ class PageKeyboard(SafeDisposableFrame):
     def leave(self):
         super().leave()
         self.inner_frame.leave()
+        self.calibration_frame.leave()
         self.unbind("<Leave>", self.bind_id_leave)
 
         self.inner_frame.shared_dropdown.hide_dropdown()
@@ -557,3 +558,4 @@ class PageKeyboard(SafeDisposableFrame):
     def destroy(self):
         super().destroy()
         self.inner_frame.destroy()
+        self.calibration_frame.destroy()
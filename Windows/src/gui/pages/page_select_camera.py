@@ -16,11 +16,12 @@ import logging
 import tkinter
 
 import customtkinter
-from PIL import Image, ImageTk
 
 from src.camera_manager import CameraManager
 from src.config_manager import ConfigManager
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.preview_renderer import PreviewRenderer
+from src.gui.refresh_scheduler import RefreshScheduler
 
 logger = logging.getLogger("PageSelectCamera")
 
@@ -59,10 +60,6 @@ class PageSelectCamera(SafeDisposableFrame):
         self.radios = []
 
         # Camera canvas
-        self.placeholder_im = Image.open(
-            "assets/images/placeholder.png").resize(
-                (CANVAS_WIDTH, CANVAS_HEIGHT))
-        self.placeholder_im = ImageTk.PhotoImage(self.placeholder_im)
         self.canvas = tkinter.Canvas(master=self,
                                      width=CANVAS_WIDTH,
                                      height=CANVAS_HEIGHT)
@@ -74,11 +71,15 @@ class PageSelectCamera(SafeDisposableFrame):
                          rowspan=MAX_ROWS)
 
         # Set first image.
-        self.canvas_im = self.canvas.create_image(0,
-                                                  0,
-                                                  image=self.placeholder_im,
-                                                  anchor=tkinter.NW)
-        self.new_photo = None
+        self.preview_renderer = PreviewRenderer(
+            self.canvas,
+            "raw",
+            CANVAS_WIDTH,
+            CANVAS_HEIGHT,
+            placeholder_path="assets/images/placeholder.png")
+        RefreshScheduler().register("camera_page_preview", self,
+                                    self.preview_renderer.render,
+                                    ConfigManager().config["tick_interval_ms"])
         self.latest_camera_list = []
 
     def load_initial_config(self):
@@ -123,29 +124,10 @@ class PageSelectCamera(SafeDisposableFrame):
         ConfigManager().apply_config()
         self.prev_radio_value = new_radio_value
 
-    def page_loop(self):
-        if self.is_destroyed:
-            return
-
-        if self.is_active:
-
-            frame_rgb = CameraManager().get_raw_frame()
-            # Assign ref to avoid garbage collected
-            self.new_photo = ImageTk.PhotoImage(
-                image=Image.fromarray(frame_rgb).resize((CANVAS_WIDTH,
-                                                         CANVAS_HEIGHT)))
-            self.canvas.itemconfig(self.canvas_im, image=self.new_photo)
-            self.canvas.update()
-
-            self.after(ConfigManager().config["tick_interval_ms"],
-                       self.page_loop)
-
     def enter(self):
         super().enter()
         self.load_initial_config()
-        self.after(1, self.page_loop)
 
     def refresh_profile(self):
+        # Camera of the new profile is opened by Engine.apply_profile
         self.load_initial_config()
-        new_camera_id = ConfigManager().config["camera_id"]
-        CameraManager().pick_camera(new_camera_id)
@@ -23,19 +23,23 @@ from src.config_manager import ConfigManager
 from src.detectors import FaceMesh
 from src.gui.balloon import Balloon
 from src.gui.dropdown import Dropdown
-from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.frames.frame_calibration import FrameCalibration
+from src.gui.frames.safe_disposable_frame import (
+    SafeDisposableFrame, SafeDisposableScrollableFrame)
+from src.gui.refresh_scheduler import RefreshScheduler, set_volume_bar
 
-MAX_ROWS = 2
+N_COLUMNS = 2
 HELP_ICON_SIZE = (18, 18)
 DIV_WIDTH = 240
 DEFAULT_TRIGGER_TYPE = "single"
 GREEN = "#34A853"
 YELLOW = "#FABB05"
+VOLUME_INTERVAL_MS = 50
 
 BALLOON_TXT = "Set how prominent your gesture has\nto be in order to trigger the action"
 
 
-class FrameSelectGesture(SafeDisposableFrame):
+class FrameSelectGesture(SafeDisposableScrollableFrame):
 
     def __init__(
         self,
@@ -45,7 +49,7 @@ class FrameSelectGesture(SafeDisposableFrame):
         super().__init__(master, **kwargs)
         self.is_active = False
 
-        self.grid_rowconfigure(MAX_ROWS, weight=1)
+        self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=1)
 
         # Float UIs
@@ -66,6 +70,11 @@ class FrameSelectGesture(SafeDisposableFrame):
                                      shape_list.available_gestures_keys)
         self.load_initial_keybinds()
         self.slider_dragging = False
+        self.refresh_scrollbar()
+
+        RefreshScheduler().register("mouse_gesture_volume", self,
+                                    self.update_volume_preview,
+                                    VOLUME_INTERVAL_MS)
 
     def set_div_inactive(self, div):
         none_gesture = shape_list.available_gestures_keys[0]
@@ -112,8 +121,9 @@ class FrameSelectGesture(SafeDisposableFrame):
         out_dict = {}
 
         for idx, action_name in enumerate(action_list):
-            row = idx % (MAX_ROWS + 1)
-            column = idx // (MAX_ROWS + 1)
+            # Row by row, scroll down for more actions
+            row = idx // N_COLUMNS
+            column = idx % N_COLUMNS
 
             # Action label
             label = customtkinter.CTkLabel(master=self,
@@ -281,6 +291,8 @@ class FrameSelectGesture(SafeDisposableFrame):
     def update_volume_preview(self):
 
         bs = FaceMesh().get_blendshapes()
+        if bs is None:
+            return
 
         for div_name, div in self.divs.items():
 
@@ -289,23 +301,10 @@ class FrameSelectGesture(SafeDisposableFrame):
 
             bs_idx = shape_list.blendshape_indices[div["selected_gesture"]]
             bs_value = bs[bs_idx]
-            div["volume_bar"].set(bs_value)
 
             slider_value = div["slider"].get() / 100
-            if bs_value > slider_value:
-                div["volume_bar"].configure(progress_color=GREEN)  # green
-            else:
-                div["volume_bar"].configure(progress_color=YELLOW)  # yellow
-
-    def frame_loop(self):
-        if self.is_destroyed:
-            return
-
-        if self.is_active:
-            self.update_volume_preview()
-            self.after(50, self.frame_loop)
-        else:
-            return
+            color = GREEN if bs_value > slider_value else YELLOW
+            set_volume_bar(div, bs_value, color)
 
     def inner_refresh_profile(self):
         # Create new divs form the new profile
@@ -314,7 +313,6 @@ class FrameSelectGesture(SafeDisposableFrame):
     def enter(self):
         super().enter()
         #self.load_initial_keybinds()
-        self.after(1, self.frame_loop)
 
     def leave(self):
         super().leave()
@@ -351,14 +349,22 @@ class PageSelectGestures(SafeDisposableFrame):
         des_label.cget("font").configure(size=14)
         des_label.grid(row=1, column=0, padx=20, pady=10, sticky="nw")
 
+        # Calibration, same for mouse and keyboard bindings
+        self.calibration_frame = FrameCalibration(
+            self,
+            task_name="mouse_calibration_status",
+            logger_name="FrameCalibration")
+        self.calibration_frame.grid(row=0, column=0, padx=20, sticky="ne")
+
         # Inner frame
         self.inner_frame = FrameSelectGesture(self,
                                               logger_name="FrameSelectGesture")
-        self.inner_frame.grid(row=2, column=0, padx=5, pady=5, sticky="nw")
+        self.inner_frame.grid(row=2, column=0, padx=5, pady=5, sticky="nswe")
 
     def enter(self):
         super().enter()
         self.inner_frame.enter()
+        self.calibration_frame.enter()
 
         # Hide dropdown when mouse leave the frame
         self.bind_id_leave = self.bind(
@@ -370,9 +376,11 @@ class PageSelectGestures(SafeDisposableFrame):
     def leave(self):
         super().leave()
         self.inner_frame.leave()
+        self.calibration_frame.leave()
         self.unbind("<Leave>", self.bind_id_leave)
         self.inner_frame.shared_dropdown.hide_dropdown()
 
     def destroy(self):
         super().destroy()
         self.inner_frame.destroy()
+        self.calibration_frame.destroy()
@@ -0,0 +1,57 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tkinter
+
+from PIL import Image, ImageTk
+
+from src.camera_manager import CameraManager
+
+
+class PreviewRenderer():
+    """Draw a CameraManager buffer on a canvas.
+
+    Thumbnails are made by CameraManager when a frame is produced, here they
+    are only pasted into one PhotoImage which is reused for every frame.
+    """
+
+    def __init__(self, canvas: tkinter.Canvas, buffer_name: str, width: int,
+                 height: int, placeholder_path: str):
+        self.buffer_name = buffer_name
+        self.size = (width, height)
+        CameraManager().register_preview(buffer_name, self.size)
+
+        self.photo = ImageTk.PhotoImage("RGB", self.size)
+        self.photo.paste(
+            Image.open(placeholder_path).convert("RGB").resize(self.size))
+        self.canvas_image = canvas.create_image(0,
+                                                0,
+                                                image=self.photo,
+                                                anchor=tkinter.NW)
+        self.last_seq = -1
+
+    def render(self) -> bool:
+        """Paste latest thumbnail if there is a new one
+
+        Returns:
+            bool: True if the canvas changed
+        """
+        seq, thumbnail = CameraManager().get_preview(self.buffer_name,
+                                                     self.size)
+        if (thumbnail is None) or (seq == self.last_seq):
+            return False
+
+        self.photo.paste(Image.fromarray(thumbnail))
+        self.last_seq = seq
+        return True
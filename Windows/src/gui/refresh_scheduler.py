@@ -0,0 +1,123 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("RefreshScheduler")
+
+TICK_MS = 16
+
+# Volume bars smaller changes than this are not redrawn.
+VOLUME_EPSILON = 0.01
+
+
+def set_volume_bar(div: dict, value: float, color: str) -> None:
+    """Update a volume bar only when its value or color really changed.
+    Keeps last drawn state in the div.
+    """
+    if abs(value - div.get("last_volume", -1)) > VOLUME_EPSILON:
+        div["volume_bar"].set(value)
+        div["last_volume"] = value
+
+    if color != div.get("last_volume_color"):
+        div["volume_bar"].configure(progress_color=color)
+        div["last_volume_color"] = color
+
+
+class RefreshScheduler(metaclass=Singleton):
+    """Single Tk timer for all periodic GUI updates.
+
+    A task only runs while its owner frame is entered (the visible page) and
+    the window is not minimized.
+    """
+
+    def __init__(self):
+        logger.info("Intialize RefreshScheduler singleton")
+        self.tk_root = None
+        self.tasks = {}
+        self.busy_sec = 0
+        self.window_start_ts = time.perf_counter()
+        self.busy_ms_per_sec = 0
+        self.is_started = False
+
+    def start(self, tk_root):
+        if not self.is_started:
+            logger.info("Start RefreshScheduler singleton")
+            self.tk_root = tk_root
+            self.tk_root.after(TICK_MS, self.loop)
+            self.is_started = True
+
+    def register(self, task_name: str, owner, callback: callable,
+                 interval_ms: int) -> None:
+        """Call callback every interval_ms while owner is active
+
+        Args:
+            task_name (str): unique name, registering again replaces the task
+            owner (SafeDisposableFrame): frame which shows the updates
+            callback (callable): update function without arguments
+            interval_ms (int): minimum time between two calls
+        """
+        self.tasks[task_name] = {
+            "owner": owner,
+            "callback": callback,
+            "interval_sec": interval_ms / 1000,
+            "next_ts": 0
+        }
+
+    def unregister(self, task_name: str) -> None:
+        self.tasks.pop(task_name, None)
+
+    def is_minimized(self) -> bool:
+        return self.tk_root.state() == "iconic"
+
+    def run_tasks(self) -> None:
+        now = time.perf_counter()
+        for task_name, task in list(self.tasks.items()):
+            owner = task["owner"]
+            if owner.is_destroyed:
+                self.unregister(task_name)
+                continue
+            if (not owner.is_active) or (now < task["next_ts"]):
+                continue
+
+            task["next_ts"] = now + task["interval_sec"]
+            try:
+                task["callback"]()
+            except Exception as e:
+                logger.error(f"Task {task_name} failed: {e}", exc_info=e)
+
+        self.busy_sec += time.perf_counter() - now
+
+    def loop(self) -> None:
+        if not self.is_minimized():
+            self.run_tasks()
+
+        now = time.perf_counter()
+        elapsed = now - self.window_start_ts
+        if elapsed >= 1.0:
+            self.busy_ms_per_sec = self.busy_sec * 1000 / elapsed
+            logger.debug(
+                f"GUI refresh busy {self.busy_ms_per_sec:.1f} ms per second")
+            self.busy_sec = 0
+            self.window_start_ts = now
+
+        self.tk_root.after(TICK_MS, self.loop)
+
+    def get_busy_ms_per_sec(self) -> float:
+        """Time spent in GUI updates on the Tk thread, per second.
+        """
+        return self.busy_ms_per_sec
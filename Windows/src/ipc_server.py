@@ -0,0 +1,256 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import logging
+import socket
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+
+from src.config_manager import ConfigManager
+from src.detectors.facemesh import N_SHAPES
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("IpcServer")
+
+# Only local tools may connect.
+IPC_HOST = "127.0.0.1"
+
+# Message: 4 bytes big-endian payload length, then payload.
+# Payload starts with its type, b"J" JSON or b"T" telemetry.
+LENGTH_HEADER = struct.Struct(">I")
+TYPE_JSON = b"J"
+TYPE_TELEMETRY = b"T"
+MAX_REQUEST_BYTES = 64 * 1024
+
+# Telemetry record: seq, capture_ms, is_active, track x, y, achieved fps,
+# latency ms, then blendshape values. Little-endian, 4 + 8 + 1 + 4 * 4 +
+# N_SHAPES * 4 bytes. Missing values are NaN.
+TELEMETRY_RECORD = struct.Struct(f"<Id?ffff{N_SHAPES}f")
+
+# Records queued per subscriber, the oldest are dropped when a client reads
+# slower than the engine produces.
+SUBSCRIBER_QUEUE = 8
+SUBSCRIBER_IDLE_SEC = 1.0
+
+
+def send_message(conn: socket.socket, msg_type: bytes, body: bytes) -> None:
+    conn.sendall(LENGTH_HEADER.pack(len(body) + 1) + msg_type + body)
+
+
+def recv_exact(conn: socket.socket, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+class Subscriber():
+    """Telemetry stream of one client with its own bounded queue.
+    """
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.queue = deque(maxlen=SUBSCRIBER_QUEUE)
+        self.new_data_flag = threading.Event()
+        self.n_sent = 0
+        self.n_dropped = 0
+
+    def push(self, record: bytes) -> None:
+        """Called on the engine thread, never blocks.
+        """
+        if len(self.queue) == self.queue.maxlen:
+            self.n_dropped += 1
+        self.queue.append(record)
+        self.new_data_flag.set()
+
+    def send_loop(self, stop_flag: threading.Event) -> None:
+        while not stop_flag.is_set():
+            if not self.new_data_flag.wait(SUBSCRIBER_IDLE_SEC):
+                continue
+            self.new_data_flag.clear()
+            while self.queue:
+                send_message(self.conn, TYPE_TELEMETRY,
+                             self.queue.popleft())
+                self.n_sent += 1
+
+
+class IpcServer(metaclass=Singleton):
+    """Local control and telemetry API.
+
+    Clients send JSON requests {"method": str, "params": dict} and get
+    {"ok": bool, "result": ...} or {"ok": false, "error": str}. Commands go
+    through Engine.send_command like the GUI. The "subscribe" method turns
+    the connection into a telemetry stream of TELEMETRY_RECORD messages,
+    one per new detection result.
+    """
+
+    def __init__(self):
+        logger.info("Intialize IpcServer singleton")
+        self.server_socket = None
+        self.stop_flag = threading.Event()
+        self.subscribers_lock = threading.Lock()
+        self.subscribers = []
+        self.is_started = False
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start IpcServer singleton")
+            port = ConfigManager().config["ipc_port"]
+            self.server_socket = socket.socket(socket.AF_INET,
+                                               socket.SOCK_STREAM)
+            try:
+                self.server_socket.bind((IPC_HOST, port))
+            except OSError as e:
+                # The app works without the API, e.g. port already in use
+                logger.error(f"Cannot listen on {IPC_HOST}:{port}: {e}")
+                self.server_socket.close()
+                self.server_socket = None
+                return
+            self.server_socket.listen()
+            logger.info(f"Listening on {IPC_HOST}:{port}")
+
+            threading.Thread(target=self.accept_loop, daemon=True).start()
+            self.is_started = True
+
+    def accept_loop(self) -> None:
+        while not self.stop_flag.is_set():
+            try:
+                conn, addr = self.server_socket.accept()
+            except OSError:
+                # Socket closed by destroy
+                return
+            logger.info(f"Client connected {addr}")
+            threading.Thread(target=self.client_loop,
+                             args=(conn,),
+                             daemon=True).start()
+
+    def client_loop(self, conn: socket.socket) -> None:
+        try:
+            while not self.stop_flag.is_set():
+                length = LENGTH_HEADER.unpack(
+                    recv_exact(conn, LENGTH_HEADER.size))[0]
+                if length < 1 or length > MAX_REQUEST_BYTES:
+                    raise ConnectionError(f"Invalid message length {length}")
+                payload = recv_exact(conn, length)
+                if payload[:1] != TYPE_JSON:
+                    raise ConnectionError("Only JSON requests are accepted")
+
+                request = json.loads(payload[1:])
+                if isinstance(request, dict) and (request.get("method")
+                                                  == "subscribe"):
+                    send_message(conn, TYPE_JSON,
+                                 json.dumps({"ok": True}).encode())
+                    self.stream_telemetry(conn)
+                    return
+
+                response = self.handle_request(request)
+                send_message(conn, TYPE_JSON, json.dumps(response).encode())
+
+        except (ConnectionError, OSError, ValueError) as e:
+            logger.info(f"Client disconnected: {e}")
+        finally:
+            conn.close()
+
+    def handle_request(self, request: dict) -> dict:
+        # Engine imports this module through Pipeline, import at use
+        from src.engine import Engine
+
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request must be a JSON object"}
+        method = request.get("method")
+        params = request.get("params", {})
+        if not isinstance(params, dict):
+            return {"ok": False, "error": "params must be a JSON object"}
+        try:
+            if method == "set_active":
+                Engine().send_command("set_active",
+                                      {"flag": bool(params["flag"])})
+                result = None
+            elif method == "toggle_active":
+                Engine().send_command("toggle_active")
+                result = None
+            elif method == "switch_profile":
+                if params["profile_name"] not in ConfigManager().profiles:
+                    raise ValueError(
+                        f"Unknown profile {params['profile_name']}")
+                Engine().send_command("switch_profile",
+                                      {"profile_name": params["profile_name"]})
+                result = None
+            elif method == "list_profiles":
+                result = {
+                    "profiles": list(ConfigManager().profiles),
+                    "current": ConfigManager().curr_profile_name.get()
+                }
+            elif method == "get_stats":
+                result = Engine().get_stats()
+            elif method in ("start_calibration", "reset_calibration"):
+                Engine().send_command(method)
+                result = None
+            else:
+                raise ValueError(f"Unknown method {method}")
+        except (KeyError, TypeError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+
+        return {"ok": True, "result": result}
+
+    def stream_telemetry(self, conn: socket.socket) -> None:
+        subscriber = Subscriber(conn)
+        with self.subscribers_lock:
+            self.subscribers.append(subscriber)
+        logger.info("Telemetry subscriber added")
+        try:
+            subscriber.send_loop(self.stop_flag)
+        finally:
+            with self.subscribers_lock:
+                self.subscribers.remove(subscriber)
+            logger.info(f"Telemetry subscriber removed, sent "
+                        f"{subscriber.n_sent} dropped {subscriber.n_dropped}")
+
+    def has_subscribers(self) -> bool:
+        return len(self.subscribers) > 0
+
+    def publish_telemetry(self, seq: int, capture_ms: float, is_active: bool,
+                          track_loc, achieved_fps: float, latency_ms: float,
+                          blendshapes) -> None:
+        """Queue one record for every subscriber, packed once.
+        Called on the engine thread.
+        """
+        if not self.subscribers:
+            return
+
+        if track_loc is None:
+            track_loc = (np.nan, np.nan)
+        if blendshapes is None:
+            blendshapes = np.full(N_SHAPES, np.nan)
+        record = TELEMETRY_RECORD.pack(seq, capture_ms, is_active,
+                                       track_loc[0], track_loc[1],
+                                       achieved_fps, latency_ms, *blendshapes)
+
+        with self.subscribers_lock:
+            for subscriber in self.subscribers:
+                subscriber.push(record)
+
+    def destroy(self):
+        self.stop_flag.set()
+        if self.server_socket is not None:
+            self.server_socket.close()
+        self.is_started = False
@@ -0,0 +1,71 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy as np
+import numpy.typing as npt
+
+
+class JoystickMapper():
+    """Map head rotation to cursor velocity like an analog stick.
+
+    Yaw drives x and pitch drives y, both measured from a neutral pose taken
+    on recenter. Each axis has a dead zone, then the deflection up to
+    max_deg is shaped by a power curve and scaled to the axis max speed.
+    Turning further than max_deg holds the max speed.
+    """
+
+    def __init__(self, dead_zone_deg: float, max_deg: float,
+                 speeds: npt.ArrayLike, curves: npt.ArrayLike):
+        self.neutral = None
+        self.configure(dead_zone_deg, max_deg, speeds, curves)
+
+    def configure(self, dead_zone_deg: float, max_deg: float,
+                  speeds: npt.ArrayLike, curves: npt.ArrayLike) -> None:
+        """
+        Args:
+            dead_zone_deg (float): deflection ignored on each axis
+            max_deg (float): deflection giving the max speed
+            speeds (npt.ArrayLike): max speed x, y in pixels per second
+            curves (npt.ArrayLike): exponent x, y, 1 is linear, higher
+                gives finer control near the dead zone
+        """
+        self.dead_zone_deg = dead_zone_deg
+        # Keep a usable range even if max is set inside the dead zone.
+        self.range_deg = max(max_deg - dead_zone_deg, 1e-3)
+        self.speeds = np.asarray(speeds, dtype=np.float64)
+        self.curves = np.asarray(curves, dtype=np.float64)
+
+    def recenter(self) -> None:
+        """Current pose becomes the neutral on next update.
+        """
+        self.neutral = None
+
+    def update(self, head_pose: npt.ArrayLike) -> npt.ArrayLike:
+        """Get the cursor velocity for a head pose.
+
+        Args:
+            head_pose (npt.ArrayLike): yaw, pitch (and roll) in degrees
+
+        Returns:
+            npt.ArrayLike: velocity x, y in pixels per second
+        """
+        angles = np.asarray(head_pose[:2], dtype=np.float64)
+        if self.neutral is None:
+            self.neutral = angles.copy()
+
+        deflection = angles - self.neutral
+        level = np.clip((np.abs(deflection) - self.dead_zone_deg) /
+                        self.range_deg, 0, 1)
+        return np.sign(deflection) * self.speeds * level**self.curves
@@ -0,0 +1,205 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import abc
+import logging
+import time
+from collections import deque
+
+import src.shape_list as shape_list
+
+logger = logging.getLogger("OutputBackend")
+
+# Reports kept by the loopback backend
+N_LOOPBACK_REPORTS = 1000
+
+# XUSB_BUTTON member of each gamepad button
+VGAMEPAD_BUTTONS = {
+    "A": "XUSB_GAMEPAD_A",
+    "B": "XUSB_GAMEPAD_B",
+    "X": "XUSB_GAMEPAD_X",
+    "Y": "XUSB_GAMEPAD_Y",
+    "LB": "XUSB_GAMEPAD_LEFT_SHOULDER",
+    "RB": "XUSB_GAMEPAD_RIGHT_SHOULDER",
+    "LS": "XUSB_GAMEPAD_LEFT_THUMB",
+    "RS": "XUSB_GAMEPAD_RIGHT_THUMB",
+    "BACK": "XUSB_GAMEPAD_BACK",
+    "START": "XUSB_GAMEPAD_START",
+    "GUIDE": "XUSB_GAMEPAD_GUIDE",
+    "UP": "XUSB_GAMEPAD_DPAD_UP",
+    "DOWN": "XUSB_GAMEPAD_DPAD_DOWN",
+    "LEFT": "XUSB_GAMEPAD_DPAD_LEFT",
+    "RIGHT": "XUSB_GAMEPAD_DPAD_RIGHT"
+}
+assert set(VGAMEPAD_BUTTONS) == set(shape_list.gamepad_buttons)
+
+
+class OutputBackend(metaclass=abc.ABCMeta):
+    """Virtual gamepad receiving sticks, triggers and buttons.
+
+    Setters only change the state, flush sends it in one report when it
+    changed, so a tick costs at most one report whatever the number of
+    bindings. A button pressed and released before a flush is sent pressed
+    and released on the next flush, so taps are not lost.
+    """
+
+    def __init__(self):
+        self.sticks = {"left": (0.0, 0.0), "right": (0.0, 0.0)}
+        self.triggers = {name: 0.0 for name in shape_list.gamepad_triggers}
+        self.buttons = set()
+        self.new_buttons = set()
+        self.pending_releases = set()
+        self.is_dirty = False
+
+    def open(self) -> None:
+        """Connect the device, raise if it is not available.
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def send(self) -> None:
+        """Send the whole current state to the device.
+        """
+        pass
+
+    def set_stick(self, stick: str, x: float, y: float) -> None:
+        """
+        Args:
+            stick (str): "left" or "right"
+            x (float): -1 left to 1 right
+            y (float): -1 down to 1 up
+        """
+        value = (min(max(x, -1.0), 1.0), min(max(y, -1.0), 1.0))
+        if self.sticks[stick] != value:
+            self.sticks[stick] = value
+            self.is_dirty = True
+
+    def set_trigger(self, trigger: str, value: float) -> None:
+        value = min(max(value, 0.0), 1.0)
+        if self.triggers[trigger] != value:
+            self.triggers[trigger] = value
+            self.is_dirty = True
+
+    def set_button(self, button: str, is_down: bool) -> None:
+        if not is_down and button in self.new_buttons:
+            self.pending_releases.add(button)
+            return
+        self.pending_releases.discard(button)
+        if is_down == (button in self.buttons):
+            return
+        if is_down:
+            self.buttons.add(button)
+            self.new_buttons.add(button)
+        else:
+            self.buttons.discard(button)
+        self.is_dirty = True
+
+    def reset(self) -> None:
+        """Center sticks, release triggers and buttons.
+        """
+        for stick in self.sticks:
+            self.set_stick(stick, 0.0, 0.0)
+        for trigger in self.triggers:
+            self.set_trigger(trigger, 0.0)
+        for button in list(self.buttons):
+            self.set_button(button, False)
+
+    def flush(self) -> None:
+        if self.is_dirty:
+            self.send()
+            self.is_dirty = False
+        self.new_buttons.clear()
+        releases, self.pending_releases = self.pending_releases, set()
+        for button in releases:
+            self.set_button(button, False)
+
+
+class VGamepadBackend(OutputBackend):
+    """Xbox 360 controller emulated by the ViGEmBus driver through the
+    optional vgamepad package.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.vgamepad = None
+        self.pad = None
+
+    def open(self) -> None:
+        # Optional, needs the ViGEmBus driver on Windows
+        import vgamepad
+        self.vgamepad = vgamepad
+        self.pad = vgamepad.VX360Gamepad()
+
+    def close(self) -> None:
+        if self.pad is not None:
+            self.pad.reset()
+            self.pad.update()
+            self.pad = None
+
+    def send(self) -> None:
+        self.pad.left_joystick_float(*self.sticks["left"])
+        self.pad.right_joystick_float(*self.sticks["right"])
+        self.pad.left_trigger_float(self.triggers["LT"])
+        self.pad.right_trigger_float(self.triggers["RT"])
+        for button, member in VGAMEPAD_BUTTONS.items():
+            xusb_button = getattr(self.vgamepad.XUSB_BUTTON, member)
+            if button in self.buttons:
+                self.pad.press_button(button=xusb_button)
+            else:
+                self.pad.release_button(button=xusb_button)
+        self.pad.update()
+
+
+class LoopbackBackend(OutputBackend):
+    """Keep sent reports in memory instead of driving a device, to check
+    bindings and measure report rates without a driver.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reports = deque(maxlen=N_LOOPBACK_REPORTS)
+
+    def send(self) -> None:
+        self.reports.append({
+            "ts": time.perf_counter(),
+            "sticks": dict(self.sticks),
+            "triggers": dict(self.triggers),
+            "buttons": sorted(self.buttons)
+        })
+
+    def get_reports(self) -> list[dict]:
+        return list(self.reports)
+
+
+OUTPUT_BACKENDS = {"vgamepad": VGamepadBackend, "loopback": LoopbackBackend}
+
+
+def create_backend(name: str) -> OutputBackend:
+    """Open the backend called name.
+
+    Returns:
+        OutputBackend: opened backend, None if it is not available
+    """
+    backend = OUTPUT_BACKENDS[name]()
+    try:
+        backend.open()
+    except Exception as e:
+        logger.error(f"Output backend {name} not available: {e}")
+        return None
+    logger.info(f"Output backend {name} opened")
+    return backend
@@ -12,37 +12,122 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+import time
+from collections import deque
 
+import numpy as np
+
+from src.blendshape_streamer import BlendshapeStreamer
+from src.calibrator import Calibrator
 from src.camera_manager import CameraManager
-from src.controllers import Keybinder, MouseController
-from src.detectors import FaceMesh
+from src.controllers import GamepadController, Keybinder, MouseController
+from src.detectors import BlendshapeStats, FaceMesh
+from src.config_manager import ConfigManager
+from src.frame_governor import FrameGovernor
+from src.ipc_server import IpcServer
+from src.process_engine import ProcessEngine
+
+# Number of results kept for latency statistics.
+N_LATENCY_STATS = 1000
 
 
 class Pipeline:
 
     def __init__(self):
         logging.info("Init Pipeline")
+        self.last_result_seq = -1
+        self.is_process_mode = ConfigManager(
+        ).config["engine_mode"] == "process"
+        # Camera read to result consumed here, in ms
+        self.latencies_ms = deque(maxlen=N_LATENCY_STATS)
 
     def pipeline_tick(self) -> None:
 
-        frame_rgb = CameraManager().get_raw_frame()
+        if not FaceMesh().is_ready:
+            CameraManager().draw_overlay(
+                track_loc=None,
+                model_ready=False,
+                model_failed=FaceMesh().load_error is not None)
+            return
+
+        # Single read, all fields come from the same frame
+        result = FaceMesh().get_result()
+
+        # Only grab and send a frame when the governor allows it
+        should_process = FrameGovernor().should_process(
+            is_active=MouseController().is_active.get(),
+            track_loc=result.track_loc,
+            blendshape_values=result.blendshapes)
+        if self.is_process_mode:
+            # Capture process submits frames itself at the governed rate
+            ProcessEngine().set_target_fps(FrameGovernor().get_fps()[1])
+        elif should_process:
+            capture_ms = CameraManager().get_raw_capture_ms()
+            frame_rgb = CameraManager().get_raw_frame()
+
+            # Detect landmarks (async) and save in it's buffer
+            FaceMesh().detect_frame(frame_rgb, capture_ms)
 
-        # Detect landmarks (async) and save in it's buffer
-        FaceMesh().detect_frame(frame_rgb)
+        if Calibrator().is_recording():
+            Calibrator().update(result)
 
         # Get facial landmarks
-        landmarks = FaceMesh().get_landmarks()
-        if (landmarks is None):
+        if (result.landmarks is None):
+            # Face lost, the stick must not keep its last deflection
+            if GamepadController().is_started:
+                GamepadController().release_stale()
             CameraManager().draw_overlay(track_loc=None)
             return
 
-        # Control mouse position
-        track_loc = FaceMesh().get_track_loc()
-        MouseController().act(track_loc)
+        # Nothing new since last tick, skip the controllers
+        if result.seq != self.last_result_seq:
+            self.last_result_seq = result.seq
+            latency_ms = time.time() * 1000 - result.capture_ms
+            self.latencies_ms.append(latency_ms)
+            self.publish_telemetry(result, latency_ms)
+            if BlendshapeStreamer().is_started:
+                BlendshapeStreamer().send(result)
 
-        # Control keyboard
-        blendshape_values = FaceMesh().get_blendshapes()
-        Keybinder().act(blendshape_values)
+            # Control mouse position
+            MouseController().act(result.track_loc, result.head_pose)
+
+            # Control keyboard, gestures made for the calibration do not
+            # trigger actions
+            if not Calibrator().is_recording():
+                Keybinder().act(result.blendshapes)
+            BlendshapeStats().update(result.blendshapes)
+
+            # Send gamepad state once, after the bindings changed it
+            if GamepadController().is_started:
+                GamepadController().act(result.head_pose)
+        elif GamepadController().is_started:
+            GamepadController().release_stale()
 
         # Draw frame overlay
-        CameraManager().draw_overlay(track_loc)
+        CameraManager().draw_overlay(result.track_loc)
+
+    def publish_telemetry(self, result, latency_ms: float) -> None:
+        if not IpcServer().has_subscribers():
+            return
+        IpcServer().publish_telemetry(
+            seq=result.seq,
+            capture_ms=result.capture_ms,
+            is_active=MouseController().is_active.get(),
+            track_loc=result.track_loc,
+            achieved_fps=FrameGovernor().get_fps()[0],
+            latency_ms=latency_ms,
+            blendshapes=result.blendshapes)
+
+    def get_latency_stats(self) -> dict:
+        """Time from camera read to the controllers using the result, in
+        milliseconds. Compare between engine modes with the tail values.
+        """
+        latencies = np.array(self.latencies_ms)
+        if len(latencies) == 0:
+            latencies = np.zeros(1)
+
+        return {
+            "latency_p50": np.percentile(latencies, 50),
+            "latency_p99": np.percentile(latencies, 99),
+            "latency_max": latencies.max()
+        }
@@ -0,0 +1,214 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import multiprocessing
+import threading
+import time
+
+from src.capture_process import (H_CAMERA_MASK, H_CURR_CAMERA_ID,
+                                 H_FRAME_SEQ, H_N_COMPLETED,
+                                 H_N_SKIPPED_BUSY, H_N_SUBMITTED,
+                                 H_N_TIMED_OUT, H_READY, H_REQ_CAMERA_ID,
+                                 H_RESULT_SEQ, H_STOP, H_TARGET_FPS,
+                                 MAX_SEARCH_CAMS, N_LANDMARKS, R_BLENDSHAPES,
+                                 R_CAPTURE_MS, R_HAS_FACE, R_HEAD_POSE,
+                                 R_LANDMARKS, R_N_FACES, R_TIMESTAMP_MS,
+                                 R_TRACK_LOC, SharedFrameRing,
+                                 capture_process_main)
+from src.config_manager import ConfigManager
+from src.detectors import FaceMesh
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("ProcessEngine")
+
+# Max wait for new data from the capture process before checking stop flag.
+READER_IDLE_SEC = 0.1
+PROCESS_JOIN_SEC = 2
+
+
+class ProcessEngine(metaclass=Singleton):
+    """Run camera capture and face inference in a child process.
+
+    Used when engine_mode is "process", so capture, preprocessing and
+    MediaPipe do not compete for the GIL with the controllers and Tk.
+    The child writes frames and results into a SharedFrameRing, a reader
+    thread here copies them out and hands frames to CameraManager and
+    results to FaceMesh.publish.
+    """
+
+    def __init__(self):
+        logger.info("Intialize ProcessEngine singleton")
+        self.ring = None
+        self.process = None
+        self.data_event = None
+        # Sends config updates to the capture process
+        self.config_conn = None
+        self.stop_flag = threading.Event()
+        self.reader_thread = None
+        self.frame_sink = None
+        self.last_frame_seq = 0
+        self.last_result_seq = 0
+        self.is_started = False
+
+    def start(self):
+        if not self.is_started:
+            logger.info("Start ProcessEngine singleton")
+            config = ConfigManager().config
+            self.ring = SharedFrameRing(config["fix_width"],
+                                        config["fix_height"],
+                                        create=True)
+            self.data_event = multiprocessing.Event()
+            child_conn, self.config_conn = multiprocessing.Pipe(duplex=False)
+            self.process = multiprocessing.Process(
+                target=capture_process_main,
+                args=(self.ring.name, dict(config), self.data_event,
+                      child_conn),
+                daemon=True)
+            self.process.start()
+
+            self.reader_thread = threading.Thread(target=self.reader_loop,
+                                                  daemon=True)
+            self.reader_thread.start()
+            self.is_started = True
+
+    def set_frame_sink(self, frame_sink: callable) -> None:
+        """Function receiving (buffer_name, frame, capture_ms) for every
+        new camera frame.
+        """
+        self.frame_sink = frame_sink
+
+    def update_config(self) -> None:
+        """Send the current config to the capture process, after a profile
+        switch or a config change.
+        """
+        conn = self.config_conn
+        if conn is None:
+            return
+        try:
+            conn.send(dict(ConfigManager().config))
+        except OSError as e:
+            logger.warning(f"Cannot send config to capture process: {e}")
+
+    def set_target_fps(self, target_fps: int) -> None:
+        """Inference rate for the capture process, from FrameGovernor.
+        """
+        if self.ring is not None:
+            self.ring.header[H_TARGET_FPS] = target_fps
+
+    def get_camera_list(self) -> list[int]:
+        if self.ring is None:
+            return []
+        mask = int(self.ring.header[H_CAMERA_MASK])
+        return [i for i in range(MAX_SEARCH_CAMS) if mask & (1 << i)]
+
+    def get_current_camera_id(self) -> int:
+        if self.ring is None or self.ring.header[H_CURR_CAMERA_ID] < 0:
+            return None
+        return int(self.ring.header[H_CURR_CAMERA_ID])
+
+    def pick_camera(self, camera_id: int) -> None:
+        if self.ring is not None:
+            self.ring.header[H_REQ_CAMERA_ID] = camera_id
+
+    def read_new_frame(self) -> None:
+        frame_seq = int(self.ring.header[H_FRAME_SEQ])
+        if frame_seq == self.last_frame_seq:
+            return
+        self.last_frame_seq = frame_seq
+
+        frame, capture_ms = self.ring.read_frame(frame_seq)
+        if frame is None:
+            logger.warning(f"Frame {frame_seq} overwritten while reading")
+            return
+        if self.frame_sink is not None:
+            self.frame_sink("raw", frame, capture_ms)
+
+    def read_counters(self) -> None:
+        """Frames are submitted by the capture process, its detector
+        counters replace the ones of FaceMesh.
+        """
+        header = self.ring.header
+        FaceMesh().set_counters(int(header[H_N_SUBMITTED]),
+                                int(header[H_N_COMPLETED]),
+                                int(header[H_N_TIMED_OUT]),
+                                int(header[H_N_SKIPPED_BUSY]))
+
+    def read_new_result(self) -> None:
+        result_seq = int(self.ring.header[H_RESULT_SEQ])
+        if result_seq == self.last_result_seq:
+            return
+        self.last_result_seq = result_seq
+
+        values = self.ring.read_result(result_seq)
+        if values is None:
+            logger.warning(f"Result {result_seq} overwritten while reading")
+            return
+
+        callback_start = time.perf_counter()
+        if values[R_HAS_FACE]:
+            landmarks = values[R_LANDMARKS].reshape(N_LANDMARKS, 3)
+            track_loc = values[R_TRACK_LOC].astype("float32")
+            blend_scores = values[R_BLENDSHAPES]
+            head_pose = values[R_HEAD_POSE].astype("float32")
+        else:
+            landmarks = track_loc = blend_scores = head_pose = None
+
+        FaceMesh().publish(int(values[R_TIMESTAMP_MS]),
+                           float(values[R_CAPTURE_MS]), landmarks, track_loc,
+                           blend_scores, head_pose)
+        FaceMesh().update_cost_stats(int(values[R_N_FACES]),
+                                     int(values[R_TIMESTAMP_MS]),
+                                     callback_start)
+
+    def reader_loop(self) -> None:
+        logger.info("ProcessEngine reader started")
+        while not self.stop_flag.is_set():
+            self.data_event.wait(READER_IDLE_SEC)
+            self.data_event.clear()
+
+            try:
+                if self.ring.header[H_READY] and not FaceMesh().is_ready:
+                    FaceMesh().is_ready = True
+                    logger.info("Capture process ready")
+
+                self.read_new_frame()
+                self.read_new_result()
+                self.read_counters()
+            except Exception as e:
+                logger.critical(e, exc_info=e)
+
+            if not self.process.is_alive():
+                logger.critical("Capture process exited unexpectedly")
+                FaceMesh().is_ready = False
+                FaceMesh().load_error = (
+                    f"Capture process exited with code {self.process.exitcode}")
+                return
+
+    def destroy(self):
+        if not self.is_started:
+            return
+        self.stop_flag.set()
+        self.ring.header[H_STOP] = 1
+        self.process.join(timeout=PROCESS_JOIN_SEC)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.reader_thread is not None:
+            self.reader_thread.join(timeout=1)
+        self.config_conn.close()
+        self.config_conn = None
+        self.ring.close(unlink=True)
+        self.ring = None
+        self.is_started = False
@@ -0,0 +1,368 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from typing import NamedTuple
+
+import src.shape_list as shape_list
+
+DEVICES = ("mouse", "keyboard", "profile", "gamepad")
+TRIGGER_TYPES = ("single", "hold")
+
+# Kind of gesture rule: (number of gestures, default time_ms)
+# chord: gestures held together, action held as long as all of them are.
+# sequence: gestures started one after the other, each within time_ms.
+# tap: gesture released before time_ms.
+# long_press: gesture held for time_ms.
+RULE_KINDS = {
+    "chord": (None, 0),
+    "sequence": (None, 500),
+    "tap": (1, 250),
+    "long_press": (1, 600)
+}
+
+# Target of analog bindings: default output at the low and high end.
+# cursor_speed: scale of the cursor speed, several bindings multiply.
+# scroll: wheel notches per second, positive scrolls up, several add up.
+# gamepad_LT, gamepad_RT: trigger press from 0 to 1.
+ANALOG_TARGETS = {
+    "cursor_speed": (1.0, 0.25),
+    "scroll": (0.0, 10.0),
+    "gamepad_LT": (0.0, 1.0),
+    "gamepad_RT": (0.0, 1.0)
+}
+
+
+class Binding(NamedTuple):
+    """Gesture binding. Stored in JSON as [device, action, threshold,
+    trigger_type] and unpacks the same way as that list.
+    """
+    device: str
+    action: str
+    threshold: float
+    trigger_type: str
+
+
+class GestureRule(NamedTuple):
+    """Combination of gestures triggering one action, see RULE_KINDS.
+    """
+    kind: str
+    gestures: tuple
+    threshold: float
+    time_ms: float
+    device: str
+    action: str
+
+
+class AnalogBinding(NamedTuple):
+    """Continuous mapping of one gesture to a target, see ANALOG_TARGETS.
+    Gesture values from low to high go through the power curve to the
+    output range, smoothed with a time constant of smooth_ms.
+    """
+    gesture: str
+    target: str
+    low: float
+    high: float
+    curve: float
+    smooth_ms: float
+    output: tuple
+
+
+def is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def positive_int(value) -> bool:
+    return is_int(value) and value > 0
+
+
+def non_negative_int(value) -> bool:
+    return is_int(value) and value >= 0
+
+
+def boolean(value) -> bool:
+    return isinstance(value, bool)
+
+
+def one_of(*choices) -> callable:
+    return lambda value: value in choices
+
+
+def list_of(check: callable) -> callable:
+    return lambda value: isinstance(value, list) and all(
+        check(v) for v in value)
+
+
+def positive_number(value) -> bool:
+    return is_number(value) and value > 0
+
+
+def non_negative_number(value) -> bool:
+    return is_number(value) and value >= 0
+
+
+def port(value) -> bool:
+    return is_int(value) and 0 < value < 65536
+
+
+def is_gamepad_control(value) -> bool:
+    return value in shape_list.gamepad_buttons or (
+        value in shape_list.gamepad_triggers)
+
+
+# Check of every cursor.json field
+CONFIG_SCHEMA = {
+    "fix_width": positive_int,
+    "fix_height": positive_int,
+    "camera_id": non_negative_int,
+    "tracking_vert_idxs": list_of(non_negative_int),
+    "spd_up": non_negative_int,
+    "spd_down": non_negative_int,
+    "spd_left": non_negative_int,
+    "spd_right": non_negative_int,
+    "pointer_smooth": positive_int,
+    "shape_smooth": positive_int,
+    "tick_interval_ms": positive_int,
+    "hold_trigger_ms": non_negative_int,
+    "auto_play": boolean,
+    "mouse_acceleration": boolean,
+    "use_transformation_matrix": boolean,
+    "governor_enabled": boolean,
+    "max_fps": positive_int,
+    "stable_fps": positive_int,
+    "idle_fps": positive_int,
+    "cpu_budget_percent": positive_int,
+    "max_frames_in_flight": positive_int,
+    "num_faces": positive_int,
+    "primary_face_policy": one_of("largest", "center", "continuity"),
+    "engine_mode": one_of("thread", "process"),
+    "ipc_enabled": boolean,
+    "ipc_port": port,
+    "stream_enabled": boolean,
+    "stream_format": one_of("osc", "udp"),
+    "stream_host": lambda value: isinstance(value, str),
+    "stream_port": port,
+    "stream_rate_hz": positive_int,
+    "stream_fields": list_of(one_of("track_loc", "head_pose", "blendshapes")),
+    "drift_compensation": boolean,
+    "drift_time_constant_sec": positive_number,
+    "drift_dead_zone_px": non_negative_number,
+    "cursor_mode": one_of("relative", "joystick", "gamepad"),
+    "joystick_dead_zone_deg": non_negative_number,
+    "joystick_max_deg": positive_number,
+    "joystick_speed_x": non_negative_number,
+    "joystick_speed_y": non_negative_number,
+    "joystick_curve_x": positive_number,
+    "joystick_curve_y": positive_number,
+    "output_backend": one_of("none", "vgamepad", "loopback"),
+    "gamepad_stick": one_of("left", "right"),
+    "scroll_rate": non_negative_number,
+    "scroll_max_rate": non_negative_number,
+    "scroll_ramp_ms": positive_int,
+    "scroll_dispatch_ms": non_negative_int
+}
+
+
+def validate_config(config: dict, defaults: dict) -> list[str]:
+    """Replace invalid values of config by their default, in place.
+
+    Returns:
+        list[str]: one message per invalid field
+    """
+    errors = []
+    for field, check in CONFIG_SCHEMA.items():
+        if field not in config:
+            continue
+        if not check(config[field]):
+            errors.append(f"Invalid {field}: {config[field]!r}, "
+                          f"using {defaults.get(field)!r}")
+            config[field] = defaults.get(field)
+    return errors
+
+
+def parse_bindings(raw_bindings: dict) -> tuple[dict, list[str]]:
+    """Convert bindings loaded from JSON to Binding, dropping invalid ones.
+
+    Returns:
+        tuple[dict, list[str]]: {gesture: Binding} and error messages
+    """
+    bindings = {}
+    errors = []
+    for gesture, values in raw_bindings.items():
+        if gesture not in shape_list.blendshape_indices:
+            errors.append(f"Unknown gesture {gesture!r}")
+            continue
+        if not isinstance(values, list) or len(values) != 4:
+            errors.append(f"Binding of {gesture} is not "
+                          "[device, action, threshold, trigger_type]")
+            continue
+
+        binding = Binding(*values)
+        if binding.device not in DEVICES:
+            errors.append(f"Unknown device {binding.device!r} for {gesture}")
+        elif not isinstance(binding.action, str):
+            errors.append(f"Invalid action {binding.action!r} for {gesture}")
+        elif (binding.device == "gamepad") and not is_gamepad_control(
+                binding.action):
+            errors.append(f"Unknown gamepad control {binding.action!r} for "
+                          f"{gesture}")
+        elif not (is_number(binding.threshold) and
+                  0 <= binding.threshold <= 1):
+            errors.append(
+                f"Threshold of {gesture} must be in [0, 1], got "
+                f"{binding.threshold!r}")
+        elif binding.trigger_type not in TRIGGER_TYPES:
+            errors.append(f"Unknown trigger type {binding.trigger_type!r} "
+                          f"for {gesture}")
+        else:
+            bindings[gesture] = binding._replace(
+                threshold=float(binding.threshold))
+    return bindings, errors
+
+
+def compile_bindings(mouse_bindings: dict,
+                     keyboard_bindings: dict,
+                     gamepad_bindings: dict = {}) -> list[tuple[int, Binding]]:
+    """Flat list of (blendshape index, Binding) for the controllers, the
+    later file wins when a gesture is in several of them.
+    """
+    return [(shape_list.blendshape_indices[gesture], binding)
+            for gesture, binding in (mouse_bindings | keyboard_bindings |
+                                     gamepad_bindings).items()
+            if gesture in shape_list.blendshape_indices]
+
+
+def parse_gesture_rules(raw_rules: list) -> tuple[list, list[str]]:
+    """Convert rules loaded from gesture_rules.json to GestureRule, dropping
+    invalid ones.
+
+    Returns:
+        tuple[list, list[str]]: [GestureRule] and error messages
+    """
+    if not isinstance(raw_rules, list):
+        return [], ["Gesture rules must be a list"]
+
+    rules = []
+    errors = []
+    for i, raw in enumerate(raw_rules):
+        if not isinstance(raw, dict) or raw.get("kind") not in RULE_KINDS:
+            errors.append(f"Rule {i} has no valid kind, use one of "
+                          f"{list(RULE_KINDS)}")
+            continue
+        kind = raw["kind"]
+        n_gestures, default_ms = RULE_KINDS[kind]
+        gestures = raw.get("gestures")
+        threshold = raw.get("threshold", 0.5)
+        time_ms = raw.get("time_ms", default_ms)
+
+        if not (isinstance(gestures, list) and gestures and all(
+                g in shape_list.blendshape_indices for g in gestures)):
+            errors.append(f"Rule {i} has unknown gestures {gestures!r}")
+        elif n_gestures is not None and len(gestures) != n_gestures:
+            errors.append(f"Rule {i} ({kind}) needs exactly {n_gestures} gesture")
+        elif n_gestures is None and len(gestures) < 2:
+            errors.append(f"Rule {i} ({kind}) needs at least 2 gestures")
+        elif not (is_number(threshold) and 0 <= threshold <= 1):
+            errors.append(f"Threshold of rule {i} must be in [0, 1], got "
+                          f"{threshold!r}")
+        elif not (is_number(time_ms) and time_ms >= 0):
+            errors.append(f"Invalid time_ms of rule {i}: {time_ms!r}")
+        elif raw.get("device") not in DEVICES:
+            errors.append(f"Unknown device {raw.get('device')!r} in rule {i}")
+        elif not isinstance(raw.get("action"), str):
+            errors.append(f"Invalid action {raw.get('action')!r} in rule {i}")
+        elif raw["device"] == "gamepad" and raw["action"] not in (
+                shape_list.gamepad_buttons):
+            errors.append(f"Rule {i} needs a gamepad button, got "
+                          f"{raw['action']!r}")
+        else:
+            rules.append(
+                GestureRule(kind, tuple(gestures), float(threshold),
+                            float(time_ms), raw["device"], raw["action"]))
+    return rules, errors
+
+
+def parse_calibration(raw_calibration: dict) -> tuple[dict, list[str]]:
+    """Check blendshape calibration loaded from calibration.json.
+
+    Returns:
+        tuple[dict, list[str]]: {"neutral": [...], "maximum": [...]} with one
+            value per blendshape, None if invalid, and error messages
+    """
+    n_shapes = len(shape_list.blendshape_names)
+    if not isinstance(raw_calibration, dict):
+        return None, ["Calibration must be an object"]
+    for field in ("neutral", "maximum"):
+        values = raw_calibration.get(field)
+        if not (isinstance(values, list) and len(values) == n_shapes and
+                all(is_number(v) and 0 <= v <= 1 for v in values)):
+            return None, [
+                f"Calibration {field} must be {n_shapes} values in [0, 1]"
+            ]
+    return {
+        "neutral": [float(v) for v in raw_calibration["neutral"]],
+        "maximum": [float(v) for v in raw_calibration["maximum"]]
+    }, []
+
+
+def parse_analog_bindings(raw_bindings: list) -> tuple[list, list[str]]:
+    """Convert bindings loaded from analog_bindings.json to AnalogBinding,
+    dropping invalid ones.
+
+    Returns:
+        tuple[list, list[str]]: [AnalogBinding] and error messages
+    """
+    if not isinstance(raw_bindings, list):
+        return [], ["Analog bindings must be a list"]
+
+    bindings = []
+    errors = []
+    for i, raw in enumerate(raw_bindings):
+        if not isinstance(raw, dict) or raw.get("target") not in ANALOG_TARGETS:
+            errors.append(f"Analog binding {i} has no valid target, use one "
+                          f"of {list(ANALOG_TARGETS)}")
+            continue
+        target = raw["target"]
+        gesture = raw.get("gesture")
+        low = raw.get("low", 0.1)
+        high = raw.get("high", 1.0)
+        curve = raw.get("curve", 1.0)
+        smooth_ms = raw.get("smooth_ms", 50)
+        output = raw.get("output", list(ANALOG_TARGETS[target]))
+
+        if gesture not in shape_list.blendshape_indices:
+            errors.append(f"Analog binding {i} has unknown gesture "
+                          f"{gesture!r}")
+        elif not (is_number(low) and is_number(high) and
+                  0 <= low < high <= 1):
+            errors.append(f"Analog binding {i} needs 0 <= low < high <= 1, "
+                          f"got {low!r}, {high!r}")
+        elif not positive_number(curve):
+            errors.append(f"Invalid curve of analog binding {i}: {curve!r}")
+        elif not non_negative_number(smooth_ms):
+            errors.append(f"Invalid smooth_ms of analog binding {i}: "
+                          f"{smooth_ms!r}")
+        elif not (isinstance(output, list) and len(output) == 2 and
+                  all(is_number(v) for v in output)):
+            errors.append(f"Output of analog binding {i} must be [low, high]")
+        else:
+            bindings.append(
+                AnalogBinding(gesture, target, float(low), float(high),
+                              float(curve), float(smooth_ms),
+                              (float(output[0]), float(output[1]))))
+    return bindings, errors
@@ -73,14 +73,28 @@ available_actions = {
     "Mouse left click": ["mouse", "left"],
     "Mouse right click": ["mouse", "right"],
     "Mouse middle click": ["mouse", "middle"],
+    "Scroll up": ["mouse", "scroll_up"],
+    "Scroll down": ["mouse", "scroll_down"],
+    "Drag lock on / off": ["mouse", "drag_lock"],
     "Mouse pause / unpause": ["mouse", "pause"],
     "Reset cursor to center": ["mouse", "reset"],
-    "Switch focus between monitors": ["mouse", "cycle"]
+    "Switch focus between monitors": ["mouse", "cycle"],
+    "Switch to next profile": ["profile", "next"],
+    "Switch to previous profile": ["profile", "prev"]
 }
 available_actions_keys = list(available_actions.keys())
 available_actions_values = list(available_actions.values())
 
-available_gestures = {
+# Controls of the "gamepad" binding device, Xbox layout
+gamepad_buttons = [
+    "A", "B", "X", "Y", "LB", "RB", "LS", "RS", "BACK", "START", "GUIDE", "UP",
+    "DOWN", "LEFT", "RIGHT"
+]
+# Analog, pressed in proportion to the gesture beyond its threshold
+gamepad_triggers = ["LT", "RT"]
+
+# Gestures with a hand-made preview, shown first before ranking is known
+gesture_images = {
     "None": "assets/images/dropdowns/None.png",
     "Open mouth": "assets/images/dropdowns/Open mouth.png",
     "Mouth left": "assets/images/dropdowns/Mouth left.png",
@@ -91,8 +105,14 @@ available_gestures = {
     "Raise right eyebrow": "assets/images/dropdowns/Raise right eyebrow.png",
     "Lower right eyebrow": "assets/images/dropdowns/Lower right eyebrow.png",
 }
-for k, v in available_gestures.items():
+for k, v in gesture_images.items():
     assert k in blendshape_names, f"{k} not in blendshape_names"
+
+# Every blendshape is bindable, "None" stays first. Value is the preview
+# image path, None when the preview is drawn.
+available_gestures = dict(gesture_images)
+for name in blendshape_names:
+    available_gestures.setdefault(name, None)
 available_gestures_keys = list(available_gestures.keys())
 
 # Map tkinter character to valid pyautogui character
@@ -0,0 +1,69 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+logger = logging.getLogger("StartupProfiler")
+
+# Phase name: duration in milliseconds, in recording order.
+startup_phases = {}
+_phases_lock = threading.Lock()
+
+
+def record_phase(name: str, duration_ms: float) -> None:
+    with _phases_lock:
+        startup_phases[name] = duration_ms
+
+
+@contextmanager
+def measure_phase(name: str):
+    """Measure the wrapped block as one startup phase.
+    """
+    t_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, (time.perf_counter() - t_start) * 1000)
+
+
+def profile_imports(module_names: list[str]) -> None:
+    """Import modules one by one and record the time of each.
+    Later imports of the same modules are free.
+    """
+    for module_name in module_names:
+        with measure_phase(f"import {module_name}"):
+            importlib.import_module(module_name)
+
+
+def mark_since_process_start(name: str) -> None:
+    """Record time from process creation until now, interpreter startup
+    included.
+    """
+    elapsed_ms = (time.time() - psutil.Process().create_time()) * 1000
+    record_phase(name, elapsed_ms)
+    logger.info(f"{name}: {elapsed_ms:.1f} ms")
+
+
+def log_startup_report() -> None:
+    with _phases_lock:
+        phases = dict(startup_phases)
+
+    lines = [f"{name:<24}{ms:>10.1f} ms" for name, ms in phases.items()]
+    logger.info("Startup time by phase:\n" + "\n".join(lines))
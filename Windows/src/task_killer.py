@@ -18,6 +18,7 @@ import signal
 
 import psutil
 
+import src.startup_profiler as startup_profiler
 import src.utils as utils
 from src.singleton_meta import Singleton
 
@@ -30,42 +31,96 @@ class TaskKiller(metaclass=Singleton):
 
     def __init__(self):
         logger.info("Intialize TaskKiller singleton")
+        self.fonts_installed = False
         self.is_started = False
 
-    def start(self):
+    def start(self, headless: bool = False, profile_name: str = None):
+        """Start singletons needed by the GUI, the face model keeps loading
+        in background after this returns.
+
+        Args:
+            headless (bool): running without GUI, skip the fonts
+            profile_name (str, optional): profile to use instead of the
+                default one
+        """
         if not self.is_started:
-            logging.info("Installing google fonts.")
-            utils.install_fonts("assets/fonts")
+            if not headless:
+                with startup_profiler.measure_phase("fonts"):
+                    logging.info("Installing google fonts.")
+                    utils.install_fonts("assets/fonts")
+                    self.fonts_installed = True
 
             # Start singletons
-            from src.config_manager import ConfigManager
-            ConfigManager().start()
-
-            from src.camera_manager import CameraManager
-            CameraManager().start()
-
-            from src.controllers import Keybinder, MouseController
-            MouseController().start()
-            Keybinder().start()
-
-            from src.detectors import FaceMesh
-            FaceMesh().start()
+            with startup_profiler.measure_phase("config"):
+                from src.config_manager import ConfigManager
+                ConfigManager().start(profile_name)
+
+            # Capture and inference in a child process, before CameraManager
+            # which reads its frames
+            if ConfigManager().config["engine_mode"] == "process":
+                with startup_profiler.measure_phase("capture_process"):
+                    from src.process_engine import ProcessEngine
+                    ProcessEngine().start()
+
+            with startup_profiler.measure_phase("camera"):
+                from src.camera_manager import CameraManager
+                CameraManager().start()
+
+            with startup_profiler.measure_phase("controllers"):
+                from src.controllers import (GamepadController, Keybinder,
+                                             MouseController)
+                MouseController().start()
+                if ConfigManager().config["output_backend"] != "none":
+                    GamepadController().start()
+                Keybinder().start()
+
+            with startup_profiler.measure_phase("detector_start"):
+                from src.detectors import FaceMesh
+                FaceMesh().start()
+
+            from src.frame_governor import FrameGovernor
+            FrameGovernor().start()
+
+            # Detection and controllers run on their own thread from here
+            from src.engine import Engine
+            Engine().start()
+
+            if ConfigManager().config["ipc_enabled"]:
+                from src.ipc_server import IpcServer
+                IpcServer().start()
+
+            if ConfigManager().config["stream_enabled"]:
+                from src.blendshape_streamer import BlendshapeStreamer
+                BlendshapeStreamer().start()
 
             self.is_started = True
 
     def exit(self):
         logger.info("Exit program")
 
+        from src.blendshape_streamer import BlendshapeStreamer
         from src.camera_manager import CameraManager
-        from src.controllers import Keybinder, MouseController
+        from src.config_manager import ConfigManager
+        from src.controllers import (GamepadController, Keybinder,
+                                     MouseController)
         from src.detectors import FaceMesh
-
+        from src.engine import Engine
+        from src.ipc_server import IpcServer
+        from src.process_engine import ProcessEngine
+
+        IpcServer().destroy()
+        BlendshapeStreamer().destroy()
+        Engine().destroy()
+        ProcessEngine().destroy()
         CameraManager().destroy()
         MouseController().destroy()
+        GamepadController().destroy()
         Keybinder().destroy()
         FaceMesh().destroy()
+        ConfigManager().destroy()
 
-        utils.remove_fonts("assets/fonts")
+        if self.fonts_installed:
+            utils.remove_fonts("assets/fonts")
 
         parent = psutil.Process(os.getpid())
         children = parent.children(recursive=True)
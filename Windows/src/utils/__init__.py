@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from .frame_utils import *
 from .install_font import *
+from .json_writer import *
 from .list_cameras import *
+from .shared_var import *
 from .smoothing import *
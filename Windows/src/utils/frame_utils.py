@@ -0,0 +1,53 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy.typing as npt
+
+# Slow to import, loaded by import_cv2 when the camera starts so the first
+# window does not wait for it.
+cv2 = None
+
+
+def import_cv2():
+    """Load cv2 for the frame and camera functions, once.
+
+    Returns:
+        module: cv2
+    """
+    global cv2
+    if cv2 is None:
+        import cv2
+    return cv2
+
+
+def preprocess_frame(frame: npt.ArrayLike, fix_width: int,
+                     fix_height: int) -> npt.ArrayLike:
+    """Trim camera frame to 4:3, resize, mirror and convert to RGB.
+    import_cv2 must have been called.
+    """
+    frame.flags.writeable = False
+    h, w, _ = frame.shape
+
+    # Trim image
+    if h != fix_height or w != fix_width:
+        target_width = int(h * 4 / 3)
+        if w > target_width:
+            trim_width = w - target_width
+            trim_left = trim_width // 2
+            trim_right = trim_width - trim_left
+            frame = frame[:, trim_left:-trim_right, :]
+        frame = cv2.resize(frame, (fix_width, fix_height))
+    frame = cv2.flip(frame, 1)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
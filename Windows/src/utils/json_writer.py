@@ -0,0 +1,151 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("JsonWriter")
+
+# Edits to the same file within this time are written once.
+DEBOUNCE_SEC = 0.3
+
+# Weight of the newest sample in the write latency average.
+LATENCY_EMA_ALPHA = 0.1
+
+
+class JsonWriter():
+    """Write JSON files on a background thread.
+
+    Rapid writes to the same path are coalesced, only the latest data is
+    written once the path has been quiet for DEBOUNCE_SEC. Each write goes
+    to a temp file which replaces the target, so a crash never leaves a
+    half written file.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        # Held while writing, so two threads never write the same file
+        self.write_lock = threading.Lock()
+        # {path: (data, sort_keys, write_after_ts)}
+        self.pending = {}
+        self.is_stopped = False
+
+        self.n_requested = 0
+        self.n_written = 0
+        self.n_failed = 0
+        self.latency_ms_avg = 0
+        self.latency_ms_max = 0
+
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def schedule(self, path: Path, data, sort_keys: bool = False) -> None:
+        """Queue data to be written to path, never blocks.
+
+        Args:
+            path (Path): target file
+            data: JSON serializable object, must not be modified afterwards
+            sort_keys (bool): sort top level keys
+        """
+        with self.cond:
+            self.pending[Path(path)] = (data, sort_keys,
+                                        time.perf_counter() + DEBOUNCE_SEC)
+            self.n_requested += 1
+            self.cond.notify()
+
+    def write_file(self, path: Path, data, sort_keys: bool) -> None:
+        write_start = time.perf_counter()
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            if sort_keys:
+                data = dict(sorted(data.items()))
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=4, separators=(', ', ': '))
+            os.replace(tmp_path, path)
+        # Data that is not JSON serializable must not stop the writer thread
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to write {path}: {e}")
+            self.n_failed += 1
+            return
+
+        latency_ms = (time.perf_counter() - write_start) * 1000
+        self.n_written += 1
+        self.latency_ms_avg += LATENCY_EMA_ALPHA * (latency_ms -
+                                                    self.latency_ms_avg)
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+        logger.info(f"Wrote {path} in {latency_ms:.1f} ms")
+
+    def pop_due(self, force: bool) -> list:
+        now = time.perf_counter()
+        due = [
+            path for path, (_, _, write_after_ts) in self.pending.items()
+            if force or write_after_ts <= now
+        ]
+        return [(path, *self.pending.pop(path)[:2]) for path in due]
+
+    def write_due(self, force: bool) -> None:
+        with self.write_lock:
+            with self.cond:
+                due = self.pop_due(force)
+            for path, data, sort_keys in due:
+                self.write_file(path, data, sort_keys)
+
+    def write_loop(self) -> None:
+        while True:
+            with self.cond:
+                while not self.is_stopped:
+                    if self.pending:
+                        next_ts = min(v[2] for v in self.pending.values())
+                        timeout = next_ts - time.perf_counter()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self.cond.wait(timeout)
+                is_stopped = self.is_stopped
+
+            self.write_due(force=is_stopped)
+            if is_stopped:
+                return
+
+    def flush(self) -> None:
+        """Write everything pending now, blocks until done.
+        Use before moving or deleting the files.
+        """
+        self.write_due(force=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "requested": self.n_requested,
+            "written": self.n_written,
+            "failed": self.n_failed,
+            "latency_ms_avg": self.latency_ms_avg,
+            "latency_ms_max": self.latency_ms_max
+        }
+
+    def flush_and_stop(self) -> None:
+        """Write everything pending now and stop the thread.
+        """
+        with self.cond:
+            self.is_stopped = True
+            self.cond.notify()
+        self.thread.join()
+        logger.info("Writes requested {requested}, written {written}, "
+                    "failed {failed}, latency avg {latency_ms_avg:.1f} "
+                    "max {latency_ms_max:.1f} ms".format(**self.get_stats()))
@@ -13,20 +13,26 @@
 # limitations under the License.
 import concurrent.futures as futures
 import logging
+import sys
 
-import cv2
+from src.utils.frame_utils import import_cv2
 
 logger = logging.getLogger("ListCamera")
 
+IS_WINDOWS = sys.platform == "win32"
+
 
 def __open_camera_task(i):
+    cv2 = import_cv2()
 
     logger.info(f"Try openning camera: {i}")
 
+    # DirectShow on Windows, default backend elsewhere
+    backend = cv2.CAP_DSHOW if IS_WINDOWS else cv2.CAP_ANY
     try:
-        cap = cv2.VideoCapture(cv2.CAP_DSHOW + i)
+        cap = cv2.VideoCapture(backend + i)
 
-        if cap.getBackendName() != "DSHOW":
+        if IS_WINDOWS and cap.getBackendName() != "DSHOW":
             logger.info(f"Camera {i}: {cap.getBackendName()} is not supported")
             return (False, i, None)
 
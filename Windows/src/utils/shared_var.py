@@ -0,0 +1,36 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+
+class SharedVar():
+    """Value shared between threads.
+
+    Same get/set as tkinter variables but does not need a Tk root and never
+    goes through the Tk event loop, so the engine thread can't be blocked by
+    the GUI.
+    """
+
+    def __init__(self, value=None):
+        self._lock = threading.Lock()
+        self._value = value
+
+    def get(self):
+        with self._lock:
+            return self._value
+
+    def set(self, value) -> None:
+        with self._lock:
+            self._value = value
@@ -0,0 +1,63 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import math
+import threading
+
+
+class WheelDispatcher():
+    """Collect scrolling from all sources and send it in batches.
+
+    Scroll amounts in notches are added up and sent as one wheel event at
+    most every min_interval_sec, continuous scrolling then costs a few
+    events per second instead of one per notch. Only whole wheel units are
+    sent, the rest waits for the next batch. Amounts may be added from any
+    thread.
+    """
+
+    def __init__(self, units_per_notch: int, min_interval_sec: float):
+        self.units_per_notch = units_per_notch
+        self.min_interval_sec = min_interval_sec
+        self.pending_units = 0.0
+        self.last_dispatch_ts = -math.inf
+        self.lock = threading.Lock()
+
+    def configure(self, min_interval_sec: float) -> None:
+        self.min_interval_sec = min_interval_sec
+
+    def add(self, notches: float) -> None:
+        """
+        Args:
+            notches (float): wheel notches, positive scrolls up
+        """
+        with self.lock:
+            self.pending_units += notches * self.units_per_notch
+
+    def clear(self) -> None:
+        with self.lock:
+            self.pending_units = 0.0
+
+    def take(self, now: float) -> int:
+        """Get the wheel units to send now, 0 while the batch is not due.
+        """
+        if now - self.last_dispatch_ts < self.min_interval_sec:
+            return 0
+        with self.lock:
+            # Toward zero, the rest keeps its sign
+            units = int(self.pending_units)
+            self.pending_units -= units
+        if units != 0:
+            self.last_dispatch_ts = now
+        return units